@@ -0,0 +1,114 @@
+"""
+Import-time benchmark of the package, i.e. the cold start cost of a worker:
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --baseline exported_data/benchmarks/imports-baseline.json
+
+Every import is run in a fresh interpreter, several times, and the median wall time is kept. The results have the same
+format as `benchmarks.run`, so they can be compared with a baseline the same way.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from benchmarks.run import compare, format_comparisons, format_results
+from lib.constants import BenchmarkConstants
+
+# The imports to measure: the package facade, what each kind of worker imports, and the dependencies alone
+IMPORTS = [
+    'import lib',
+    'from lib import Dataset',
+    'from lib import FeatureGenerator',
+    'from lib import Scraper',
+    'import lib.data.pipeline',
+    'import lib.data.streaming_feature_generator',
+    'import numpy',
+    'import pandas',
+]
+# The optional dependencies that are only needed by some code paths
+HEAVY_MODULES = ['h5py', 'pyEX', 'pyarrow.parquet']
+
+# Run in each fresh interpreter: prints the wall time of the import, and which heavy modules it loaded
+__PROBE__ = '''
+import sys, time, json
+start = time.perf_counter()
+{statement}
+seconds = time.perf_counter() - start
+heavy_modules = [m for m in {heavy} if m in sys.modules]
+print(json.dumps({{'seconds': seconds, 'modules': len(sys.modules), 'heavy_modules': heavy_modules}}))
+'''
+
+
+def measure(statement: str, repeat: int = 5):
+    """
+    This function runs `statement` in `repeat` fresh interpreters.
+
+    :param statement: The import statement, e.g. 'from lib import Dataset'
+    :type statement: str
+    :param repeat: The number of runs. The median wall time is kept.
+    :type repeat: int
+    :return: Returns the median wall time, the number of modules loaded, and the heavy modules loaded
+    :rtype: dict
+    """
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, '-c', __PROBE__.format(statement=statement, heavy=HEAVY_MODULES)],
+            capture_output=True, text=True, check=True, cwd=os.getcwd()
+        ).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    return {
+        'seconds': statistics.median(r['seconds'] for r in runs),
+        'modules': runs[-1]['modules'],
+        'heavy_modules': runs[-1]['heavy_modules']
+    }
+
+
+def main(args: list[str] = None):
+    parser = argparse.ArgumentParser(description='Benchmark the import time of the package.')
+    parser.add_argument('--repeat', type=int, default=5, help='The number of fresh interpreters per import')
+    parser.add_argument('--output', default=None,
+                        help=f'The JSON file to write the results to. Default: {BenchmarkConstants.OUTPUT_DIR}/'
+                             f'imports-<timestamp>.json')
+    parser.add_argument('--baseline', default=None, help='A previous JSON result file to compare the results with')
+    parser.add_argument('--tolerance', type=float, default=BenchmarkConstants.DEFAULT_TOLERANCE,
+                        help='The accepted relative regression of any import, e.g. 0.2 for 20%%')
+    args = parser.parse_args(args)
+
+    results = {
+        'meta': {
+            'timestamp': int(time.time()),
+            'config': {'repeat': args.repeat},
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+        },
+        'stages': {statement: measure(statement, args.repeat) for statement in IMPORTS}
+    }
+    print(format_results(results))
+    for statement, stage in results['stages'].items():
+        heavy_modules = ', '.join(stage['heavy_modules']) or 'none'
+        print(f"{statement:<45}{stage['modules']:>6} modules loaded, heavy dependencies: {heavy_modules}")
+
+    output = args.output or f"{BenchmarkConstants.OUTPUT_DIR}/imports-{results['meta']['timestamp']}.json"
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump(results, file, indent=4)
+    print(f"Successfully saved benchmark results to {output}")
+
+    if args.baseline is None:
+        return 0
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    comparisons, regressions = compare(results, baseline, args.tolerance)
+    print(format_comparisons(comparisons))
+    print(f"{len(regressions)} regression(s) above {args.tolerance:.0%}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,381 @@
+"""
+End-to-end benchmark of the pipeline of `example_usage.py`, on synthetic data and without IEXCloud credentials:
+
+    python -m benchmarks.run --days 20 --tickers 4
+    python -m benchmarks.run --baseline exported_data/benchmarks/baseline.json
+
+Every stage (scraping against a fake client, feature generation, windowing, scaling, saving and loading) is timed and
+memory-profiled, and the results are written as JSON. When a baseline (a previous result file) is given, the run exits
+with status 1 if any stage regressed by more than the tolerance.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+from benchmarks.synthetic import FakeIEXClient, SyntheticMinuteBars
+from lib.constants import BenchmarkConstants
+from lib.data.dataset import Dataset
+from lib.data.feature_generator import FeatureGenerator
+from lib.data.features.common_features import CommonFeatures
+from lib.data.features.common_targets import CommonTargets
+from lib.scraper.retry import TokenBucket
+from lib.scraper.scraper import Scraper
+from lib.scraper.ticker import Ticker
+
+
+class StageRecorder:
+    def __init__(self, trace_memory: bool = True):
+        """
+        StageRecorder measures the wall time and, if `trace_memory=True`, the memory of each stage of a benchmark:
+            - `peak_bytes`: the peak memory allocated during the stage, above what was allocated before it
+            - `retained_bytes`: the memory still allocated at the end of the stage (e.g. its result)
+        Memory is traced with tracemalloc, which numpy and pandas report to, at the cost of slower stages.
+
+        :param trace_memory: Whether to measure the memory of each stage
+        :type trace_memory: bool
+        """
+        self.trace_memory = trace_memory
+        self.stages = {}
+
+    @contextlib.contextmanager
+    def stage(self, name: str, rows: int = None, allow_failure: bool = False):
+        """
+        This context manager records one stage. Anything printed during the stage is discarded.
+
+        :param name: The name of the stage, e.g. 'dataset.save_to_disk'
+        :type name: str
+        :param rows: (Optional) The number of rows (or windows) processed by the stage, to compute its throughput
+        :type rows: int
+        :param allow_failure: Whether an error in the stage should be recorded as the `error` of the stage, instead of
+        stopping the benchmark. Only use it for stages that no other stage depends on.
+        :type allow_failure: bool
+        """
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            start_bytes = tracemalloc.get_traced_memory()[0]
+        start_time = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                yield
+        except Exception as e:
+            if not allow_failure:
+                raise
+            self.stages[name] = {'error': f'{type(e).__name__}: {e}'.rstrip(': ')}
+            return
+        seconds = time.perf_counter() - start_time
+
+        result = {'seconds': seconds}
+        if self.trace_memory:
+            current_bytes, peak_bytes = tracemalloc.get_traced_memory()
+            result['peak_bytes'] = peak_bytes - start_bytes
+            result['retained_bytes'] = current_bytes - start_bytes
+        if rows is not None:
+            result['rows'] = rows
+            result['rows_per_second'] = rows / seconds if seconds > 0 else float('inf')
+        self.stages[name] = result
+
+
+class PipelineBenchmark:
+    # The features and targets of `example_usage.py`
+    FEATURES = [
+        CommonFeatures.Sinify('day_of_year', period=365),
+        CommonFeatures.Cosify('day_of_year', period=365),
+        CommonFeatures.Sinify('minute_of_day', period=(60 * 24)),
+        CommonFeatures.Cosify('minute_of_day', period=(60 * 24)),
+        CommonFeatures.OneHotEncoder('weekday'),
+        CommonFeatures.OneHotEncoder('hour_of_day')
+    ]
+    TARGETS = [
+        CommonTargets.FutureValue(feature='marketLow', target_time_delta=timedelta(minutes=1)),
+        CommonTargets.FutureValueChange(feature='future_value')
+    ]
+    FEATURES_TO_EXCLUDE = ['weekday', 'hour_of_day']
+    TARGET_FEATURE = 'future_value_change'
+
+    def __init__(self, tickers: int = 2, days: int = 20, start: str = '2021-01-04', lookback_size: int = 60,
+                 seed: int = 0, latency: float = 0.0, transform_windows: int = 4096, trace_memory: bool = True):
+        """
+        PipelineBenchmark runs the pipeline of `example_usage.py` on SyntheticMinuteBars, stage by stage:
+            - `scraper.get_intraday_stock_data`: one ticker, against a FakeIEXClient
+            - `scraper.get_intraday_stock_data_bulk`: every ticker, against a FakeIEXClient
+            - `feature_generator.init`, `feature_generator.cleanup`, `feature_generator.parse_dates`,
+              `feature_generator.build_features` and `feature_generator.export`, on the data of the first ticker
+            - `dataset.windowing`: building the Dataset from the exported data
+            - `dataset.transform`: scaling `transform_windows` windows
+            - `dataset.save_to_disk`, `dataset.load`, `dataset.save_to_disk_compact` and `dataset.load_compact`
+
+        Every file is written to a temporary directory, which is deleted at the end of the run.
+
+        :param tickers: The number of tickers to scrape
+        :type tickers: int
+        :param days: The number of trading days of data of each ticker
+        :type days: int
+        :param start: The first date of the data
+        :type start: str
+        :param lookback_size: The lookback/window size of the Dataset
+        :type lookback_size: int
+        :param seed: The seed of the synthetic data
+        :type seed: int
+        :param latency: The simulated latency of each request to the fake client, in seconds
+        :type latency: float
+        :param transform_windows: The number of windows to scale in the `dataset.transform` stage
+        :type transform_windows: int
+        :param trace_memory: Whether to measure the memory of each stage (see StageRecorder)
+        :type trace_memory: bool
+        """
+        assert tickers > 0 and days > 0, 'Error: the benchmark needs at least one ticker and one day of data.'
+        self.tickers = [Ticker(f'SYN{i}', f'Synthetic-{i}') for i in range(tickers)]
+        self.days = days
+        self.start = start
+        self.lookback_size = lookback_size
+        self.seed = seed
+        self.latency = latency
+        self.transform_windows = transform_windows
+        self.trace_memory = trace_memory
+
+    @property
+    def config(self):
+        return {
+            'tickers': len(self.tickers), 'days': self.days, 'start': self.start, 'lookback_size': self.lookback_size,
+            'seed': self.seed, 'latency': self.latency, 'transform_windows': self.transform_windows,
+            'trace_memory': self.trace_memory
+        }
+
+    def run(self, repeat: int = 1):
+        """
+        This function runs the whole pipeline `repeat` times, and keeps the fastest time and the largest memory of
+        each stage.
+
+        :return: Returns the results: the configuration and environment of the run under 'meta', and the
+        measurements of each stage under 'stages'
+        :rtype: dict
+        """
+        assert repeat > 0, 'Error: repeat must be at least 1.'
+        stages = {}
+        for _ in range(repeat):
+            for name, result in self.__run_once__().items():
+                if name not in stages or 'error' in stages[name]:
+                    stages[name] = result
+                    continue
+                best = stages[name]
+                if 'error' in result:
+                    continue
+                if result['seconds'] < best['seconds']:
+                    best['seconds'] = result['seconds']
+                    if 'rows' in best:
+                        best['rows_per_second'] = result['rows_per_second']
+                for key in ('peak_bytes', 'retained_bytes'):
+                    if key in result:
+                        best[key] = max(best[key], result[key])
+
+        return {
+            'meta': {
+                'timestamp': int(time.time()),
+                'config': dict(self.config, repeat=repeat),
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'pandas': pd.__version__,
+                'platform': platform.platform(),
+                'processor': platform.processor(),
+            },
+            'stages': stages
+        }
+
+    def __run_once__(self):
+        recorder = StageRecorder(trace_memory=self.trace_memory)
+        stage = recorder.stage
+        original_directory = os.getcwd()
+
+        if self.trace_memory:
+            tracemalloc.start()
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                # Every output path of the library is relative to the working directory
+                os.chdir(directory)
+                end = SyntheticMinuteBars.trading_days(self.start, self.days)[-1].strftime('%Y-%m-%d')
+                scraper = Scraper(
+                    config_file=None, should_print=False,
+                    client=FakeIEXClient(SyntheticMinuteBars(seed=self.seed), latency=self.latency),
+                    rate_limiter=TokenBucket(rate=1e9)
+                )
+                rows = self.days * SyntheticMinuteBars.MINUTES_PER_DAY
+
+                with stage('scraper.get_intraday_stock_data', rows=rows):
+                    _, filename = scraper.get_intraday_stock_data(self.tickers[0], self.start, end)
+                with stage('scraper.get_intraday_stock_data_bulk', rows=rows * len(self.tickers)):
+                    scraper.get_intraday_stock_data_bulk(self.tickers, self.start, end)
+
+                with stage('feature_generator.init', rows=rows):
+                    feature_generator = FeatureGenerator(filename=filename, auto_clean=False, parse_dates=False)
+                with stage('feature_generator.cleanup', rows=rows):
+                    feature_generator.__cleanup__()
+                with stage('feature_generator.parse_dates', rows=rows):
+                    feature_generator.__parse_dates__()
+                with stage('feature_generator.build_features', rows=rows):
+                    feature_generator.build_features(self.FEATURES)
+                    feature_generator.build_features(self.TARGETS)
+                with stage('feature_generator.export', rows=rows):
+                    exported_data = feature_generator.export(
+                        target_feature=self.TARGET_FEATURE, features_to_exclude=self.FEATURES_TO_EXCLUDE
+                    )
+                del feature_generator
+
+                with stage('dataset.windowing', rows=len(exported_data)):
+                    dataset = Dataset(df=exported_data, lookback_size=self.lookback_size, train_fraction=0.7,
+                                      target_max_threshold=float('inf'))
+                num_windows = dataset.arr.shape[0]
+                windows = np.array(dataset.arr[:self.transform_windows])
+                with stage('dataset.transform', rows=len(windows)):
+                    dataset.transform(windows[:, :, :-1])
+                del windows
+
+                for suffix, compact in (('', False), ('_compact', True)):
+                    with stage(f'dataset.save_to_disk{suffix}', rows=num_windows):
+                        path = dataset.save_to_disk(f'benchmark{suffix}', compact=compact)
+                    with stage(f'dataset.load{suffix}', rows=num_windows):
+                        Dataset(folder_path=path)
+                os.chdir(original_directory)
+        finally:
+            os.chdir(original_directory)
+            if self.trace_memory:
+                tracemalloc.stop()
+
+        return recorder.stages
+
+
+def compare(results: dict, baseline: dict, tolerance: float = BenchmarkConstants.DEFAULT_TOLERANCE):
+    """
+    This function compares the stages of two benchmark results. A stage regresses when it is more than `tolerance`
+    slower, or uses more than `tolerance` more peak memory, than in the baseline (differences below
+    `BenchmarkConstants.MIN_SECONDS_DIFFERENCE` and `MIN_BYTES_DIFFERENCE` are ignored as noise).
+
+    :param results: The results of the new run
+    :type results: dict
+    :param baseline: The results of the baseline run
+    :type baseline: dict
+    :param tolerance: The accepted relative increase, e.g. 0.2 for 20%
+    :type tolerance: float
+    :return: Returns a tuple of:
+        Tuple Element 1 (list[dict]): one comparison per stage and metric found in both results
+        Tuple Element 2 (list[dict]): the comparisons that regressed
+    :rtype: (list[dict], list[dict])
+    """
+    thresholds = {
+        'seconds': BenchmarkConstants.MIN_SECONDS_DIFFERENCE,
+        'peak_bytes': BenchmarkConstants.MIN_BYTES_DIFFERENCE
+    }
+    comparisons = []
+    for name, stage in results['stages'].items():
+        baseline_stage = baseline['stages'].get(name)
+        if baseline_stage is None:
+            continue
+        if 'error' in stage or 'error' in baseline_stage:
+            # A stage that stopped failing isn't a regression, but a stage that started failing is
+            comparisons.append({
+                'stage': name, 'metric': 'error', 'value': stage.get('error'), 'baseline': baseline_stage.get('error'),
+                'change': None, 'regressed': 'error' in stage and 'error' not in baseline_stage
+            })
+            continue
+        for metric, min_difference in thresholds.items():
+            if metric not in stage or metric not in baseline_stage:
+                continue
+            value, baseline_value = stage[metric], baseline_stage[metric]
+            comparisons.append({
+                'stage': name,
+                'metric': metric,
+                'value': value,
+                'baseline': baseline_value,
+                'change': (value - baseline_value) / baseline_value if baseline_value > 0 else None,
+                'regressed': value > baseline_value * (1 + tolerance) and value - baseline_value > min_difference
+            })
+    return comparisons, [c for c in comparisons if c['regressed']]
+
+
+def format_results(results: dict):
+    """
+    :return: Returns a table of the measurements of each stage
+    :rtype: str
+    """
+    width = max([40] + [len(name) + 2 for name in results['stages']])
+    lines = [f"{'stage':<{width}}{'seconds':>10}{'rows/s':>14}{'peak MiB':>10}{'kept MiB':>10}"]
+    for name, stage in results['stages'].items():
+        if 'error' in stage:
+            lines.append(f"{name:<{width}}  failed: {stage['error']}")
+            continue
+        rows_per_second = f"{stage['rows_per_second']:.0f}" if 'rows_per_second' in stage else '-'
+        peak = f"{stage['peak_bytes'] / 2 ** 20:.1f}" if 'peak_bytes' in stage else '-'
+        retained = f"{stage['retained_bytes'] / 2 ** 20:.1f}" if 'retained_bytes' in stage else '-'
+        lines.append(f"{name:<{width}}{stage['seconds']:>10.3f}{rows_per_second:>14}{peak:>10}{retained:>10}")
+    return '\n'.join(lines)
+
+
+def format_comparisons(comparisons: list[dict]):
+    """
+    :return: Returns a table of the comparisons of each stage with the baseline
+    :rtype: str
+    """
+    width = max([40] + [len(c['stage']) + 2 for c in comparisons])
+    lines = [f"{'stage':<{width}}{'metric':>12}{'baseline':>12}{'value':>12}{'change':>10}"]
+    for c in comparisons:
+        if c['metric'] == 'error':
+            status = 'REGRESSED: now failing' if c['regressed'] else ('fixed' if c['value'] is None else 'failing')
+            lines.append(f"{c['stage']:<{width}}{'error':>12}  {status}")
+            continue
+        change = f"{c['change']:+.1%}" if c['change'] is not None else '-'
+        flag = '  REGRESSED' if c['regressed'] else ''
+        lines.append(f"{c['stage']:<{width}}{c['metric']:>12}{c['baseline']:>12.4g}{c['value']:>12.4g}{change:>10}{flag}")
+    return '\n'.join(lines)
+
+
+def main(args: list[str] = None):
+    parser = argparse.ArgumentParser(description='Benchmark the data pipeline on synthetic minute bars.')
+    parser.add_argument('--tickers', type=int, default=2, help='The number of tickers to scrape')
+    parser.add_argument('--days', type=int, default=20, help='The number of trading days of data of each ticker')
+    parser.add_argument('--lookback-size', type=int, default=60, help='The lookback/window size of the Dataset')
+    parser.add_argument('--seed', type=int, default=0, help='The seed of the synthetic data')
+    parser.add_argument('--latency', type=float, default=0.0, help='The simulated latency of each request, in seconds')
+    parser.add_argument('--repeat', type=int, default=1, help='The number of runs (the fastest time is kept)')
+    parser.add_argument('--no-memory', action='store_true', help="Don't measure memory (faster, more precise times)")
+    parser.add_argument('--output', default=None,
+                        help=f'The JSON file to write the results to. Default: {BenchmarkConstants.OUTPUT_DIR}/'
+                             f'<timestamp>.json')
+    parser.add_argument('--baseline', default=None, help='A previous JSON result file to compare the results with')
+    parser.add_argument('--tolerance', type=float, default=BenchmarkConstants.DEFAULT_TOLERANCE,
+                        help='The accepted relative regression of any stage, e.g. 0.2 for 20%%')
+    args = parser.parse_args(args)
+
+    benchmark = PipelineBenchmark(tickers=args.tickers, days=args.days, lookback_size=args.lookback_size,
+                                  seed=args.seed, latency=args.latency, trace_memory=not args.no_memory)
+    results = benchmark.run(repeat=args.repeat)
+    print(format_results(results))
+
+    output = args.output or f"{BenchmarkConstants.OUTPUT_DIR}/{results['meta']['timestamp']}.json"
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump(results, file, indent=4)
+    print(f"Successfully saved benchmark results to {output}")
+
+    if args.baseline is None:
+        return 0
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    if baseline['meta']['config'] != results['meta']['config']:
+        print(f"Warning: the baseline was run with a different configuration: {baseline['meta']['config']}")
+    comparisons, regressions = compare(results, baseline, args.tolerance)
+    print(format_comparisons(comparisons))
+    print(f"{len(regressions)} regression(s) above {args.tolerance:.0%}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,160 @@
+import threading
+import time
+import zlib
+import numpy as np
+import pandas as pd
+from lib.constants import MetaConstants, ScraperConstants
+
+IEX_FIELD_NAMES = MetaConstants.IEXDataFields
+
+
+class SyntheticMinuteBars:
+    # A regular trading day has 390 minute bars, from 09:30 to 15:59
+    MINUTES_PER_DAY = 390
+    FIRST_MINUTE = 9 * 60 + 30
+
+    def __init__(self, seed: int = 0, iex_gap_probability: float = 0.03, market_gap_probability: float = 0.002,
+                 mean_gap_length: float = 5):
+        """
+        SyntheticMinuteBars generates deterministic minute bars with the shape of IEXCloud intraday data: every
+        `MetaConstants.IEXDataFields` column, with the same types as the responses of pyEX. The same (seed, ticker,
+        date) always generates the same bars, so benchmarks can be compared between runs and machines.
+
+        Prices follow a random walk per ticker. Like real IEXCloud data, the bars have runs of minutes without any
+        trade: IEX-only fields (e.g. `volume`, `average`) have frequent gaps, where the volume and the number of trades
+        are 0 and the prices are empty, and market-wide fields (e.g. `marketVolume`) have rare ones.
+
+        :param seed: The random seed
+        :type seed: int
+        :param iex_gap_probability: The probability that a run of minutes without IEX trades starts at any minute
+        :type iex_gap_probability: float
+        :param market_gap_probability: The probability that a run of minutes without any market trade starts at any
+        minute
+        :type market_gap_probability: float
+        :param mean_gap_length: The mean number of minutes of a run without trades
+        :type mean_gap_length: float
+        """
+        self.seed = seed
+        self.iex_gap_probability = iex_gap_probability
+        self.market_gap_probability = market_gap_probability
+        self.mean_gap_length = mean_gap_length
+
+    def day(self, ticker: str, date):
+        """
+        This function generates the bars of one trading day, like `pyEX.Client.chartDF(ticker, date=date)`: indexed
+        by date, with 'HH:MM' minutes. Weekends have no bars.
+
+        :param ticker: The ticker symbol
+        :type ticker: str
+        :param date: The date
+        :type date: str | datetime.date
+        :rtype: pd.DataFrame
+        """
+        date = pd.Timestamp(date)
+        if date.weekday() >= 5:
+            return pd.DataFrame()
+        rng = np.random.default_rng((self.seed, zlib.crc32(ticker.encode()), date.toordinal()))
+        n = self.MINUTES_PER_DAY
+
+        # The base price only depends on the ticker, so every day of a ticker trades around the same price
+        base_price = 20 + zlib.crc32(ticker.encode()) % 300 + rng.normal(0, 1)
+        market_close = base_price * np.exp(np.cumsum(rng.normal(0, 5e-4, n)))
+        market_open = np.r_[base_price, market_close[:-1]]
+        spread = np.abs(rng.normal(0, 2e-4, n)) * market_close
+        market_high = np.maximum(market_open, market_close) + spread
+        market_low = np.minimum(market_open, market_close) - spread
+        market_volume = rng.lognormal(8, 1, n).round()
+        market_volume[self.__gaps__(rng, self.market_gap_probability, n)] = 0
+        market_trades = np.where(market_volume > 0, np.ceil(market_volume / rng.uniform(50, 200, n)), 0)
+
+        volume = np.minimum(rng.lognormal(5, 1, n).round(), market_volume)
+        volume[self.__gaps__(rng, self.iex_gap_probability, n)] = 0
+        trades = np.where(volume > 0, np.ceil(volume / rng.uniform(50, 200, n)), 0)
+        has_trades = volume > 0
+
+        def iex(values):
+            # IEXCloud doesn't return IEX-only prices for minutes without an IEX trade
+            return np.where(has_trades, values, np.nan)
+
+        def market(values):
+            return np.where(market_volume > 0, values, np.nan)
+
+        minutes = self.FIRST_MINUTE + np.arange(n)
+        hours, minutes_of_hour = minutes // 60, minutes % 60
+        market_average = (market_high + market_low + market_close) / 3
+        average = market_average + rng.normal(0, 1e-4, n) * market_average
+
+        df = pd.DataFrame({
+            IEX_FIELD_NAMES.date: date.strftime('%Y-%m-%d'),
+            IEX_FIELD_NAMES.minute: [f'{h:02d}:{m:02d}' for h, m in zip(hours, minutes_of_hour)],
+            IEX_FIELD_NAMES.label: [f'{(h - 1) % 12 + 1}:{m:02d} {"AM" if h < 12 else "PM"}'
+                                    for h, m in zip(hours, minutes_of_hour)],
+            IEX_FIELD_NAMES.high: iex(market_high),
+            IEX_FIELD_NAMES.low: iex(market_low),
+            IEX_FIELD_NAMES.average: iex(average),
+            IEX_FIELD_NAMES.volume: volume,
+            IEX_FIELD_NAMES.notional: volume * np.nan_to_num(iex(average)),
+            IEX_FIELD_NAMES.numberOfTrades: trades,
+            IEX_FIELD_NAMES.marketHigh: market(market_high),
+            IEX_FIELD_NAMES.marketLow: market(market_low),
+            IEX_FIELD_NAMES.marketAverage: market(market_average),
+            IEX_FIELD_NAMES.marketVolume: market_volume,
+            IEX_FIELD_NAMES.marketNotional: market_volume * market_average,
+            IEX_FIELD_NAMES.marketNumberOfTrades: market_trades,
+            IEX_FIELD_NAMES.open: iex(market_open),
+            IEX_FIELD_NAMES.close: iex(market_close),
+            IEX_FIELD_NAMES.marketOpen: market(market_open),
+            IEX_FIELD_NAMES.marketClose: market(market_close),
+            IEX_FIELD_NAMES.changeOverTime: iex(market_close / base_price - 1),
+            IEX_FIELD_NAMES.marketChangeOverTime: market(market_close / base_price - 1),
+        })
+        return df.set_index(IEX_FIELD_NAMES.date)
+
+    def frame(self, ticker: str, start: str, days: int):
+        """
+        This function generates the bars of `days` consecutive trading days (Monday to Friday) from `start`.
+
+        :rtype: pd.DataFrame
+        """
+        return pd.concat([self.day(ticker, date) for date in self.trading_days(start, days)])
+
+    @staticmethod
+    def trading_days(start: str, days: int):
+        return list(pd.bdate_range(start, periods=days))
+
+    def __gaps__(self, rng: np.random.Generator, probability: float, n: int):
+        """
+        This function returns a boolean mask of the minutes without trades: runs that start at any minute with the
+        given probability, with geometrically distributed lengths.
+        """
+        gap = np.zeros(n + 1, dtype=int)
+        starts = np.flatnonzero(rng.random(n) < probability)
+        lengths = rng.geometric(1 / self.mean_gap_length, len(starts))
+        np.add.at(gap, starts, 1)
+        np.add.at(gap, np.minimum(starts + lengths, n), -1)
+        return np.cumsum(gap[:-1]) > 0
+
+
+class FakeIEXClient:
+    def __init__(self, bars: SyntheticMinuteBars, latency: float = 0.0):
+        """
+        FakeIEXClient is a stand-in for `pyEX.Client` that serves SyntheticMinuteBars, so that the Scraper can be run
+        without IEXCloud credentials: `Scraper(config_file=None, client=FakeIEXClient(bars))`.
+
+        :param bars: The generator of the bars to serve
+        :type bars: SyntheticMinuteBars
+        :param latency: The simulated latency of each request, in seconds
+        :type latency: float
+        """
+        self.bars = bars
+        self.latency = latency
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def chartDF(self, symbol: str, date=None, sort: str = ScraperConstants.SortMethods.ASC):
+        with self.lock:
+            self.calls += 1
+        if self.latency > 0:
+            time.sleep(self.latency)
+        df = self.bars.day(symbol, date)
+        return df.iloc[::-1] if sort == ScraperConstants.SortMethods.DESC else df
@@ -0,0 +1,43 @@
+"""
+The public API of the package:
+
+```
+from lib import Scraper, FeatureGenerator, Dataset, CommonFeatures, CommonTargets
+```
+
+Every name is imported lazily, on first access, so `import lib` itself is instant and each worker only pays for the
+modules (and dependencies) it actually uses: e.g. an inference worker that only uses `Dataset` never imports pyEX.
+"""
+import importlib
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from lib.data.dataset import Dataset
+    from lib.data.feature_generator import FeatureGenerator
+    from lib.data.features.common_features import CommonFeatures
+    from lib.data.features.common_targets import CommonTargets
+    from lib.scraper.scraper import Scraper
+
+__all__ = ['Scraper', 'FeatureGenerator', 'Dataset', 'CommonFeatures', 'CommonTargets']
+
+# The module that defines each public name
+__lazy_names__ = {
+    'Scraper': 'lib.scraper.scraper',
+    'FeatureGenerator': 'lib.data.feature_generator',
+    'Dataset': 'lib.data.dataset',
+    'CommonFeatures': 'lib.data.features.common_features',
+    'CommonTargets': 'lib.data.features.common_targets',
+}
+
+
+def __getattr__(name: str):
+    if name not in __lazy_names__:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(__lazy_names__[name]), name)
+    # Later accesses don't go through __getattr__ anymore
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,126 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+import pandas as pd
+from lib.constants import CacheConstants
+
+
+class DiskCache:
+    def __init__(self, directory: str, max_bytes: int = CacheConstants.DEFAULT_MAX_BYTES):
+        """
+        DiskCache is a persistent, content-addressed cache of DataFrames. Each entry is stored as its own compact
+        columnar (parquet) file, named after a hash of its key. The total size of the cache is capped at `max_bytes`:
+        when a new entry doesn't fit, the least recently used entries are evicted.
+
+        DiskCache is thread-safe, and keeps hit/miss counts that can be printed with `report()`. The size of every
+        entry and their order of use are scanned from the directory once, when the cache is created, and then kept up
+        to date in memory, so a put costs the same whatever the number of entries.
+
+        :param directory: The directory to store the cache in. It can be shared between runs.
+        :type directory: str
+        :param max_bytes: The maximum total size of the cache, in bytes.
+        :type max_bytes: int
+        """
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0}
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # The size of every entry, from the least to the most recently used
+        entries = sorted(((path.stat(), path) for path in self.__entries__()), key=lambda entry: entry[0].st_mtime)
+        self.__lru__ = OrderedDict((path, stat.st_size) for stat, path in entries)
+        self.total_bytes = sum(self.__lru__.values())
+
+    @staticmethod
+    def key_hash(key: tuple):
+        """
+        This function returns the hex digest that addresses `key`, a tuple of strings (or objects with a stable
+        `str()`), in the cache.
+        """
+        return hashlib.sha256('\x1f'.join(str(part) for part in key).encode('utf-8')).hexdigest()
+
+    def get(self, key: tuple):
+        """
+        :return: Returns the DataFrame stored for `key`, or None if it isn't in the cache.
+        :rtype: pd.DataFrame
+        """
+        path = self.__path__(key)
+        try:
+            df = pd.read_parquet(path)
+        except (FileNotFoundError, OSError):
+            with self.lock:
+                self.stats['misses'] += 1
+            return None
+        except ValueError:
+            # A corrupt or partial entry (pyarrow's ArrowInvalid is a ValueError) is a miss, and is removed so that
+            # it can be written again
+            with self.lock:
+                self.stats['misses'] += 1
+                self.total_bytes -= self.__lru__.pop(path, 0)
+                path.unlink(missing_ok=True)
+            return None
+
+        with self.lock:
+            self.stats['hits'] += 1
+            # An entry evicted by another thread since it was read must not be recreated
+            if path in self.__lru__:
+                self.__lru__.move_to_end(path)
+                # The modification time is used as the last access time for the LRU order of the next runs
+                try:
+                    os.utime(path)
+                except FileNotFoundError:
+                    pass
+        return df
+
+    def put(self, key: tuple, df: pd.DataFrame):
+        """
+        This function stores `df` for `key`, and evicts the least recently used entries if the cache is then too big.
+        """
+        path = self.__path__(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Write to a temporary file first, so that concurrent readers never see a partial entry
+        tmp_path = path.with_name(f'{path.name}.{threading.get_ident()}.tmp')
+        df.to_parquet(tmp_path)
+
+        with self.lock:
+            previous_size = self.__lru__.pop(path, 0)
+            os.replace(tmp_path, path)
+            size = path.stat().st_size
+            self.__lru__[path] = size
+            self.total_bytes += size - previous_size
+            self.stats['writes'] += 1
+            if self.total_bytes > self.max_bytes:
+                self.__evict__()
+
+    def __contains__(self, key: tuple):
+        return self.__path__(key).exists()
+
+    def report(self):
+        """
+        :return: Returns a one-line summary of the cache usage since it was created.
+        :rtype: str
+        """
+        lookups = self.stats['hits'] + self.stats['misses']
+        hit_rate = self.stats['hits'] / lookups if lookups > 0 else 0
+        return (f"Cache {self.directory}: {self.stats['hits']} hits, {self.stats['misses']} misses "
+                f"({hit_rate:.1%} hit rate), {self.stats['writes']} writes, {self.stats['evictions']} evictions, "
+                f"{self.total_bytes / 1024 ** 2:.1f}MB used")
+
+    def __path__(self, key: tuple):
+        key_hash = self.key_hash(key)
+        return self.directory / key_hash[:2] / f'{key_hash}{CacheConstants.FILE_EXTENSION}'
+
+    def __entries__(self):
+        return self.directory.glob(f'*/*{CacheConstants.FILE_EXTENSION}')
+
+    def __evict__(self):
+        # Evicts the least recently used entries until the cache fits in max_bytes. Must be called with the lock held.
+        while self.total_bytes > self.max_bytes and self.__lru__:
+            path, size = self.__lru__.popitem(last=False)
+            path.unlink(missing_ok=True)
+            self.total_bytes -= size
+            self.stats['evictions'] += 1
@@ -26,9 +26,23 @@ class MetaConstants:
         marketChangeOverTime = 'marketChangeOverTime'
 
 
+class CacheConstants:
+
+    DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+    FILE_EXTENSION = '.parquet'
+
+
 class ScraperConstants:
 
     OUTPUT_DIR = f'{MetaConstants.BASE_EXPORT_DIR}/raw'
+    CACHE_DIR = f'{MetaConstants.BASE_EXPORT_DIR}/cache/responses'
+    STORE_DIR = f'{MetaConstants.BASE_EXPORT_DIR}/raw/store'
+    RAW_FILE_EXTENSION = '.parquet'
+    MANIFEST_SUFFIX = '.manifest.json'
+    # A day that came back empty this many times (e.g. a trading day without any trades) isn't requested again
+    MAX_EMPTY_DAY_ATTEMPTS = 3
+    # IEXCloud dates are in the exchange's timezone
+    MARKET_TIMEZONE = 'America/New_York'
 
     class Config:
         API_TOKEN = 'api_token'
@@ -43,9 +57,65 @@ class ScraperConstants:
         ASC = 'asc'
         DESC = 'desc'
 
+    class ErrorTypes:
+        # Too many requests: retried after a backoff
+        RATE_LIMIT = 'rate_limit'
+        # Unknown symbol or no data for the date: not retried, the request is skipped
+        NOT_FOUND = 'not_found'
+        # Server or connection errors: retried after a backoff
+        TRANSIENT = 'transient'
+        # Bad request, bad credentials or exhausted quota: not retried, scraping stops
+        FATAL = 'fatal'
+
+    class RateLimits:
+        # IEXCloud allows 100 requests per second per IP address
+        REQUESTS_PER_SECOND = 100
+
+
+class FeatureConstants:
+
+    CACHE_DIR = f'{MetaConstants.BASE_EXPORT_DIR}/cache/features'
+
+    class DtypePolicies:
+        # Every exported column is float64
+        FLOAT64 = 'float64'
+        # float32 for continuous features, uint8 for dummies and the smallest integer type for integer features.
+        # String features are stored as category, and can't be exported
+        COMPACT = 'compact'
+
+
+class BenchmarkConstants:
+
+    OUTPUT_DIR = f'{MetaConstants.BASE_EXPORT_DIR}/benchmarks'
+    # A stage regresses when it is this fraction slower (or uses this fraction more memory) than in the baseline
+    DEFAULT_TOLERANCE = 0.2
+    # Differences smaller than these are noise, whatever the ratio
+    MIN_SECONDS_DIFFERENCE = 0.01
+    MIN_BYTES_DIFFERENCE = 2 ** 20
+
 
 class DatasetConstants:
 
     OUTPUT_DIR = f'{MetaConstants.BASE_EXPORT_DIR}/datasets'
     META_FILENAME = 'meta-as-fuck.json'
+    SHARDS_FILENAME = 'shards.json'
+    # The number of rows read at a time when computing the normalization stats
+    STATS_CHUNK_ROWS = 2 ** 16
+
+    class Splits:
+        TRAIN = 'train'
+        VAL = 'val'
+        TEST = 'test'
+
+    class StorageFormats:
+        # Every window is stored, as an array of shape (num_windows, lookback_size, num_features)
+        WINDOWS = 'windows'
+        # Only the unwindowed rows and the start row of each window are stored, and windows are rebuilt on load
+        COMPACT = 'compact'
+
+    class Scalings:
+        # (x - min) / (max - min): every feature of the training data is scaled to [0, 1]
+        MINMAX = 'minmax'
+        # (x - mean) / std: every feature of the training data has a mean of 0 and a standard deviation of 1
+        ZSCORE = 'zscore'
 
@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+from lib.constants import MetaConstants
+
+IEX_FIELD_NAMES = MetaConstants.IEXDataFields
+
+
+class DataCleaner:
+    """
+    DataCleaner repairs "bad rows" in raw IEXCloud data: rows with no trades or no volume have unreliable market data,
+    so their market fields are purged and then filled with the closest good value of the same trading day. Empty values
+    in any other float column are filled the same way.
+
+    Only the affected columns are touched, in place (one column at a time, never the whole frame), and the fills never
+    cross a day boundary: a value is forward filled from the last good value of its day, or, at the beginning of a day,
+    backward filled from the first good value of its day. A column that has no good value in a day stays empty for that
+    day.
+
+    DataCleaner can also clean a stream of chunks of the same data (e.g. `RawDataHandle.iter_chunks`): the last good
+    values of each chunk are carried over to the next one, so a day split between chunks is forward filled like it would
+    be in one piece.
+    """
+
+    # The fields whose values can't be trusted on bad rows
+    PURGED_FIELDS = [
+        IEX_FIELD_NAMES.marketAverage, IEX_FIELD_NAMES.marketVolume, IEX_FIELD_NAMES.marketNotional,
+        IEX_FIELD_NAMES.marketNumberOfTrades, IEX_FIELD_NAMES.marketOpen, IEX_FIELD_NAMES.marketClose,
+        IEX_FIELD_NAMES.marketChangeOverTime
+    ]
+    # A row is bad if any of these fields is 0 (or negative)
+    BAD_ROW_FIELDS = [
+        IEX_FIELD_NAMES.numberOfTrades, IEX_FIELD_NAMES.marketNumberOfTrades,
+        IEX_FIELD_NAMES.marketVolume, IEX_FIELD_NAMES.volume
+    ]
+
+    def __init__(self, purged_fields: list[str] = None, bad_row_fields: list[str] = None):
+        """
+        :param purged_fields: (Optional) The fields to purge on bad rows. Default is `PURGED_FIELDS`.
+        :type purged_fields: list[str]
+        :param bad_row_fields: (Optional) The fields that identify bad rows. Default is `BAD_ROW_FIELDS`.
+        :type bad_row_fields: list[str]
+        """
+        self.purged_fields = self.PURGED_FIELDS if purged_fields is None else purged_fields
+        self.bad_row_fields = self.BAD_ROW_FIELDS if bad_row_fields is None else bad_row_fields
+        self.stats = {'rows': 0, 'bad_rows': 0, 'filled': {}, 'unfilled': {}}
+
+        # The last good value of each column, with its day
+        self.__last_values__ = {}
+
+    def clean(self, df: pd.DataFrame):
+        """
+        This is a MUTATING function that cleans `df` in place. It can be called on consecutive chunks of the same data.
+
+        :param df: The raw data (or the next chunk of it), sorted by time
+        :type df: pd.DataFrame
+        :return: Returns the stats of this chunk: the number of rows, of bad rows, and of values filled and left
+        empty in each column. The totals over every chunk are kept in `stats`.
+        :rtype: dict
+        """
+        stats = {'rows': len(df), 'bad_rows': 0, 'filled': {}, 'unfilled': {}}
+        if len(df) == 0:
+            return stats
+
+        bad_rows = np.zeros(len(df), dtype=bool)
+        for field in self.bad_row_fields:
+            if field in df.columns:
+                bad_rows |= df[field].to_numpy() <= 0
+        stats['bad_rows'] = int(bad_rows.sum())
+
+        days = df[IEX_FIELD_NAMES.date].to_numpy() if IEX_FIELD_NAMES.date in df.columns else np.zeros(len(df))
+        day_starts = np.r_[True, days[1:] != days[:-1]]
+        day_ends = np.r_[day_starts[1:], True]
+        first_day_length = np.argmax(np.r_[day_starts[1:], True]) + 1
+
+        purged_fields = set(self.purged_fields)
+        for column in df.columns:
+            is_purged = column in purged_fields and pd.api.types.is_numeric_dtype(df[column])
+            if not (is_purged or pd.api.types.is_float_dtype(df[column])):
+                continue
+            values = df[column].to_numpy(dtype=float)
+            missing = np.isnan(values)
+            if is_purged:
+                missing = missing | bad_rows
+            if not missing.any():
+                self.__carry__(column, days, values)
+                continue
+
+            values = np.where(missing, np.nan, values)
+            last_day, last_value = self.__last_values__.get(column, (None, np.nan))
+            if last_day is not None and days[0] == last_day:
+                # The first rows of the chunk continue the day of the last good value of the previous chunks
+                head = values[:first_day_length]
+                head[np.isnan(head) & (np.cumsum(~np.isnan(head)) == 0)] = last_value
+            values = self.__backward_fill__(self.__forward_fill__(values, day_starts), day_ends)
+
+            df[column] = values
+            unfilled = int(np.isnan(values).sum())
+            stats['filled'][column] = int(missing.sum()) - unfilled
+            if unfilled:
+                stats['unfilled'][column] = unfilled
+            self.__carry__(column, days, values)
+
+        self.__add_stats__(stats)
+        return stats
+
+    def report(self):
+        """
+        :return: Returns a one-line summary of `stats`
+        :rtype: str
+        """
+        filled = ', '.join(f'{c}: {n}' for c, n in self.stats['filled'].items() if n > 0) or 'none'
+        return (f"DataCleaner: {self.stats['bad_rows']} bad rows out of {self.stats['rows']}, "
+                f"values filled per column: {filled}, values left empty: {sum(self.stats['unfilled'].values())}")
+
+    def __carry__(self, column: str, days: np.ndarray, values: np.ndarray):
+        # Only a good value is carried over to the next chunk, with its day, so that it can only fill that same day
+        if np.isfinite(values[-1]):
+            self.__last_values__[column] = (days[-1], values[-1])
+
+    def __add_stats__(self, stats: dict):
+        self.stats['rows'] += stats['rows']
+        self.stats['bad_rows'] += stats['bad_rows']
+        for key in ('filled', 'unfilled'):
+            for column, count in stats[key].items():
+                self.stats[key][column] = self.stats[key].get(column, 0) + count
+
+    @staticmethod
+    def __forward_fill__(values: np.ndarray, day_starts: np.ndarray):
+        # The index of the last good value (or of the first row of the day), by a running maximum of indices
+        index = np.where(~np.isnan(values) | day_starts, np.arange(len(values)), 0)
+        return values[np.maximum.accumulate(index)]
+
+    @staticmethod
+    def __backward_fill__(values: np.ndarray, day_ends: np.ndarray):
+        # The index of the next good value (or of the last row of the day), by a running minimum of indices
+        index = np.where(~np.isnan(values) | day_ends, np.arange(len(values)), len(values) - 1)
+        return values[np.minimum.accumulate(index[::-1])[::-1]]
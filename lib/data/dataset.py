@@ -1,18 +1,92 @@
 import numpy as np
+import queue
+import threading
 import time
 from pathlib import Path
-import h5py
 import json
+from typing import TYPE_CHECKING
 from lib.constants import DatasetConstants
-import pandas as pd
+from lib.data.running_stats import RunningStats
+from lib.data.window_array import WindowArray, SlidingWindowArray, StoredWindowArray
+from lib.instrumentation import Instrumentation
+
+if TYPE_CHECKING:
+    # pandas and h5py are only imported when they are used (see `__h5py__`)
+    import h5py
+    import pandas as pd
+
+
+SCALINGS = DatasetConstants.Scalings
+
+
+class Fold:
+    def __init__(self, number: int, train: WindowArray, val: WindowArray, train_dates: tuple, val_dates: tuple):
+        """
+        Fold is one train/validation split of a walk-forward cross-validation (see `Dataset.folds`). Its `train` and
+        `val` are views over the windows of the Dataset, so creating a fold doesn't copy any data.
+
+        :param number: The number of this fold, starting from 0 for the earliest validation dates
+        :type number: int
+        :param train: The training windows, with shape (num_windows, lookback_size, num_features)
+        :type train: WindowArray | np.ndarray
+        :param val: The validation windows, with shape (num_windows, lookback_size, num_features)
+        :type val: WindowArray | np.ndarray
+        :param train_dates: The first and last date of the training windows
+        :type train_dates: (np.datetime64, np.datetime64)
+        :param val_dates: The first and last date of the validation windows
+        :type val_dates: (np.datetime64, np.datetime64)
+        """
+        self.number = number
+        self.train = train
+        self.val = val
+        self.train_dates = train_dates
+        self.val_dates = val_dates
+
+    def __repr__(self):
+        return f'Fold({self.number}, train={self.train_dates[0]}..{self.train_dates[1]} ({len(self.train)} windows), ' \
+               f'val={self.val_dates[0]}..{self.val_dates[1]} ({len(self.val)} windows))'
+
+    @property
+    def train_X(self):
+        return self.train[:, :, :-1]
+
+    @property
+    def train_y(self):
+        return self.train[:, :, -1:]
+
+    @property
+    def val_X(self):
+        return self.val[:, :, :-1]
+
+    @property
+    def val_y(self):
+        return self.val[:, :, -1:]
 
 
 class Dataset:
-    def __init__(self, df: pd.DataFrame = None, lookback_size: int = 60, train_fraction: float = 0.8,
-                 folder_path: str = None, target_max_threshold: float = 0.03):
+    def __init__(self, df: 'pd.DataFrame' = None, lookback_size: int = 60, train_fraction: float = 0.8,
+                 folder_path: str = None, target_max_threshold: float = 0.03, materialize: bool = False,
+                 lazy: bool = False, split_dates: tuple = None, instrumentation: Instrumentation = None,
+                 scaling: str = SCALINGS.MINMAX):
         """
         Can be initialized by providing the values: (df, lookback_size, train_fraction) or (folder_path).
-        :param df: The dataframe generated by the FeatureGenerator class.
+
+        When initialized from a DataFrame, the windows are not copied: `arr` is a SlidingWindowArray, which keeps one
+        contiguous array of rows and the start index of each window, and only reads windows when they are accessed.
+
+        When initialized from a folder with `lazy=True`, nothing but the metadata and the stats is read into memory:
+        `arr` is a StoredWindowArray (or a SlidingWindowArray, for the compact format) backed by a memory map of the
+        saved file (or by the open h5py dataset, if the data can't be memory mapped), and windows are only read when
+        they are accessed. The file stays open until `close()` is called, so lazy datasets are best used as a context
+        manager:
+
+        ```
+        with Dataset(folder_path=path, lazy=True) as dataset:
+            batch = dataset.train_X[:32]
+        ```
+
+        :param df: The dataframe generated by the FeatureGenerator class. The windows are stored as float32 if every
+        column fits in float32 (e.g. with the compact dtype policy of FeatureGenerator), and as float64 otherwise.
         :type df: pd.DataFrame
         :param lookback_size: The lookback/window size (e.g. how many preceding values to feed into the model)
         :type lookback_size: int
@@ -24,78 +98,364 @@ class Dataset:
         E.g. if you want to remove all targets above 0.05, `target_max_threshold=0.05`.
         If you don't want to remove have any max threshold, use `target_max_threshold=float('inf')`.
         :type target_max_threshold: float
+        :param materialize: Whether to copy every window into one in-memory numpy array of shape
+        (num_windows, lookback_size, num_features). This uses lookback_size times the memory of the source data.
+        :type materialize: bool
+        :param lazy: Whether to read the windows from disk only when they are accessed, when loading from `folder_path`.
+        :type lazy: bool
+        :param split_dates: (Optional) The first date of the validation split and the first date of the test split,
+        e.g. ('2021-03-01', '2021-04-01'). When given, the windows are split by date instead of by `train_fraction`, so
+        that the datasets of different tickers are split at the same dates.
+        :type split_dates: tuple
+        :param instrumentation: (Optional) The instrumentation to measure the windowing and the HDF5 reads and writes
+        with (see lib.instrumentation.Instrumentation). Default is no instrumentation.
+        :type instrumentation: Instrumentation
+        :param scaling: How `transform` scales the input features, with the stats of the training data (see
+        DatasetConstants.Scalings):
+            - 'minmax': (x - min) / (max - min), so that every feature of the training data is in [0, 1]
+            - 'zscore': (x - mean) / std, so that every feature of the training data has a mean of 0 and a standard
+              deviation of 1
+        It is saved with the dataset, so it is ignored when loading from `folder_path`.
+        :type scaling: str
         """
+        assert scaling in (SCALINGS.MINMAX, SCALINGS.ZSCORE), f'Error: unknown scaling {scaling}.'
+        self.scaling = scaling
+        self.instrumentation = instrumentation if instrumentation is not None else Instrumentation(enabled=False)
+        self.__h5_file__ = None
+        self.window_dates = None
+        self.split_dates = None if split_dates is None else tuple(np.datetime64(d, 'D') for d in split_dates)
         if df is not None:
-            self.arr = self.__convert_df_to_window_array__(df, lookback_size, target_max_threshold)
-            self.train_fraction = train_fraction
-            self.column_names = list(df.columns)
-            self.f_min, self.f_max = self.__calculate_stats__()
-            self.timestamp = int(time.time())
+            with self.instrumentation.span('dataset.windowing', lookback_size=lookback_size) as span:
+                self.arr, self.window_dates = self.__convert_df_to_window_array__(
+                    df, lookback_size, target_max_threshold
+                )
+                self.train_fraction = train_fraction
+                self.column_names = list(df.columns)
+                self.__calculate_stats__()
+                self.timestamp = int(time.time())
+
+                if materialize:
+                    self.arr = self.arr.materialize()
+                span.rows = self.arr.shape[0]
         elif folder_path:
-            with open(f"{folder_path}/{DatasetConstants.META_FILENAME}") as file:
-                config = json.load(file)
-            self.train_fraction = config['train_fraction']
-            self.column_names = config['column_names']
-            # self.split_ix_train = config['split_ix_train']
-            self.timestamp = config['timestamp']
-
-            with h5py.File(f"{folder_path}/{config['data_file']}") as h5f:
-                self.arr = h5f[config['arr_name']][:]
-                self.f_min = h5f[config['f_min_name']][:]
-                self.f_max = h5f[config['f_max_name']][:]
+            with self.instrumentation.span('dataset.load', folder_path=folder_path, lazy=lazy) as span:
+                data_file = self.__load__(folder_path, lazy)
+                span.rows = self.arr.shape[0]
+                span.bytes = Path(data_file).stat().st_size
+
+    def __load__(self, folder_path: str, lazy: bool):
+        # Reads the metadata, the stats and (unless lazy) the windows of a dataset saved with `save_to_disk`, and
+        # returns the path of its data file
+        with open(f"{folder_path}/{DatasetConstants.META_FILENAME}") as file:
+            config = json.load(file)
+        self.train_fraction = config['train_fraction']
+        self.column_names = config['column_names']
+        # Datasets saved before the scaling could be chosen use MinMax
+        self.scaling = config.get('scaling', SCALINGS.MINMAX)
+        if config.get('split_dates') is not None:
+            self.split_dates = tuple(np.datetime64(d, 'D') for d in config['split_dates'])
+        # self.split_ix_train = config['split_ix_train']
+        self.timestamp = config['timestamp']
+
+        data_file = f"{folder_path}/{config['data_file']}"
+        is_compact = config.get('format') == DatasetConstants.StorageFormats.COMPACT
+        if lazy:
+            self.__h5_file__ = self.__h5py__().File(data_file, 'r')
+            if is_compact:
+                rows = self.__open_lazy__(data_file, self.__h5_file__[config['rows_name']])
+                starts = self.__h5_file__[config['starts_name']][:]
+                self.arr = SlidingWindowArray(rows, starts, config['lookback_size'])
+            else:
+                self.arr = StoredWindowArray(self.__open_lazy__(data_file, self.__h5_file__[config['arr_name']]))
+            self.__read_stats__(self.__h5_file__, config)
+            self.window_dates = self.__read_window_dates__(self.__h5_file__, config)
+        else:
+            with self.__h5py__().File(data_file, 'r') as h5f:
+                if is_compact:
+                    rows = h5f[config['rows_name']][:]
+                    self.arr = SlidingWindowArray(rows, h5f[config['starts_name']][:], config['lookback_size'])
+                else:
+                    self.arr = h5f[config['arr_name']][:]
+                self.__read_stats__(h5f, config)
+                self.window_dates = self.__read_window_dates__(h5f, config)
                 h5f.close()
+        return data_file
+
+    @classmethod
+    def from_window_array(cls, arr: WindowArray, column_names: list[str], window_dates: np.ndarray = None,
+                          train_fraction: float = 0.8, split_dates: tuple = None,
+                          instrumentation: Instrumentation = None, scaling: str = SCALINGS.MINMAX):
+        """
+        This function creates a Dataset from windows that have already been built, e.g. by combining the windows of
+        several tickers (see lib.data.pipeline.Pipeline).
+
+        :param arr: The windows, with shape (num_windows, lookback_size, num_features). The target is the last feature.
+        :type arr: WindowArray | np.ndarray
+        :param column_names: The name of each feature
+        :type column_names: list[str]
+        :param window_dates: (Optional) The date of each window, sorted. Required with `split_dates`.
+        :type window_dates: np.ndarray
+        :param train_fraction: The fraction of data to be used as training data. Typical value is 0.8
+        :type train_fraction: float
+        :param split_dates: (Optional) The first date of the validation split and the first date of the test split.
+        :type split_dates: tuple
+        :param instrumentation: (Optional) The instrumentation to measure the HDF5 writes with. Default is no
+        instrumentation.
+        :type instrumentation: Instrumentation
+        :param scaling: How `transform` scales the input features: 'minmax' or 'zscore' (see `Dataset`)
+        :type scaling: str
+        :rtype: Dataset
+        """
+        dataset = cls(split_dates=split_dates, instrumentation=instrumentation, scaling=scaling)
+        dataset.arr = arr
+        dataset.window_dates = None if window_dates is None else np.asarray(window_dates, dtype='datetime64[D]')
+        dataset.train_fraction = train_fraction
+        dataset.column_names = list(column_names)
+        dataset.__calculate_stats__()
+        dataset.timestamp = int(time.time())
+        return dataset
 
     @staticmethod
-    def __convert_df_to_window_array__(df: pd.DataFrame, lookback_size: int, target_max_threshold: float = 0.03):
+    def __h5py__():
+        # h5py is only imported when a dataset is saved or loaded, so that building datasets and transforming data
+        # (e.g. in inference workers) doesn't pay for it
+        import h5py
+        return h5py
+
+    def __read_stats__(self, h5f: 'h5py.File', config: dict):
+        self.f_min = h5f[config['f_min_name']][:]
+        self.f_max = h5f[config['f_max_name']][:]
+        # Datasets saved before the mean and standard deviation were computed don't have them
+        self.f_mean = h5f[config['f_mean_name']][:] if config.get('f_mean_name', '') in h5f else None
+        self.f_std = h5f[config['f_std_name']][:] if config.get('f_std_name', '') in h5f else None
+
+    @staticmethod
+    def __read_window_dates__(h5f: 'h5py.File', config: dict):
+        # Datasets saved before window dates were recorded don't have them
+        if config.get('dates_name', '') not in h5f:
+            return None
+        return h5f[config['dates_name']][:].astype('datetime64[D]')
+
+    @staticmethod
+    def __open_lazy__(data_file: str, h5_dataset: 'h5py.Dataset'):
+        """
+        This function returns a memory map of the h5py dataset if it is stored contiguously and uncompressed in the
+        file, since numpy can then read it without going through h5py. Otherwise, it returns the h5py dataset itself.
         """
-        This function converts our 2-dimensional pandas DataFrame into a 3 dimensional numpy array,
+        offset = h5_dataset.id.get_offset()
+        if h5_dataset.chunks is None and h5_dataset.compression is None and offset is not None:
+            return np.memmap(data_file, mode='r', dtype=h5_dataset.dtype, shape=h5_dataset.shape, offset=offset)
+        return h5_dataset
+
+    def close(self):
+        """
+        This function releases the file handle and memory map held by a lazily loaded dataset. After it has been
+        called, the windows of this dataset can no longer be accessed. It is a no-op for in-memory datasets.
+        """
+        if self.__h5_file__ is not None:
+            self.arr = None
+            self.__h5_file__.close()
+            self.__h5_file__ = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @staticmethod
+    def __convert_df_to_window_array__(df: 'pd.DataFrame', lookback_size: int, target_max_threshold: float = 0.03):
+        """
+        This function converts our 2-dimensional pandas DataFrame into a 3 dimensional SlidingWindowArray,
         with the following shape: (num_windows, lookback_size, num_features)
 
         For example, if your window/lookback size is 60 (you feed the preceding 60 minutes as input),
         and you have 10,000 distinct windows in your dataset, and each datapoint has 25 features,
         your shape would look like (10000, 60, 25).
+
+        The rows of the days that are kept are copied once into a contiguous float array, and each window is only
+        stored as its starting row, so the windows take up no additional memory.
+
+        :return: Returns the windows and the date of each window
+        :rtype: (SlidingWindowArray, np.ndarray)
         """
-        # First, iterate over the finite dates (since each window can only contain values for one date)
-        data_points = []
-        unique_dates = sorted(set(df.index.date))
+        values = Dataset.__to_rows__(df)
+        days = df.index.values.astype('datetime64[D]')
+
+        # Each window can only contain values for one date, so group the rows by date (keeping the order within days)
+        if np.any(days[1:] < days[:-1]):
+            order = np.argsort(days, kind='stable')
+            values, days = values[order], days[order]
 
-        for d in unique_dates:
-            # Next, extract all of the windows for each given day
-            rows_in_day = df.index.date == d
-            day_df = df[rows_in_day]
+        day_starts = np.flatnonzero(np.r_[True, days[1:] != days[:-1]]) if len(days) > 0 else np.array([], dtype=int)
+        day_lengths = np.diff(np.r_[day_starts, len(days)])
 
-            # Remove days that have unusual data or that don't have enough rows
-            if np.any(day_df.iloc[:, -1].abs() >= target_max_threshold) or day_df.shape[0] < lookback_size:
-                continue
+        # Remove days that have unusual data or that don't have enough rows
+        unusual_rows = (np.abs(values[:, -1]) >= target_max_threshold).astype(int)
+        unusual_days = np.add.reduceat(unusual_rows, day_starts) > 0 if len(days) > 0 else np.array([], dtype=bool)
+        keep_days = ~unusual_days & (day_lengths >= lookback_size)
 
-            i = 0
-            max_i = day_df.shape[0] - lookback_size
-            while i <= max_i:
-                window = day_df.iloc[i:i + lookback_size, :]
-                data_points.append(window.values)
-                i += 1
+        rows = np.ascontiguousarray(values[np.repeat(keep_days, day_lengths)])
 
-        return np.array(data_points)
+        # Every kept day contributes (day_length - lookback_size + 1) windows, starting at consecutive rows
+        kept_lengths = day_lengths[keep_days]
+        kept_offsets = np.cumsum(kept_lengths) - kept_lengths
+        windows_per_day = kept_lengths - lookback_size + 1
+        first_window = np.cumsum(windows_per_day) - windows_per_day
+        starts = np.repeat(kept_offsets - first_window, windows_per_day) + np.arange(windows_per_day.sum())
+        window_dates = np.repeat(days[day_starts][keep_days], windows_per_day)
+
+        return SlidingWindowArray(rows, starts, lookback_size), window_dates
+
+    @staticmethod
+    def __to_rows__(df: 'pd.DataFrame'):
+        """
+        This function converts the dataframe to a 2-dimensional array with the smallest float dtype that holds every
+        column exactly: float32 for data exported with the compact dtype policy (see FeatureGenerator), and float64
+        otherwise. Category columns are refused, since their codes depend on the values of the data, so the same value
+        would be stored as different codes in the datasets of different tickers.
+        """
+        # pandas isn't imported with this module: datasets loaded from disk (e.g. for inference) don't need it, and
+        # it is already loaded whenever there is a DataFrame to convert
+        import pandas as pd
+
+        categories = [c for c in df.columns if isinstance(df[c].dtype, pd.CategoricalDtype)]
+        assert not categories, f'Error: the category columns {categories} must be encoded (e.g. with OneHotEncoder).'
+        return df.to_numpy(dtype=np.result_type(np.float32, *df.dtypes))
+
+    def memory_report(self):
+        """
+        :return: Returns a one-line summary of the memory used by the data of this dataset, compared to every window
+        materialized as float64.
+        :rtype: str
+        """
+        used_bytes = self.arr.rows.nbytes + self.arr.starts.nbytes if isinstance(self.arr, SlidingWindowArray) \
+            else self.arr.nbytes
+        float64_bytes = self.arr.size * np.dtype(np.float64).itemsize
+        return (f"Dataset: {self.arr.shape[0]} windows of shape {self.arr.shape[1:]} ({self.arr.dtype}) use "
+                f"{used_bytes / 2 ** 20:.1f}MiB, {float64_bytes / max(used_bytes, 1):.1f}x less than the "
+                f"{float64_bytes / 2 ** 20:.1f}MiB of materialized float64 windows")
 
     def __calculate_stats__(self):
         """
-        This function calculates the min and max, column-wise, for every column in the train_X data
-        :return: tuple of (feature_min, feature_max)
-        :rtype:
+        This function calculates the min, max, mean and standard deviation, column-wise, for every column in the
+        train_X data, in one pass over chunks of `DatasetConstants.STATS_CHUNK_ROWS` rows (see RunningStats).
+
+        For a SlidingWindowArray, every row covered by a training window is counted exactly once. Other window arrays
+        don't know which windows overlap, so the rows of every window are counted, chunk by chunk of windows: the min
+        and max are the same, but rows at the edges of the days weigh less in the mean and standard deviation.
+
+        The stats are stored with the dtype of the data, in `f_min`, `f_max`, `f_mean` and `f_std`.
+        """
+        train_X = self.train_X
+        stats = RunningStats(train_X.shape[2])
+        if isinstance(train_X, SlidingWindowArray):
+            for rows in train_X.iter_rows_in_windows(DatasetConstants.STATS_CHUNK_ROWS):
+                stats.update(rows)
+        else:
+            chunk_windows = max(1, DatasetConstants.STATS_CHUNK_ROWS // max(train_X.shape[1], 1))
+            for start in range(0, train_X.shape[0], chunk_windows):
+                windows = train_X.read(slice(start, start + chunk_windows)) if isinstance(train_X, WindowArray) \
+                    else train_X[start:start + chunk_windows]
+                stats.update(np.asarray(windows).reshape(-1, train_X.shape[2]))
+
+        dtype = train_X.dtype
+        self.f_min, self.f_max = stats.min.astype(dtype), stats.max.astype(dtype)
+        self.f_mean, self.f_std = stats.mean.astype(dtype), stats.std.astype(dtype)
+
+    def __scaler__(self):
         """
-        f_min = self.train_X.min(axis=1).min(axis=0)
-        f_max = self.train_X.max(axis=1).max(axis=0)
-        return f_min, f_max
+        This function returns the (offset, scale) of the scaling of each input feature: `transform` computes
+        (x - offset) / scale. Features that are constant in the training data (zero range or zero standard deviation)
+        have a scale of 1 instead of 0, so they are scaled to 0 instead of to NaN or infinity.
+        """
+        if self.scaling == SCALINGS.ZSCORE:
+            assert self.f_mean is not None and self.f_std is not None, \
+                'Error: this dataset was saved without the mean and standard deviation required by zscore scaling.'
+            offset, scale = self.f_mean, self.f_std
+        else:
+            assert self.scaling == SCALINGS.MINMAX, f'Error: unknown scaling {self.scaling}.'
+            offset, scale = self.f_min, self.f_max - self.f_min
+        return offset, np.where((scale == 0) | ~np.isfinite(scale), np.ones_like(scale), scale)
 
     @property
     def split_ix_train(self):
+        if self.split_dates is not None:
+            return self.__date_split_ix__(self.split_dates[0])
         return int(self.arr.shape[0] * self.train_fraction)
 
     @property
     def split_ix_val(self):
+        if self.split_dates is not None:
+            return self.__date_split_ix__(self.split_dates[1])
         val_weight = 2/3
         return self.split_ix_train + int((self.arr.shape[0] * (1 - self.train_fraction)) * val_weight)
 
+    def __date_split_ix__(self, split_date: np.datetime64):
+        # The index of the first window on or after split_date. The windows are sorted by date.
+        assert self.window_dates is not None, 'Error: splitting by date requires the date of each window.'
+        return int(np.searchsorted(self.window_dates, split_date, side='left'))
+
+    def folds(self, num_folds: int = 5, val_days: int = 20, train_days: int = None, gap_days: int = 0,
+              step_days: int = None):
+        """
+        This function yields the folds of a walk-forward (rolling-origin) cross-validation over the training and
+        validation windows of this dataset, e.g. for a hyperparameter search. The test windows are never used.
+
+        Folds are defined by trading date, i.e. the dates that have at least one window, so every window of a given
+        date is in the same part of a fold. The validation dates of the last fold are the last `val_days` dates before
+        the test split, and the validation dates of each earlier fold are `step_days` dates earlier. The training dates
+        of each fold end `gap_days` dates before its validation dates (the purge/embargo gap, so that the targets of
+        the last training windows don't overlap the validation dates), and either start at the first date (expanding
+        window) or span the last `train_days` dates (sliding window).
+
+        The windows are sorted by date, so the training and validation windows of each fold are contiguous, and each
+        fold only holds slices of `arr`: no data is copied. Note that `transform` uses the stats of the whole training
+        split of this dataset, not of the training windows of the fold.
+
+        :param num_folds: The number of folds
+        :type num_folds: int
+        :param val_days: The number of trading dates of the validation windows of each fold
+        :type val_days: int
+        :param train_days: (Optional) The number of trading dates of the training windows of each fold (sliding
+        window). Default is every date before the gap (expanding window).
+        :type train_days: int
+        :param gap_days: The number of trading dates between the training and validation windows of each fold
+        :type gap_days: int
+        :param step_days: (Optional) The number of trading dates between the validation dates of consecutive folds.
+        Default is `val_days`, so the validation dates of the folds don't overlap.
+        :type step_days: int
+        :return: Returns an iterator of the folds, from the earliest validation dates to the latest
+        :rtype: Iterator[Fold]
+        """
+        assert self.window_dates is not None, 'Error: walk-forward folds require the date of each window.'
+        step_days = step_days if step_days is not None else val_days
+        assert num_folds > 0 and val_days > 0 and step_days > 0 and gap_days >= 0, \
+            'Error: num_folds, val_days and step_days must be positive, and gap_days must not be negative.'
+        assert train_days is None or train_days > 0, 'Error: train_days must be positive.'
+
+        # The windows before the test split, and the index of the first window of each of their dates
+        window_dates = self.window_dates[:self.split_ix_val]
+        # The windows of a date are only contiguous if the windows are sorted by date
+        assert np.all(window_dates[1:] >= window_dates[:-1]), \
+            'Error: walk-forward folds require the windows to be sorted by date.'
+        dates, date_ix = np.unique(window_dates, return_index=True)
+        date_ix = np.append(date_ix, len(window_dates))
+
+        first_val_day = len(dates) - val_days - (num_folds - 1) * step_days
+        assert first_val_day - gap_days > 0, \
+            f'Error: {len(dates)} trading dates are too few for {num_folds} folds of {val_days} validation dates, ' \
+            f'{step_days} dates apart, with a gap of {gap_days} dates.'
+
+        for number in range(num_folds):
+            val_start = first_val_day + number * step_days
+            train_end = val_start - gap_days
+            train_start = 0 if train_days is None else max(0, train_end - train_days)
+            train = self.arr[date_ix[train_start]:date_ix[train_end], :, :]
+            val = self.arr[date_ix[val_start]:date_ix[val_start + val_days], :, :]
+            yield Fold(number, train, val, (dates[train_start], dates[train_end - 1]),
+                       (dates[val_start], dates[val_start + val_days - 1]))
+
     @property
     def train(self):
         return self.arr[:self.split_ix_train, :, :]
@@ -134,27 +494,54 @@ class Dataset:
 
     @property
     def num_inputs(self):
-        return len(self.column_names)
+        """
+        The number of input features of every window: every column but the target, which is the last column. Note that
+        it used to include the target, i.e. it was `len(column_names)`.
+        """
+        return len(self.column_names) - 1
 
-    def save_to_disk(self, name: str = "data"):
+    def save_to_disk(self, name: str = "data", dtype: str = None, chunk_size: int = None, compression: str = None,
+                     compression_opts: int = None, shuffle: bool = False, compact: bool = False):
         """
         This function saves the dataset to exported_data/datasets/{name}/*. It preserves the state of
         the Dataset object completely. The core data is efficiently saved via h5py.
 
         After saving, you can re-instantiate the saved class with the build-in init function by passing
         the `folder_path` at initialization, which is the same as the `name` passed to this function.
+        Every storage option is recorded in the metadata file, so loading works the same way regardless of the
+        options used here.
 
         :param name: The name to reference the data by, usually the stock ticker symbol.
         :type name:
+        :param dtype: (Optional) The dtype to store the data as, e.g. 'float32' or 'float16'.
+        Default is the current dtype of the data.
+        :type dtype: str
+        :param chunk_size: (Optional) The number of windows per HDF5 chunk. Use your training batch size, so that
+        each batch is read from as few chunks as possible. Default is no chunking (unless compression is used).
+        :type chunk_size: int
+        :param compression: (Optional) The HDF5 compression filter to use: 'gzip' or 'lzf'. Default is no compression.
+        :type compression: str
+        :param compression_opts: (Optional) The compression level, for the 'gzip' filter (0-9).
+        :type compression_opts: int
+        :param shuffle: Whether to apply the HDF5 shuffle filter, which usually improves the compression ratio.
+        :type shuffle: bool
+        :param compact: Whether to store only the unwindowed rows and the start row of each window, instead of every
+        window. Consecutive windows overlap by lookback_size - 1 rows, so this is roughly lookback_size times smaller.
+        The windows are rebuilt, without copying, when the dataset is loaded.
+        :type compact: bool
         :return: Returns the path to the folder where the dataset is stored
         :rtype: str
         """
 
         base_path = f"{DatasetConstants.OUTPUT_DIR}/{self.timestamp}-{name}"
+        storage_format = DatasetConstants.StorageFormats.COMPACT if compact else DatasetConstants.StorageFormats.WINDOWS
+        if compact:
+            assert isinstance(self.arr, SlidingWindowArray), \
+                'Error: only datasets backed by a SlidingWindowArray can be saved in the compact format.'
 
         metadata = {
             "name": name,
-            "data_shape": self.arr.shape,
+            "data_shape": [int(x) for x in self.arr.shape],
             "train_fraction": self.train_fraction,
             "column_names": self.column_names,
             "timestamp": self.timestamp,
@@ -162,16 +549,34 @@ class Dataset:
             "meta_file": DatasetConstants.META_FILENAME,
             "arr_name": "arr",
             "f_min_name": "f_min",
-            "f_max_name": "f_max"
+            "f_max_name": "f_max",
+            "f_mean_name": "f_mean",
+            "f_std_name": "f_std",
+            "scaling": self.scaling,
+            "format": storage_format,
+            "lookback_size": int(self.arr.shape[1]),
+            "rows_name": "rows",
+            "starts_name": "starts",
+            "dtype": str(np.dtype(dtype or self.arr.dtype)),
+            "chunk_size": chunk_size,
+            "compression": compression,
+            "compression_opts": compression_opts,
+            "shuffle": shuffle,
+            "dates_name": "window_dates",
+            "split_dates": None if self.split_dates is None else [str(d) for d in self.split_dates]
         }
 
         Path(base_path).mkdir(parents=True, exist_ok=True)
 
-        with h5py.File(f'{base_path}/{metadata["data_file"]}', 'w') as array_file:
-            array_file.create_dataset(metadata['arr_name'], data=self.arr)
-            array_file.create_dataset(metadata['f_min_name'], data=self.f_min)
-            array_file.create_dataset(metadata['f_max_name'], data=self.f_max)
-            array_file.close()
+        with self.instrumentation.span('dataset.save', dataset=name, format=storage_format, dtype=metadata['dtype'],
+                                       compression=compression) as span:
+            self.__write__(f'{base_path}/{metadata["data_file"]}', metadata, chunk_size, storage_options={
+                'compression': compression,
+                'compression_opts': compression_opts,
+                'shuffle': shuffle or None
+            })
+            span.rows = metadata['data_shape'][0]
+            span.bytes = Path(f'{base_path}/{metadata["data_file"]}').stat().st_size
 
         with open(f'{base_path}/{metadata["meta_file"]}', 'w') as outfile:
             json.dump(metadata, outfile, ensure_ascii=False, indent=4)
@@ -179,17 +584,165 @@ class Dataset:
         print(f"Successfully saved dataset to `{base_path}/*`")
         return base_path
 
+    def __write__(self, data_file: str, metadata: dict, chunk_size: int, storage_options: dict):
+        # Writes the windows (or the rows and window starts, in the compact format), the window dates and the stats
+        compact = metadata['format'] == DatasetConstants.StorageFormats.COMPACT
+        with self.__h5py__().File(data_file, 'w') as array_file:
+            if compact:
+                # A batch of consecutive windows spans chunk_size + lookback_size - 1 rows
+                rows = self.__cast_for_storage__(np.asarray(self.arr.rows), metadata['dtype'])
+                rows_chunk = None if chunk_size is None else chunk_size + self.arr.lookback_size - 1
+                array_file.create_dataset(metadata['rows_name'], data=rows,
+                                          chunks=self.__chunk_shape__(rows.shape, rows_chunk), **storage_options)
+                array_file.create_dataset(metadata['starts_name'], data=self.arr.starts)
+            else:
+                arr = self.__cast_for_storage__(np.asarray(self.arr), metadata['dtype'])
+                array_file.create_dataset(metadata['arr_name'], data=arr,
+                                          chunks=self.__chunk_shape__(arr.shape, chunk_size), **storage_options)
+            if self.window_dates is not None:
+                array_file.create_dataset(metadata['dates_name'], data=self.window_dates.astype(np.int64))
+            array_file.create_dataset(metadata['f_min_name'], data=self.f_min)
+            array_file.create_dataset(metadata['f_max_name'], data=self.f_max)
+            if self.f_mean is not None:
+                array_file.create_dataset(metadata['f_mean_name'], data=self.f_mean)
+                array_file.create_dataset(metadata['f_std_name'], data=self.f_std)
+            array_file.close()
+
+    @staticmethod
+    def __cast_for_storage__(arr: np.ndarray, dtype: str):
+        # Make sure no value overflows to infinity when the data is stored with a smaller dtype (e.g. float16)
+        if arr.size > 0 and np.dtype(dtype).itemsize < arr.dtype.itemsize:
+            largest_value = np.nanmax(np.abs(arr[np.isfinite(arr)]), initial=0)
+            assert largest_value <= np.finfo(dtype).max, \
+                f'Error: the data contains values up to {largest_value}, which overflow the dtype {dtype}.'
+        return arr.astype(dtype, copy=False)
+
+    @staticmethod
+    def __chunk_shape__(shape: tuple, chunk_size: int):
+        """
+        This function returns the HDF5 chunk shape for `chunk_size` entries along the first axis.
+        HDF5 chunks can't be larger than the data itself, or empty.
+        """
+        if chunk_size is None or 0 in shape:
+            return None
+        return (min(chunk_size, shape[0]),) + tuple(shape[1:])
+
     def __verify_df__(self, df):
-        assert df[:, :, :self.num_inputs].shape[1:] == self.arr[:, :, :self.num_inputs].shape[1:]
+        # The windows have either only the input features (like train_X), or the input features and the target
+        assert df.ndim == 3 and df.shape[2] in (self.num_inputs, self.num_inputs + 1), \
+            f'Error: expected windows with {self.num_inputs} input features, but got the shape {df.shape}.'
 
     def transform(self, df):
         """
-        This function applies the MinMax scaler column-wise to the dataframe passed in. It uses only the training
-        data statistics that were computed during initialization, so the same transformation will be applied to
-        all data. This will give each column a mean of 0 and standard deviation of 1.
+        This function applies the scaler of this dataset (see `scaling`) column-wise to the windows passed in, with
+        shape (num_windows, lookback_size, num_inputs), like `train_X`. Windows that also have the target as their last
+        feature are accepted, and the target is dropped. Only the training data statistics that were computed during
+        initialization are used, so the same transformation is applied to all data: with 'minmax' scaling, every
+        feature of the training data is scaled to [0, 1], and with 'zscore' scaling, every feature of the training
+        data gets a mean of 0 and a standard deviation of 1.
         """
         self.__verify_df__(df)
-        return (df[:, :, :self.num_inputs] - self.f_min) / (self.f_max - self.f_min)
+        offset, scale = self.__scaler__()
+        return (df[:, :, :self.num_inputs] - offset) / scale
+
+    def iter_batches(self, split: str = DatasetConstants.Splits.TRAIN, batch_size: int = 32, shuffle: bool = False,
+                     seed: int = None, transform: bool = True, prefetch: int = 1):
+        """
+        This function iterates over the windows of one split in batches of (X, y), where X has the shape
+        (batch_size, lookback_size, num_features - 1) and y has the shape (batch_size, lookback_size, 1), just like
+        the `*_X` and `*_y` properties. Only one batch at a time is read, so the memory used scales with the batch size
+        rather than the dataset size, and this works the same way for in-memory and lazily loaded datasets.
+
+        The batches are written into a small pool of preallocated buffers that is reused for the whole iteration, and
+        the scaler is applied in place in those buffers. This means that each yielded batch is only valid until
+        the next batch is requested: copy it if you need to keep it around.
+
+        :param split: The split to iterate over: 'train', 'val' or 'test'
+        :type split: str
+        :param batch_size: The number of windows in each batch. The last batch may be smaller.
+        :type batch_size: int
+        :param shuffle: Whether to iterate over the windows in a random order
+        :type shuffle: bool
+        :param seed: (Optional) The seed of the random order, when `shuffle=True`
+        :type seed: int
+        :param transform: Whether to apply the scaler (see `transform`) to X
+        :type transform: bool
+        :param prefetch: The number of batches to prepare ahead of time on a background thread.
+        Use 0 to prepare each batch on the calling thread, when it is requested.
+        :type prefetch: int
+        :return: A generator of (X, y) tuples
+        :rtype: Generator[(np.ndarray, np.ndarray)]
+        """
+        assert split in (DatasetConstants.Splits.TRAIN, DatasetConstants.Splits.VAL, DatasetConstants.Splits.TEST), \
+            f'Error: unknown split {split}.'
+        windows = getattr(self, split)
+        num_windows, lookback_size, num_features = windows.shape
+        order = np.random.default_rng(seed).permutation(num_windows) if shuffle else None
+        num_batches = -(-num_windows // batch_size)
+
+        offset, scale = self.__scaler__() if transform else (None, None)
+        x_dtype = np.result_type(windows.dtype, offset.dtype) if transform else windows.dtype
+        # One buffer is held by the caller, `prefetch` are waiting in the queue and one is being filled
+        buffers = [
+            (np.empty((batch_size, lookback_size, num_features - 1), dtype=x_dtype),
+             np.empty((batch_size, lookback_size, 1), dtype=windows.dtype))
+            for _ in range(prefetch + 2)
+        ]
+
+        def build_batch(batch_number):
+            window_key = slice(batch_number * batch_size, (batch_number + 1) * batch_size)
+            if order is not None:
+                window_key = order[window_key]
+            batch = windows.read(window_key) if isinstance(windows, WindowArray) else windows[window_key]
+
+            x, y = buffers[batch_number % len(buffers)]
+            x, y = x[:len(batch)], y[:len(batch)]
+            if transform:
+                np.subtract(batch[:, :, :-1], offset, out=x)
+                np.divide(x, scale, out=x)
+            else:
+                x[...] = batch[:, :, :-1]
+            y[...] = batch[:, :, -1:]
+            return x, y
+
+        if prefetch <= 0:
+            for batch_number in range(num_batches):
+                yield build_batch(batch_number)
+            return
+
+        batches = queue.Queue(maxsize=prefetch)
+        stop = threading.Event()
+
+        def put(item):
+            # Waits for room in the queue, unless the caller stopped iterating. Returns whether the item was queued.
+            while not stop.is_set():
+                try:
+                    batches.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def produce():
+            try:
+                for batch_number in range(num_batches):
+                    if stop.is_set() or not put(build_batch(batch_number)):
+                        return
+            except Exception as e:
+                put(e)
+
+        producer = threading.Thread(target=produce, daemon=True)
+        producer.start()
+        try:
+            for _ in range(num_batches):
+                item = batches.get()
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # If the caller stops iterating early, let the producer thread exit
+            stop.set()
+            producer.join()
 
     def reverse_transform(self, df):
         """
@@ -197,4 +750,5 @@ class Dataset:
         E.g. reverseTransform(transform(df)) == transform(reverse_transform(df))
         """
         self.__verify_df__(df)
-        return df[:, :, :self.num_inputs] * (self.f_max - self.f_min) + self.f_min
+        offset, scale = self.__scaler__()
+        return df[:, :, :self.num_inputs] * scale + offset
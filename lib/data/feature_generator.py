@@ -1,19 +1,36 @@
+import hashlib
+from pathlib import Path
+import numpy as np
 import pandas as pd
-from lib.constants import MetaConstants
+from lib.cache import DiskCache
+from lib.constants import FeatureConstants, MetaConstants
+from lib.data.cleanup import DataCleaner
 from lib.data.features.base_feature import BaseFeature
 from lib.data.features.common_features import CommonFeatures
+from lib.instrumentation import Instrumentation
+from lib.scraper.raw_store import RawFormat
 
 IEX_FIELD_NAMES = MetaConstants.IEXDataFields
+DTYPE_POLICIES = FeatureConstants.DtypePolicies
 
 
 class FeatureGenerator:
-    def __init__(self, filename: str, auto_clean: bool = True, parse_dates: bool = True):
+
+    MARKET_DATA_FIELDS = [
+        'marketHigh', 'marketLow', 'marketAverage', 'marketVolume', 'marketNotional',
+        'marketNumberOfTrades', 'marketOpen', 'marketClose', 'marketChangeOverTime'
+    ]
+
+    def __init__(self, filename: str, auto_clean: bool = True, parse_dates: bool = True, columns: list[str] = None,
+                 cache: DiskCache = None, dtype_policy: str = DTYPE_POLICIES.FLOAT64,
+                 instrumentation: Instrumentation = None):
         """
         This function initializes the FeatureGenerator object. FeatureGenerator is useful for generating additional
         features from the raw IEXCloud output data. FeatureGenerator allows custom features to be added by implementing
         the BaseFeature class (lib.data.features.base_feature.BaseFeature).
 
-        :param filename: The name of the csv file that contains the raw data from IEXCloud, generated from the scraper.
+        :param filename: The name of the file (or RawStore directory) that contains the raw data from IEXCloud,
+        generated from the scraper. Both the columnar raw format (see RawFormat) and legacy CSV files are supported.
         :type filename: str
         :param auto_clean: Whether the data should be auto-cleaned upon initialization.
         If `auto_clean=False`, you can still clean the data by calling the method `feature_generator.__cleanup__()`
@@ -29,14 +46,52 @@ class FeatureGenerator:
             - `minutes_elapsed_in_day`
             - `timestamp`
         :type parse_dates: bool
+        :param columns: (Optional) The raw columns to read. For columnar files, only these columns are read from disk.
+        The columns used by cleaning (`volume`, `numberOfTrades`, `marketVolume`, `marketNumberOfTrades`) and by
+        date parsing (`date`, `minute`) must be included. Default is all columns.
+        :type columns: list[str]
+        :param cache: (Optional) A persistent cache of computed features, shared between runs. A feature is read from
+        the cache instead of being computed if the same feature (class and parameters) was computed before on the same
+        source data (the same file contents, read and cleaned the same way) from the same inputs.
+        E.g. `DiskCache(FeatureConstants.CACHE_DIR)`.
+        :type cache: DiskCache
+        :param dtype_policy: The dtypes of the generated and exported data (see FeatureConstants.DtypePolicies):
+            - 'float64': every exported column is float64
+            - 'compact': string features are stored as category, and the exported data uses float32 for continuous
+              features, uint8 for dummies (e.g. from OneHotEncoder) and the smallest integer type that fits for integer
+              features (e.g. `year` or `minute_of_hour`). Features are still computed from the full precision data.
+              String features can't be exported, since their category codes would depend on the values of each
+              ticker: encode them first (e.g. with OneHotEncoder), and exclude them.
+        :type dtype_policy: str
+        :param instrumentation: (Optional) The instrumentation to measure the reading, cleanup, date parsing, every
+        feature extraction and the export with (see lib.instrumentation.Instrumentation). Default is no
+        instrumentation.
+        :type instrumentation: Instrumentation
         """
-        self.df = pd.read_csv(filename)
-        self.df[IEX_FIELD_NAMES.date] = pd.to_datetime(self.df[IEX_FIELD_NAMES.date])
+        assert dtype_policy in (DTYPE_POLICIES.FLOAT64, DTYPE_POLICIES.COMPACT), \
+            f'Error: unknown dtype policy {dtype_policy}.'
+        self.dtype_policy = dtype_policy
+        self.instrumentation = instrumentation if instrumentation is not None else Instrumentation(enabled=False)
+        with self.instrumentation.span('feature_generator.read', filename=str(filename)) as span:
+            self.df = RawFormat.read(filename, columns=columns)
+            span.rows = len(self.df)
+            if self.instrumentation.enabled:
+                span.bytes = self.__frame_bytes__(self.df)
         self.df.loc[:, 'exclude'] = False
-        self.data_fields = [
-            'marketHigh', 'marketLow', 'marketAverage', 'marketVolume', 'marketNotional',
-            'marketNumberOfTrades', 'marketOpen', 'marketClose', 'marketChangeOverTime'
-        ]
+        self.build_stats = {
+            'features': 0, 'frame_copies': 0, 'peak_frame_bytes': 0, 'cache_hits': 0, 'cache_misses': 0,
+            'export_bytes': None, 'export_float64_bytes': None
+        }
+        self.cache = cache
+        if cache is not None:
+            self.source_fingerprint = DiskCache.key_hash(
+                (self.__file_fingerprint__(filename), columns, auto_clean, parse_dates)
+            )
+            self.__column_fingerprints__ = {}
+        self.__checked_columns__ = set()
+        self.registered_features = []
+        self.data_fields = [f for f in self.MARKET_DATA_FIELDS if f in self.df.columns]
+        self.cleanup_stats = None
 
         if auto_clean:
             self.__cleanup__()
@@ -46,77 +101,81 @@ class FeatureGenerator:
 
     def __parse_dates__(self):
         """
-        This function adds the following features to the dataframe:
+        This function adds the following features to the dataframe (see `CommonFeatures.DateFeatures`):
             - `year`
             - `day_of_year`
-            - `weekday`
-            - `hour_value`
-            - `minute_value`
-            - `minute_bucket`
-            - `minutes_elapsed_in_day`
+            - `weekday` (an integer code, Monday is 0)
+            - `hour_of_day`
+            - `minute_of_hour`
+            - `minute_of_day`
             - `timestamp`
         """
-        self.build_feature(CommonFeatures.Year())
-        self.build_feature(CommonFeatures.DayOfYear())
-        self.build_feature(CommonFeatures.Weekday(), should_export=False)
-        self.build_feature(CommonFeatures.HourOfDay())
-        self.build_feature(CommonFeatures.MinuteOfHour())
-        self.build_feature(CommonFeatures.MinuteOfDay())
-        self.build_feature(CommonFeatures.Timestamp(), should_export=False)
+        with self.instrumentation.span('feature_generator.parse_dates') as span:
+            # Every date feature is derived from one parse of the `minute` field
+            date_features = CommonFeatures.DateFeatures()
+            self.__build__([(date_features, True, False)])
+            self.data_fields.extend(date_features.exported_column_names)
 
-        # Finally, ensure that our data is sorted by the timestamp
-        self.df = self.df.sort_values('timestamp')
-        self.df = self.df.set_index('timestamp')
-        self.df['timestamp'] = self.df.index
+            # Finally, ensure that our data is sorted by the timestamp
+            self.df = self.df.sort_values('timestamp')
+            self.df = self.df.set_index('timestamp')
+            self.df['timestamp'] = self.df.index
+            span.rows = len(self.df)
 
     def __cleanup__(self):
         """
         This function identifies "bad rows" in the data (e.g. rows with 0 volume), and then replaces the bad values with
-        pure emptiness (None) to mark them as incomplete rows. Since these rows are 'incomplete'/missing data, they will
-        be removed in a later preprocessing step before the final model inputs are generated.
-        """
-        # Find "bad rows", for example rows with 0 volume/numberOfTrades to make data more stable
-        bad_rows = self.df[IEX_FIELD_NAMES.numberOfTrades] <= 0
-        bad_rows = bad_rows | (self.df[IEX_FIELD_NAMES.marketNumberOfTrades] <= 0)
-        bad_rows = bad_rows | (self.df[IEX_FIELD_NAMES.marketVolume] <= 0)
-        bad_rows = bad_rows | (self.df[IEX_FIELD_NAMES.volume] <= 0)
+        the closest good values of the same trading day (see lib.data.cleanup.DataCleaner). Values that can't be filled
+        (e.g. a column without any good value in a day) stay empty, so these rows will be removed in a later
+        preprocessing step before the final model inputs are generated.
 
-        # Purge the data on these rows, so they can be forward/backward filled in the next step
-        self.df.loc[bad_rows, self.data_fields[2:]] = None
-
-        # Forward fill rows with bad values and then backward fill to make sure everything is covered
-        self.df = self.df.fillna(method='ffill').fillna(method='bfill')
+        :return: Returns the stats of the cleanup: the number of bad rows, and of values filled in each column
+        :rtype: dict
+        """
+        with self.instrumentation.span('feature_generator.cleanup') as span:
+            self.cleanup_stats = DataCleaner().clean(self.df)
+            span.rows = len(self.df)
+            span.set(bad_rows=self.cleanup_stats['bad_rows'])
+        return self.cleanup_stats
 
     def build_features(self, features: list[BaseFeature], remove_missing_rows: bool = True,
                        should_export: bool = True):
         """
         This is a MUTATING function that takes in a list of BaseFeature objects, and creates new columns in the
-        dataframe with the computed feature.
+        dataframe with the computed features. The features are computed in dependency order (see
+        `BaseFeature.inputs`), so they don't have to be listed in that order.
 
-        If `remove_bad_rows=True`, this function label the rows with a missing target to be removed. This happens, for example,
-        if you try to get the stock price 1 hour into the future, but there are only 30 minutes left in the market. For
-        most use cases, remove_bad_rows should be set to True.
+        Every feature is computed first, and all of the new columns are then attached to the dataframe at once, so the
+        dataframe is only copied once per call instead of once per feature. A feature that reads a column computed
+        earlier in the same call causes the pending columns to be attached before it is computed.
 
+        If `remove_missing_rows=True`, this function label the rows with a missing target to be removed. This happens,
+        for example, if you try to get the stock price 1 hour into the future, but there are only 30 minutes left in
+        the market. Only the columns that haven't been checked before are scanned for missing values. For most use
+        cases, remove_missing_rows should be set to True.
+
+        The number of full-frame copies and the peak memory of the dataframe are tracked in `build_stats`.
 
         :param features: The list of features to generate
-        :type features: list[str]
+        :type features: list[BaseFeature]
         :param remove_missing_rows: Whether to mark the rows with missing targets as droppable
         :type remove_missing_rows: bool
-        :param should_export: Whether this feature should be included in the exported data.
+        :param should_export: Whether these features should be included in the exported data.
         :type should_export: bool
         """
-        for f in features:
-            self.build_feature(f, remove_missing_rows, should_export)
+        specs = [(f, remove_missing_rows, should_export) for f in features]
+        self.__build__(self.__dependency_order__(specs, specs))
 
     def build_feature(self, feature: BaseFeature, remove_missing_rows: bool = True,
                       should_export: bool = True):
         """
         This is a MUTATING function that takes in a BaseFeature, and creates a new column, base_feature, in the
-        dataframe with the computed feature.
+        dataframe with the computed feature. To build several features, prefer `build_features`, which only copies the
+        dataframe once.
 
-        If `remove_bad_rows=True`, this function label the rows with a missing target to be removed. This happens, for example,
-        if you try to get the stock price 1 hour into the future, but there are only 30 minutes left in the market. For
-        most use cases, remove_bad_rows should be set to True.
+        If `remove_missing_rows=True`, this function label the rows with a missing target to be removed. This happens,
+        for example, if you try to get the stock price 1 hour into the future, but there are only 30 minutes left in
+        the market. For most use cases, remove_missing_rows should be set to True.
 
         :param should_export: Whether this feature should be included in the exported data.
         :type should_export: bool
@@ -125,39 +184,237 @@ class FeatureGenerator:
         :param remove_missing_rows: Whether to mark the rows with missing targets as droppable
         :type remove_missing_rows: bool
         """
-        assert feature.name not in self.df.columns, f'Error: feature {feature.name} is already in dataframe.'
-        assert isinstance(feature, BaseFeature), f'Error: expected BaseFeature but got {type(feature)}.'
+        self.__build__([(feature, remove_missing_rows, should_export)])
 
-        computed_feature = feature.extract(self.df)
+    def add_features(self, features: list[BaseFeature], remove_missing_rows: bool = True,
+                     should_export: bool = True):
+        """
+        This function registers features WITHOUT computing them. Registered features are computed lazily by `export`
+        (or `compute`), and only if the exported columns need them: either directly, or as an input of another needed
+        feature (see `BaseFeature.inputs`). Each registered feature is computed at most once, in dependency order, and
+        is then reused by every later export.
 
-        if isinstance(computed_feature, pd.Series):
-            computed_feature = pd.concat([computed_feature], axis=1)
-            computed_feature.columns = [feature.name]
-            feature_names = [feature.name]
+        Note that a registered feature that is never computed doesn't mark any rows as missing.
+
+        :param features: The list of features to register
+        :type features: list[BaseFeature]
+        :param remove_missing_rows: Whether to mark the rows with missing targets as droppable, once computed
+        :type remove_missing_rows: bool
+        :param should_export: Whether these features should be included in the exported data.
+        :type should_export: bool
+        """
+        for f in features:
+            assert isinstance(f, BaseFeature), f'Error: expected BaseFeature but got {type(f)}.'
+            assert f.name not in self.df.columns, f'Error: feature {f.name} is already in dataframe.'
+            assert all(f is not r for r, _, _ in self.registered_features), f'Error: feature {f.name} is already added.'
+            self.registered_features.append((f, remove_missing_rows, should_export))
+
+    def compute(self, columns: list[str] = None):
+        """
+        This is a MUTATING function that computes the registered features (see `add_features`) that generate
+        `columns`, together with everything they depend on.
+
+        :param columns: (Optional) The columns to compute. Default is every registered feature.
+        :type columns: list[str]
+        """
+        if columns is None:
+            needed = self.registered_features
+        else:
+            needed = [s for s in self.registered_features if any(self.__provider__(c) is s for c in columns)]
+        self.__compute__(needed)
+
+    def __compute__(self, needed: list[tuple]):
+        if not needed:
+            return
+        ordered = self.__dependency_order__(needed, self.registered_features)
+        self.registered_features = [s for s in self.registered_features if all(s[0] is not o[0] for o in ordered)]
+        self.__build__(ordered)
+
+    def __provider__(self, column: str):
+        # The registered (feature, remove_missing_rows, should_export) that generates `column`, or None
+        provider = BaseFeature.provider([s[0] for s in self.registered_features], column)
+        return next((s for s in self.registered_features if s[0] is provider), None)
+
+    def __dependency_order__(self, specs: list[tuple], candidates: list[tuple]):
+        """
+        This function returns `specs` and every candidate they (transitively) depend on, ordered so that every feature
+        comes after the features that generate its inputs. Inputs that are already columns of the dataframe don't
+        need to be generated.
+        """
+        ordered = BaseFeature.dependency_order([s[0] for s in specs], [c[0] for c in candidates], self.df.columns)
+        return [next(spec for spec in list(specs) + list(candidates) if spec[0] is f) for f in ordered]
+
+    def build_report(self):
+        """
+        :return: Returns a one-line summary of `build_stats`
+        :rtype: str
+        """
+        report = (
+            f"FeatureGenerator: {self.build_stats['features']} features built with "
+            f"{self.build_stats['frame_copies']} full-frame copies, "
+            f"peak frame memory {self.build_stats['peak_frame_bytes'] / 2 ** 20:.1f}MiB"
+        )
+        if self.cache is not None:
+            report += (f", feature cache: {self.build_stats['cache_hits']} hits, "
+                       f"{self.build_stats['cache_misses']} misses")
+        if self.build_stats['export_bytes'] is not None:
+            report += (f", last export {self.build_stats['export_bytes'] / 2 ** 20:.1f}MiB "
+                       f"({self.build_stats['export_float64_bytes'] / 2 ** 20:.1f}MiB as float64)")
+        return report
+
+    def __build__(self, specs: list[tuple]):
+        # Computes each (feature, remove_missing_rows, should_export) in order, and attaches the results in batches
+        pending = []
+
+        for feature, remove_missing_rows, export in specs:
+            assert isinstance(feature, BaseFeature), f'Error: expected BaseFeature but got {type(feature)}.'
+            assert feature.name not in self.df.columns and all(feature.name not in p.columns for p, _ in pending), \
+                f'Error: feature {feature.name} is already in dataframe.'
+
+            # If the feature reads a column that was computed earlier in this batch, attach the batch first. A feature
+            # that doesn't declare its inputs may read any column, so the batch is always attached before it.
+            inputs = feature.inputs
+            if pending and (not inputs or any(c in p.columns for c in inputs for p, _ in pending)):
+                self.__attach__(pending)
+                pending = []
+
+            computed_feature = self.__extract__(feature)
+
+            if self.dtype_policy == DTYPE_POLICIES.COMPACT:
+                # Strings are stored once per distinct value
+                computed_feature = computed_feature.astype({
+                    c: 'category' for c in computed_feature.columns if computed_feature[c].dtype == object
+                })
+
+            pending.append((computed_feature, remove_missing_rows))
+            if export:
+                self.data_fields.extend(computed_feature.columns)
+            self.build_stats['features'] += 1
+
+        self.__attach__(pending)
+
+    def __extract__(self, feature: BaseFeature):
+        with self.instrumentation.span('feature_generator.extract', feature=feature.name) as span:
+            computed_feature = self.__extract_or_read__(feature, span)
+            span.rows = len(computed_feature)
+            if self.instrumentation.enabled:
+                span.bytes = self.__frame_bytes__(computed_feature)
+        return computed_feature
+
+    def __extract_or_read__(self, feature: BaseFeature, span):
+        # Computes the feature as a DataFrame, or reads it from the cache
+        if self.cache is None:
+            return self.__as_frame__(feature, feature.extract(self.df))
+
+        fingerprint = self.__feature_fingerprint__(feature)
+        computed_feature = self.cache.get((fingerprint,))
+        if computed_feature is not None and len(computed_feature) == len(self.df):
+            self.build_stats['cache_hits'] += 1
+            span.set(cached=True)
+            computed_feature.index = self.df.index
         else:
-            feature_names = list(computed_feature.columns)
+            self.build_stats['cache_misses'] += 1
+            span.set(cached=False)
+            computed_feature = self.__as_frame__(feature, feature.extract(self.df))
+            self.cache.put((fingerprint,), computed_feature.reset_index(drop=True))
+
+        for column in computed_feature.columns:
+            self.__column_fingerprints__[column] = fingerprint
+        return computed_feature
+
+    @staticmethod
+    def __as_frame__(feature: BaseFeature, computed_feature):
+        if isinstance(computed_feature, pd.Series):
+            return computed_feature.to_frame(feature.name)
+        return computed_feature
+
+    def __feature_fingerprint__(self, feature: BaseFeature):
+        """
+        The fingerprint of a feature is made of its class, its parameters and the fingerprints of its inputs: the
+        fingerprint of the feature that generated each input column, or the source fingerprint for raw columns. A
+        feature that doesn't declare its inputs depends on every column of the dataframe.
+        """
+        inputs = feature.inputs or [c for c in self.df.columns if c != 'exclude']
+        return DiskCache.key_hash((
+            type(feature).__module__,
+            type(feature).__qualname__,
+            repr(sorted(vars(feature).items())),
+            *(f'{c}={self.__column_fingerprints__.get(c, self.source_fingerprint)}' for c in inputs),
+        ))
 
-        self.df = pd.concat([self.df, computed_feature], axis=1)
+    @staticmethod
+    def __file_fingerprint__(filename: str):
+        # Hashes the contents of the file, or of every file in the directory (e.g. a RawStore directory)
+        path = Path(filename)
+        files = sorted(p for p in path.rglob('*') if p.is_file() and not p.name.startswith('.')) \
+            if path.is_dir() else [path]
+        digest = hashlib.sha256()
+        for file in files:
+            digest.update(str(file.relative_to(path) if path.is_dir() else file.name).encode('utf-8'))
+            with open(file, 'rb') as infile:
+                for block in iter(lambda: infile.read(2 ** 20), b''):
+                    digest.update(block)
+        return digest.hexdigest()
+
+    def __attach__(self, pending: list[tuple]):
+        # Attaches every computed (feature, remove_missing_rows) to the dataframe with a single copy
+        if not pending:
+            return
+        with self.instrumentation.span('feature_generator.attach', features=len(pending)) as span:
+            self.__attach_pending__(pending)
+            span.rows = len(self.df)
+            if self.instrumentation.enabled:
+                span.bytes = self.__frame_bytes__(self.df)
+
+    def __attach_pending__(self, pending: list[tuple]):
+        computed_features = [p for p, _ in pending]
+        checked_features = [p for p, remove_missing_rows in pending if remove_missing_rows]
+        remove_missing_rows = len(checked_features) > 0
 
         if remove_missing_rows:
-            missing_rows = pd.isnull(self.df).any(axis=1)
-            self.df.loc[missing_rows, 'exclude'] = True
+            unchecked = [c for c in self.df.columns if c not in self.__checked_columns__ and c != 'exclude']
+            missing_rows = pd.isnull(self.df[unchecked]).any(axis=1).to_numpy() if unchecked else False
+            for computed_feature in checked_features:
+                missing_rows = missing_rows | pd.isnull(computed_feature).any(axis=1).to_numpy()
+            self.__checked_columns__.update(unchecked)
 
-        if should_export:
-            self.data_fields.extend(feature_names)
+        previous_bytes = self.__frame_bytes__(self.df)
+        self.df = pd.concat([self.df] + computed_features, axis=1)
+        self.build_stats['frame_copies'] += 1
+        self.build_stats['peak_frame_bytes'] = max(
+            self.build_stats['peak_frame_bytes'],
+            # The previous frame, the computed features and the new frame are all alive during the copy
+            previous_bytes + sum(self.__frame_bytes__(f) for f in computed_features) + self.__frame_bytes__(self.df)
+        )
+
+        if remove_missing_rows:
+            self.__checked_columns__.update(c for f in checked_features for c in f.columns)
+            self.df['exclude'] = self.df['exclude'].to_numpy() | missing_rows
+
+    @staticmethod
+    def __frame_bytes__(df: pd.DataFrame):
+        return int(df.memory_usage(index=True, deep=False).sum())
 
     def export(self, target_feature: str, features_to_exclude: list[str] = None):
         """
-        This function export the data as a pandas DataFrame.
+        This function export the data as a pandas DataFrame. Registered features (see `add_features`) are computed
+        first if the exported data needs them.
 
         :param target_feature: The feature you would like to predict.
         This feature will be placed at the last column-wise index.
         :type target_feature: str
         :param features_to_exclude: Any features you want to exclude from the final exported numpy array.
         :type features_to_exclude: list[str]
-        :return: Returns a dataframe of the data you would like to export.
+        :return: Returns a dataframe of the data you would like to export, with the dtypes of the dtype policy.
         :rtype: pd.DataFrame
         """
+        with self.instrumentation.span('feature_generator.export', target_feature=target_feature) as span:
+            exported = self.__export__(target_feature, features_to_exclude)
+            span.rows = len(exported)
+            span.bytes = self.build_stats['export_bytes']
+        return exported
+
+    def __export__(self, target_feature: str, features_to_exclude: list[str] = None):
         if not features_to_exclude:
             features_to_exclude = [target_feature]
         else:
@@ -165,8 +422,45 @@ class FeatureGenerator:
 
         features_to_exclude = [f.lower() for f in features_to_exclude]
 
+        # Compute the registered features that are exported or that generate the target
+        self.__compute__([
+            s for s in self.registered_features
+            if (s[2] and s[0].name.lower() not in features_to_exclude) or self.__provider__(target_feature) is s
+        ])
+
         final_cols = list(filter(lambda x: x.lower() not in features_to_exclude, self.data_fields)) + [target_feature]
 
         # assert not any(pd.isna(to_return)), 'Error: rows with nan values are present in the base DataFrame.'
 
-        return self.df.loc[~self.df.exclude, final_cols].astype(float)
+        exported = self.df.loc[~self.df.exclude, final_cols]
+        exported = exported.astype(float) if self.dtype_policy == DTYPE_POLICIES.FLOAT64 \
+            else self.__compact_dtypes__(exported)
+
+        self.build_stats['export_bytes'] = self.__frame_bytes__(exported)
+        self.build_stats['export_float64_bytes'] = exported.shape[0] * exported.shape[1] * 8
+        return exported
+
+    @staticmethod
+    def __compact_dtypes__(df: pd.DataFrame):
+        """
+        This function returns a copy of `df` with the compact dtypes: uint8 for booleans, the smallest integer type
+        that fits for integers, and float32 for floats. String (and category) columns are refused: their category codes
+        would depend on the values of the data, so the same value would be stored as different codes for different
+        tickers.
+        """
+        columns = {}
+        for column in df.columns:
+            values = df[column]
+            if pd.api.types.is_bool_dtype(values):
+                values = values.astype(np.uint8)
+            elif pd.api.types.is_integer_dtype(values):
+                values = pd.to_numeric(values, downcast='unsigned' if len(values) == 0 or values.min() >= 0
+                                       else 'integer')
+            elif pd.api.types.is_float_dtype(values):
+                values = values.astype(np.float32)
+            else:
+                assert values.dtype != object and not isinstance(values.dtype, pd.CategoricalDtype), \
+                    f'Error: the string feature {column} can\'t be exported, since its category codes would differ ' \
+                    f'between tickers. Encode it first (e.g. with OneHotEncoder), and exclude it.'
+            columns[column] = values
+        return pd.DataFrame(columns, index=df.index)
@@ -15,6 +15,15 @@ class BaseFeature(object):
         def extract(self, df):
             return ...
     ```
+
+    If `extract` reads columns that are generated by other features, the feature should also declare them in
+    `inputs`, so that the FeatureGenerator can compute its dependencies first:
+
+    ```
+        @property
+        def inputs(self):
+            return ['hour_of_day']
+    ```
     """
 
     __string_pattern__ = re.compile(r'(?<!^)(?=[A-Z])')
@@ -34,6 +43,100 @@ class BaseFeature(object):
         """
         assert False, "Error: this function must be implemented in a BaseFeature"
 
+    def update(self, row: dict, state: dict):
+        """
+        This function is the incremental version of `extract`, used by the StreamingFeatureGenerator: it computes the
+        feature for ONE new row, instead of for the whole dataframe. Only the current row is available, so any
+        history the feature needs must be kept in `state`, and it must be bounded (e.g. the last N values).
+
+        :param row: The new row: its raw fields, and the features that were already computed for it
+        :type row: dict
+        :param state: A dict owned by this feature, which is kept between rows. It is empty for the first row.
+        :type state: dict
+        :return: Returns the value of the feature, or a dict of values for features that generate several columns
+        :rtype: float | dict
+        """
+        assert False, f"Error: {type(self).__name__} doesn't support streaming (`update` isn't implemented)"
+
+    @property
+    def inputs(self):
+        """
+        The names of the columns that `extract` reads from the source dataframe. Default is no declared inputs.
+        """
+        return []
+
+    def provides(self, column: str):
+        """
+        :return: Returns whether `column` is one of the columns generated by this feature
+        :rtype: bool
+        """
+        return column == self.name
+
+    def provides_exactly(self, column: str):
+        """
+        Features that only recognize their columns by a pattern (e.g. OneHotEncoder, whose columns depend on the data)
+        return False here, so that a feature that is known to generate `column` is preferred (see `provider`).
+
+        :return: Returns whether `column` is known to be one of the columns generated by this feature
+        :rtype: bool
+        """
+        return self.provides(column)
+
+    @staticmethod
+    def provider(features: list, column: str):
+        """
+        This function returns the feature that generates `column`, or None if no feature does. A feature that is known
+        to generate it (see `provides_exactly`) is preferred over one that only matches its pattern, e.g. `Sinify` over
+        a OneHotEncoder of `minute_of_day` for the column `minute_of_day_sin(1440)`. Otherwise, the first one wins.
+
+        :param features: The candidate features, in order of preference
+        :type features: list[BaseFeature]
+        :param column: The name of the column
+        :type column: str
+        :rtype: BaseFeature
+        """
+        providers = [f for f in features if f.provides(column)]
+        return next((f for f in providers if f.provides_exactly(column)), providers[0] if providers else None)
+
+    @staticmethod
+    def dependency_order(features: list, candidates: list = None, available_columns=None):
+        """
+        This function returns `features` and every candidate they (transitively) depend on, ordered so that every
+        feature comes after the features that generate its inputs (see `inputs` and `provider`).
+
+        :param features: The features to order
+        :type features: list[BaseFeature]
+        :param candidates: (Optional) The features that may generate the inputs. Default is `features`.
+        :type candidates: list[BaseFeature]
+        :param available_columns: (Optional) The columns that already exist, and don't need to be generated. If given,
+        an input that is neither available nor generated by a candidate is an error. Default is None, in which case
+        such inputs are assumed to be raw fields.
+        :type available_columns: Collection[str]
+        :rtype: list[BaseFeature]
+        """
+        candidates = candidates if candidates is not None else features
+        ordered, visiting = [], set()
+
+        def visit(feature):
+            if any(feature is f for f in ordered):
+                return
+            assert id(feature) not in visiting, f'Error: feature {feature.name} depends on itself.'
+            visiting.add(id(feature))
+            for column in feature.inputs:
+                if available_columns is not None and column in available_columns:
+                    continue
+                provider = BaseFeature.provider(candidates, column)
+                assert provider is not None or available_columns is None, \
+                    f'Error: no feature generates the column {column}, needed by {feature.name}.'
+                if provider is not None:
+                    visit(provider)
+            visiting.remove(id(feature))
+            ordered.append(feature)
+
+        for f in features:
+            visit(f)
+        return ordered
+
     @property
     def name(self):
         # Returns a snake_case version of the class name
@@ -8,27 +8,175 @@ IEX_FIELD_NAMES = MetaConstants.IEXDataFields
 
 class CommonFeatures:
 
+    @staticmethod
+    def minute_of_day(df: pd.DataFrame):
+        """
+        This function returns the number of minutes since midnight of every row, from the `minute` field, as an integer
+        array. It supports both the time of day (timedelta) stored by the columnar raw format and legacy 'HH:MM'
+        strings, which are parsed with integer arithmetic on their characters instead of string slicing. Strings that
+        aren't exactly 'HH:MM' (e.g. '9:30') are parsed with a regular expression instead, and missing or malformed
+        values are an error.
+        """
+        minute = df[IEX_FIELD_NAMES.minute]
+        if pd.api.types.is_timedelta64_dtype(minute):
+            return minute.to_numpy().astype('timedelta64[m]').astype(np.int64)
+
+        values = minute.to_numpy()
+        # One extra character, which is only set for strings longer than 'HH:MM'
+        chars = np.asarray(values, dtype='U6').view(np.uint32).reshape(-1, 6).astype(np.int64)
+        digits = chars[:, [0, 1, 3, 4]] - ord('0')
+        hours, minutes = digits[:, 0] * 10 + digits[:, 1], digits[:, 2] * 10 + digits[:, 3]
+        is_valid = (chars[:, 2] == ord(':')) & (chars[:, 5] == 0) & np.all((digits >= 0) & (digits <= 9), axis=1) \
+            & (hours < 24) & (minutes < 60)
+        minutes_of_day = hours * 60 + minutes
+        if not is_valid.all():
+            invalid = values[~is_valid]
+            parsed = pd.Series(invalid).astype(str).str.extract(r'^([01]?\d|2[0-3]):([0-5]\d)$').astype(float)
+            is_parsed = parsed.notna().all(axis=1).to_numpy()
+            assert is_parsed.all(), \
+                f"Error: invalid minute {invalid[~is_parsed][0]!r}, expected a time of day like '09:30'."
+            minutes_of_day[~is_valid] = (parsed[0] * 60 + parsed[1]).to_numpy(dtype=np.int64)
+        return minutes_of_day
+
+    @staticmethod
+    def days(df: pd.DataFrame):
+        """
+        This function returns the date of every row, from the `date` field, as a datetime64[D] array.
+        """
+        return df[IEX_FIELD_NAMES.date].to_numpy().astype('datetime64[D]')
+
+    @staticmethod
+    def weekday(days: np.ndarray):
+        """
+        This function returns the day of the week of every date as an integer code: Monday is 0 and Sunday is 6.
+        """
+        # 1970-01-01 was a Thursday (3)
+        return (days.astype(np.int64) + 3) % 7
+
+    @staticmethod
+    def parse_minute(minute):
+        """
+        This function returns the number of minutes since midnight of ONE `minute` value (timedelta or 'HH:MM').
+        """
+        if isinstance(minute, str):
+            return int(minute[:2]) * 60 + int(minute[-2:])
+        return int(pd.Timedelta(minute).total_seconds()) // 60
+
+    class DateFeatures(BaseFeature):
+        def __init__(self, starting_hour=9):
+            """
+            DateFeatures generates every date feature at once, equivalent to the Year, DayOfYear, Weekday, HourOfDay,
+            MinuteOfHour, MinuteOfDay and Timestamp features. The `minute` field is parsed only once, and every
+            feature is then derived from it and from the date with integer arithmetic.
+
+            :param starting_hour: The starting hour of MinuteOfDay
+            :type starting_hour: int
+            """
+            self.starting_hour = starting_hour
+
+        @property
+        def column_names(self):
+            return ['year', 'day_of_year', 'weekday', 'hour_of_day', 'minute_of_hour', 'minute_of_day', 'timestamp']
+
+        @property
+        def exported_column_names(self):
+            # `weekday` (e.g. for OneHotEncoder) and `timestamp` are only exported through other features
+            return [c for c in self.column_names if c not in ('weekday', 'timestamp')]
+
+        @property
+        def inputs(self):
+            return [IEX_FIELD_NAMES.date, IEX_FIELD_NAMES.minute]
+
+        def provides(self, column: str):
+            return column in self.column_names
+
+        def update(self, row, state):
+            date = row[IEX_FIELD_NAMES.date]
+            minutes = CommonFeatures.parse_minute(row[IEX_FIELD_NAMES.minute])
+            return dict(zip(self.column_names, (
+                date.year, date.day_of_year, date.weekday(), minutes // 60, minutes % 60,
+                (minutes // 60 - self.starting_hour) * 60 + minutes % 60 - 30, date + pd.Timedelta(minutes=minutes)
+            )))
+
+        def extract(self, df):
+            minutes = CommonFeatures.minute_of_day(df)
+            days = CommonFeatures.days(df)
+            years = days.astype('datetime64[Y]')
+            hours = minutes // 60
+            return pd.DataFrame(dict(zip(self.column_names, (
+                years.astype(np.int64) + 1970,
+                (days - years).astype(np.int64) + 1,
+                CommonFeatures.weekday(days),
+                hours,
+                minutes % 60,
+                (hours - self.starting_hour) * 60 + minutes % 60 - 30,
+                days.astype('datetime64[ns]') + minutes.astype('timedelta64[m]'),
+            ))), index=df.index)
+
     class Year(BaseFeature):
+        @property
+        def inputs(self):
+            return [IEX_FIELD_NAMES.date]
+
+        def update(self, row, state):
+            return row[IEX_FIELD_NAMES.date].year
+
         def extract(self, df):
-            return df[IEX_FIELD_NAMES.date].dt.year
+            return pd.Series(CommonFeatures.days(df).astype('datetime64[Y]').astype(np.int64) + 1970, index=df.index)
 
     class DayOfYear(BaseFeature):
+        @property
+        def inputs(self):
+            return [IEX_FIELD_NAMES.date]
+
+        def update(self, row, state):
+            return row[IEX_FIELD_NAMES.date].day_of_year
+
         def extract(self, df):
-            return df[IEX_FIELD_NAMES.date].dt.day_of_year
+            days = CommonFeatures.days(df)
+            return pd.Series((days - days.astype('datetime64[Y]')).astype(np.int64) + 1, index=df.index)
 
     class Weekday(BaseFeature):
+        @property
+        def inputs(self):
+            return [IEX_FIELD_NAMES.date]
+
+        def update(self, row, state):
+            return row[IEX_FIELD_NAMES.date].weekday()
+
         def extract(self, df):
-            return df[IEX_FIELD_NAMES.date].dt.day_name()
+            return pd.Series(CommonFeatures.weekday(CommonFeatures.days(df)), index=df.index)
 
     class HourOfDay(BaseFeature):
+        @property
+        def inputs(self):
+            return [IEX_FIELD_NAMES.minute]
+
+        def update(self, row, state):
+            return CommonFeatures.parse_minute(row[IEX_FIELD_NAMES.minute]) // 60
+
         def extract(self, df):
-            return df[IEX_FIELD_NAMES.minute].str[:2].astype(int)
+            return pd.Series(CommonFeatures.minute_of_day(df) // 60, index=df.index)
 
     class MinuteOfHour(BaseFeature):
+        @property
+        def inputs(self):
+            return [IEX_FIELD_NAMES.minute]
+
+        def update(self, row, state):
+            return CommonFeatures.parse_minute(row[IEX_FIELD_NAMES.minute]) % 60
+
         def extract(self, df):
-            return df[IEX_FIELD_NAMES.minute].str[-2:].astype(int)
+            return pd.Series(CommonFeatures.minute_of_day(df) % 60, index=df.index)
 
     class MinuteBucket(BaseFeature):
+        @property
+        def inputs(self):
+            return ['minute_value']
+
+        def update(self, row, state):
+            return row['minute_value'] // 6
+
         def extract(self, df):
             return df['minute_value'] // 6
 
@@ -37,12 +185,30 @@ class CommonFeatures:
             self.starting_hour = starting_hour
             self.ending_offset_minutes = ending_offset_minutes
 
+        @property
+        def inputs(self):
+            return ['hour_of_day', IEX_FIELD_NAMES.minute]
+
+        def update(self, row, state):
+            minute_of_hour = CommonFeatures.parse_minute(row[IEX_FIELD_NAMES.minute]) % 60
+            return (row['hour_of_day'] - self.starting_hour) * 60 + minute_of_hour - 30
+
         def extract(self, df):
-            return ((df.hour_of_day - self.starting_hour) * 60) + df[IEX_FIELD_NAMES.minute].str[-2:].astype(int) - 30
+            return ((df.hour_of_day - self.starting_hour) * 60) + CommonFeatures.minute_of_day(df) % 60 - 30
 
     class Timestamp(BaseFeature):
+        @property
+        def inputs(self):
+            return [IEX_FIELD_NAMES.date, 'hour_of_day', 'minute_of_hour']
+
+        def update(self, row, state):
+            return row[IEX_FIELD_NAMES.date] + pd.Timedelta(hours=row['hour_of_day'], minutes=row['minute_of_hour'])
+
         def extract(self, df):
-            return df.date + pd.to_timedelta(df.hour_of_day, 'h') + pd.to_timedelta(df.minute_of_hour, 'm')
+            minutes = df.hour_of_day.to_numpy() * 60 + df.minute_of_hour.to_numpy()
+            return pd.Series(
+                CommonFeatures.days(df).astype('datetime64[ns]') + minutes.astype('timedelta64[m]'), index=df.index
+            )
 
     class Sinify(BaseFeature):
         def __init__(self, base_feature: str, period=365):
@@ -63,6 +229,13 @@ class CommonFeatures:
         def name(self):
             return f'{self.base_feature}_sin({self.period})'
 
+        @property
+        def inputs(self):
+            return [self.base_feature]
+
+        def update(self, row, state):
+            return np.sin(row[self.base_feature] * (2 * np.pi / self.period))
+
         def extract(self, df):
             return np.sin(df[self.base_feature] * (2 * np.pi / self.period))
 
@@ -85,6 +258,13 @@ class CommonFeatures:
         def name(self):
             return f'{self.base_feature}_cos({self.period})'
 
+        @property
+        def inputs(self):
+            return [self.base_feature]
+
+        def update(self, row, state):
+            return np.cos(row[self.base_feature] * (2 * np.pi / self.period))
+
         def extract(self, df):
             return np.cos(df[self.base_feature] * (2 * np.pi / self.period))
 
@@ -97,6 +277,23 @@ class CommonFeatures:
             """
             self.feature_to_encode = feature_to_encode
 
+        @property
+        def inputs(self):
+            return [self.feature_to_encode]
+
+        def provides(self, column: str):
+            # The generated columns are named after the encoded values, e.g. `weekday_Monday`, which are only known
+            # once the data is read
+            return column.startswith(f'{self.feature_to_encode}_')
+
+        def provides_exactly(self, column: str):
+            # Any column of another feature that starts with the same prefix (e.g. `minute_of_day_sin(1440)`) matches
+            return False
+
+        def update(self, row, state):
+            # Only the dummy of the current value is set, every other dummy is 0
+            return {f'{self.feature_to_encode}_{row[self.feature_to_encode]}': 1}
+
         def extract(self, df: pd.DataFrame):
             return pd.get_dummies(df[self.feature_to_encode], drop_first=True, prefix=self.feature_to_encode)
 
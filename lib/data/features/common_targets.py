@@ -5,6 +5,50 @@ import numpy as np
 
 class CommonTargets:
 
+    @staticmethod
+    def future_values(df: pd.DataFrame, feature: str, target_time_deltas: list[timedelta]):
+        """
+        This function looks up the value of `feature` at `timestamp + delta` for every row and every delta, in a
+        single pass over the data. It works as a sorted-index join: the (timestamp -> value) lookup table is built and
+        sorted once, and every horizon is then resolved with a vectorized `np.searchsorted` instead of a per-row
+        `df.loc` lookup.
+
+        The semantics match a `df.loc[row_timestamp + delta, feature]` lookup on the timestamp index:
+            - only exact timestamp matches are used
+            - if no matching timestamp exists, the value is empty (NaN)
+            - if several rows share the matching timestamp, the last of those rows is used
+
+        :param df: The source dataframe, indexed by timestamp, with a `timestamp` column.
+        :type df: pd.DataFrame
+        :param feature: The name of the feature to look up
+        :type feature: str
+        :param target_time_deltas: The timedeltas into the future to retrieve
+        :type target_time_deltas: list[timedelta]
+        :return: A float array of shape (num_rows, num_deltas)
+        :rtype: np.ndarray
+        """
+        keys = df.index.values
+        values = df[feature].values.astype(float)
+
+        # On duplicate timestamps, only the last row is kept in the lookup table
+        unique_rows = ~df.index.duplicated(keep='last')
+        keys, values = keys[unique_rows], values[unique_rows]
+        order = np.argsort(keys, kind='stable')
+        keys, values = keys[order], values[order]
+
+        row_timestamps = df.timestamp.values
+        rv = np.full((len(df), len(target_time_deltas)), np.nan)
+        if len(keys) == 0:
+            return rv
+
+        for i, delta in enumerate(target_time_deltas):
+            targets = row_timestamps + np.timedelta64(delta)
+            positions = np.minimum(np.searchsorted(keys, targets), len(keys) - 1)
+            matches = keys[positions] == targets
+            rv[matches, i] = values[positions[matches]]
+
+        return rv
+
     class FutureValue(BaseFeature):
 
         def __init__(self, feature: str = 'marketLow', target_time_delta: timedelta = timedelta(minutes=1)):
@@ -24,22 +68,13 @@ class CommonTargets:
             self.target_time_delta = target_time_delta
             self.feature = feature
 
+        @property
+        def inputs(self):
+            return [self.feature, 'timestamp']
+
         def extract(self, df: pd.DataFrame):
-            return df.timestamp.map(lambda row_timestamp: self.__target_helper__(df, row_timestamp))
-
-        def __target_helper__(self, df, row_timestamp):
-            try:
-                target = df.loc[row_timestamp + self.target_time_delta, self.feature]
-                rv = target
-                if type(rv) == pd.Series and len(rv) > 0:
-                    # In very rare cases, there will be > 1 row for each timestamp. In this case,
-                    # take the last matching row. This is very rare so effects are negligible.
-                    rv = rv[0]
-                assert type(rv) == np.float64
-                return rv
-            except KeyError:
-                # If no matching row is found, return emptiness (None)
-                return None
+            target_value = CommonTargets.future_values(df, self.feature, [self.target_time_delta])[:, 0]
+            return pd.Series(target_value, index=df.index)
 
     class FutureValueChange(FutureValue):
         """
@@ -48,5 +83,54 @@ class CommonTargets:
         """
 
         def extract(self, df):
-            target_value: pd.Series = df.timestamp.map(lambda row_timestamp: self.__target_helper__(df, row_timestamp))
+            target_value: pd.Series = super().extract(df)
             return (target_value - df[self.feature]) / df[self.feature]
+
+    class FutureValues(BaseFeature):
+
+        def __init__(self, feature: str = 'marketLow', target_time_deltas: list[timedelta] = None,
+                     percent_change: bool = False):
+            """
+            FutureValues computes FutureValue (or FutureValueChange, if `percent_change=True`) for several horizons
+            at once, in a single pass over the data. One column is generated per horizon, e.g. with the default
+            horizons of 1, 5, 15 and 60 minutes the columns are `future_value_1m`, `future_value_5m`,
+            `future_value_15m` and `future_value_60m`.
+
+            :param feature: The name of the feature to use as the basis for these targets
+            :type feature: str
+            :param target_time_deltas: The timedeltas into the future that you would like to retrieve.
+            Default is 1, 5, 15 and 60 minutes.
+            :type target_time_deltas: list[timedelta]
+            :param percent_change: Whether to compute the percent change to the future value instead of the pure
+            future value.
+            :type percent_change: bool
+            """
+            if target_time_deltas is None:
+                target_time_deltas = [timedelta(minutes=m) for m in (1, 5, 15, 60)]
+            self.target_time_deltas = target_time_deltas
+            self.feature = feature
+            self.percent_change = percent_change
+
+        @property
+        def inputs(self):
+            return [self.feature, 'timestamp']
+
+        def provides(self, column: str):
+            return column in self.column_names
+
+        @property
+        def column_names(self):
+            prefix = 'future_value_change' if self.percent_change else 'future_value'
+            return [f'{prefix}_{self.__format_delta__(delta)}' for delta in self.target_time_deltas]
+
+        @staticmethod
+        def __format_delta__(delta: timedelta):
+            seconds = int(delta.total_seconds())
+            return f'{seconds // 60}m' if seconds % 60 == 0 else f'{seconds}s'
+
+        def extract(self, df: pd.DataFrame):
+            target_values = CommonTargets.future_values(df, self.feature, self.target_time_deltas)
+            if self.percent_change:
+                base_value = df[self.feature].values.astype(float)[:, None]
+                target_values = (target_values - base_value) / base_value
+            return pd.DataFrame(target_values, index=df.index, columns=self.column_names)
@@ -0,0 +1,323 @@
+from lib.data.features.base_feature import BaseFeature
+from lib.data.features.common_features import CommonFeatures
+from lib.constants import MetaConstants
+import pandas as pd
+import numpy as np
+
+IEX_FIELD_NAMES = MetaConstants.IEXDataFields
+
+
+class TechnicalIndicators:
+    """
+    TechnicalIndicators is a library of rolling-window indicators (moving averages, volatility, returns, VWAP, RSI,
+    rolling min/max). Every indicator is computed with an O(n) vectorized kernel over the whole dataframe, and never
+    crosses a day boundary: each trading day (see the `date` field) starts a new window, and the first rows of each day
+    that don't have a full window yet are empty (NaN), so that they are marked as missing rows by the FeatureGenerator.
+
+    The rows must be sorted by time, which the FeatureGenerator does when it parses the dates.
+    """
+
+    @staticmethod
+    def day_segments(df: pd.DataFrame):
+        """
+        This function returns, for every row, the index of the first row of its day, and its position within its day.
+
+        :return: tuple of (day_start, position)
+        :rtype: (np.ndarray, np.ndarray)
+        """
+        days = CommonFeatures.days(df)
+        starts = np.flatnonzero(np.r_[True, days[1:] != days[:-1]]) if len(days) > 0 else np.array([], dtype=int)
+        day_start = np.repeat(starts, np.diff(np.r_[starts, len(days)]))
+        return day_start, np.arange(len(days)) - day_start
+
+    @staticmethod
+    def rolling_sum(values: np.ndarray, window: int, day_start: np.ndarray, position: np.ndarray):
+        """
+        This function returns the sum of the last `window` values of every row, within its day, using the difference
+        of two cumulative sums. Rows with fewer than `window` preceding values in their day, or with an empty value in
+        their window, are empty.
+        """
+        is_nan = np.isnan(values)
+        sums = np.concatenate(([0], np.cumsum(np.where(is_nan, 0, values))))
+        nans = np.concatenate(([0], np.cumsum(is_nan)))
+        first = np.arange(len(values)) + 1 - window
+        rv = np.full(len(values), np.nan)
+        full = position >= window - 1
+        ends = np.flatnonzero(full) + 1
+        rv[full] = sums[ends] - sums[first[full]]
+        rv[full & (nans[np.arange(len(values)) + 1] - nans[np.maximum(first, 0)] > 0)] = np.nan
+        return rv
+
+    @staticmethod
+    def rolling_mean(values: np.ndarray, window: int, day_start: np.ndarray, position: np.ndarray):
+        # Like rolling_std, the values are shifted by the first value of their day to keep the cumulative sums small
+        if len(values) == 0:
+            return np.full(0, np.nan)
+        offset = TechnicalIndicators.__day_offset__(values, day_start)
+        return TechnicalIndicators.rolling_sum(values - offset, window, day_start, position) / window + offset
+
+    @staticmethod
+    def rolling_std(values: np.ndarray, window: int, day_start: np.ndarray, position: np.ndarray):
+        """
+        This function returns the sample standard deviation (ddof=1) of the last `window` values of every row, within
+        its day. The values are shifted by the first non-empty value of their day, so that the sums of squares don't
+        lose precision.
+        """
+        shifted = values - TechnicalIndicators.__day_offset__(values, day_start) if len(values) > 0 else values
+        sums = TechnicalIndicators.rolling_sum(shifted, window, day_start, position)
+        squares = TechnicalIndicators.rolling_sum(shifted ** 2, window, day_start, position)
+        variance = (squares - sums ** 2 / window) / max(window - 1, 1)
+        return np.sqrt(np.maximum(variance, 0))
+
+    @staticmethod
+    def rolling_extreme(values: np.ndarray, window: int, day_start: np.ndarray, position: np.ndarray,
+                        function=np.maximum):
+        """
+        This function returns the rolling maximum (or minimum, with `function=np.minimum`) of the last `window` values
+        of every row, within its day, with the van Herk/Gil-Werman algorithm: the days are laid out as the rows of a
+        matrix, split into blocks of `window` values, and every window is covered by the suffix of one block and the
+        prefix of the next one. This takes 3 comparisons per value, regardless of the window size.
+        """
+        rv = np.full(len(values), np.nan)
+        if len(values) == 0:
+            return rv
+        fill = -np.inf if function is np.maximum else np.inf
+        matrix = TechnicalIndicators.__day_matrix__(np.where(np.isnan(values), fill, values), window, day_start,
+                                                    position, fill)
+        num_days, length = matrix.shape
+        blocks = matrix.reshape(num_days, length // window, window)
+
+        prefix = function.accumulate(blocks, axis=2).reshape(num_days, length)
+        suffix = function.accumulate(blocks[:, :, ::-1], axis=2)[:, :, ::-1].reshape(num_days, length)
+
+        # The window of position p is [p - window + 1, p]
+        ends = np.arange(window - 1, length)
+        extremes = function(suffix[:, ends - window + 1], prefix[:, ends])
+
+        full = position >= window - 1
+        day_ids = np.cumsum(np.r_[True, day_start[1:] != day_start[:-1]]) - 1
+        rv[full] = extremes[day_ids[full], position[full] - window + 1]
+        # Windows with an empty value are empty
+        has_nan = TechnicalIndicators.rolling_sum(np.isnan(values).astype(float), window, day_start, position) > 0
+        rv[has_nan] = np.nan
+        return rv
+
+    @staticmethod
+    def ewm(values: np.ndarray, alpha: float, day_start: np.ndarray, position: np.ndarray):
+        """
+        This function returns the exponentially weighted moving average (`y = alpha * x + (1 - alpha) * y_previous`,
+        starting from the first value) of every row, within its day. Empty values are skipped: their average is empty,
+        and the next value continues from the previous average. The days are laid out as the rows of a matrix, so the
+        recursion takes one vectorized step per minute of the longest day, over every day at once.
+        """
+        if len(values) == 0:
+            return np.full(0, np.nan)
+        matrix = TechnicalIndicators.__day_matrix__(values, 1, day_start, position, np.nan)
+        average = matrix[:, 0].copy()
+        for t in range(1, matrix.shape[1]):
+            column = matrix[:, t]
+            is_nan = np.isnan(column)
+            updated = np.where(is_nan, average, alpha * column + (1 - alpha) * average)
+            average = np.where(np.isnan(average), column, updated)
+            matrix[:, t] = np.where(is_nan, np.nan, average)
+        day_ids = np.cumsum(np.r_[True, day_start[1:] != day_start[:-1]]) - 1
+        return matrix[day_ids, position]
+
+    @staticmethod
+    def shift(values: np.ndarray, periods: int, day_start: np.ndarray, position: np.ndarray):
+        """
+        This function returns the value `periods` rows before every row, within its day.
+        """
+        rv = np.full(len(values), np.nan)
+        valid = position >= periods
+        rv[valid] = values[np.flatnonzero(valid) - periods]
+        return rv
+
+    @staticmethod
+    def __day_offset__(values: np.ndarray, day_start: np.ndarray):
+        # The first finite value of the day of every row (0 for days without any), so that an empty first value
+        # doesn't empty the whole day once the values are shifted by it
+        starts, day_ids = np.unique(day_start, return_inverse=True)
+        finite_ix = np.where(np.isfinite(values), np.arange(len(values)), len(values))
+        first_finite = np.minimum.reduceat(finite_ix, starts)
+        offsets = np.where(first_finite < len(values), values[np.minimum(first_finite, len(values) - 1)], 0.0)
+        return offsets[day_ids]
+
+    @staticmethod
+    def __day_matrix__(values: np.ndarray, block_size: int, day_start: np.ndarray, position: np.ndarray, fill):
+        # Lays out the values of each day as a row of a matrix, padded with `fill` to a multiple of block_size
+        day_ids = np.cumsum(np.r_[True, day_start[1:] != day_start[:-1]]) - 1
+        length = -(-(int(position.max()) + 1) // block_size) * block_size
+        matrix = np.full((int(day_ids[-1]) + 1, length), fill, dtype=float)
+        matrix[day_ids, position] = values
+        return matrix
+
+    class __Indicator__(BaseFeature):
+        """
+        The base of every indicator of a single feature, named `{feature}_{indicator}({window})`.
+        """
+        indicator = None
+
+        def __init__(self, feature: str = IEX_FIELD_NAMES.marketAverage, window: int = 20):
+            assert window >= 1, f'Error: the window must be at least 1, got {window}.'
+            self.feature = feature
+            self.window = window
+
+        @property
+        def name(self):
+            return f'{self.feature}_{self.indicator}({self.window})'
+
+        @property
+        def inputs(self):
+            return [self.feature, IEX_FIELD_NAMES.date]
+
+        def extract(self, df):
+            day_start, position = TechnicalIndicators.day_segments(df)
+            values = df[self.feature].to_numpy(dtype=float)
+            return pd.Series(self.compute(values, day_start, position), index=df.index)
+
+        def compute(self, values: np.ndarray, day_start: np.ndarray, position: np.ndarray):
+            assert False, "Error: this function must be implemented in an indicator"
+
+    class SMA(__Indicator__):
+        """The simple moving average of the last `window` values."""
+        indicator = 'sma'
+
+        def compute(self, values, day_start, position):
+            return TechnicalIndicators.rolling_mean(values, self.window, day_start, position)
+
+    class EMA(__Indicator__):
+        """
+        The exponential moving average with a span of `window` values (alpha = 2 / (window + 1)). The first
+        `window - 1` rows of each day are empty, while the average warms up.
+        """
+        indicator = 'ema'
+
+        def compute(self, values, day_start, position):
+            rv = TechnicalIndicators.ewm(values, 2 / (self.window + 1), day_start, position)
+            rv[position < self.window - 1] = np.nan
+            return rv
+
+    class RollingStd(__Indicator__):
+        """The sample standard deviation of the last `window` values."""
+        indicator = 'std'
+
+        def compute(self, values, day_start, position):
+            return TechnicalIndicators.rolling_std(values, self.window, day_start, position)
+
+    class ZScore(__Indicator__):
+        """How many standard deviations the value is from the mean of the last `window` values."""
+        indicator = 'zscore'
+
+        def compute(self, values, day_start, position):
+            mean = TechnicalIndicators.rolling_mean(values, self.window, day_start, position)
+            std = TechnicalIndicators.rolling_std(values, self.window, day_start, position)
+            # Windows with a constant value have a z-score of 0
+            with np.errstate(divide='ignore', invalid='ignore'):
+                return np.where(std > 0, (values - mean) / std, np.where(np.isnan(std), np.nan, 0.0))
+
+    class LogReturn(__Indicator__):
+        """The log return over the last `window` rows: log(value / value `window` rows before)."""
+        indicator = 'log_return'
+
+        def __init__(self, feature: str = IEX_FIELD_NAMES.marketAverage, window: int = 1):
+            super().__init__(feature, window)
+
+        def compute(self, values, day_start, position):
+            with np.errstate(divide='ignore', invalid='ignore'):
+                return np.log(values / TechnicalIndicators.shift(values, self.window, day_start, position))
+
+    class RSI(__Indicator__):
+        """
+        The relative strength index (0 to 100) over `window` rows, with Wilder's smoothing of the gains and losses
+        (alpha = 1 / window). The first `window` rows of each day are empty.
+        """
+        indicator = 'rsi'
+
+        def __init__(self, feature: str = IEX_FIELD_NAMES.marketAverage, window: int = 14):
+            super().__init__(feature, window)
+
+        def compute(self, values, day_start, position):
+            change = values - TechnicalIndicators.shift(values, 1, day_start, position)
+            # The first row of each day has no change, so the smoothing starts on the second row
+            has_change = position >= 1
+            gains = np.full(len(values), np.nan)
+            losses = np.full(len(values), np.nan)
+            if has_change.any():
+                changes = change[has_change]
+                # The rows with a change, laid out by day like every row
+                change_position = position[has_change] - 1
+                change_day_start = np.arange(len(changes)) - change_position
+                gains[has_change] = TechnicalIndicators.ewm(np.maximum(changes, 0), 1 / self.window,
+                                                            change_day_start, change_position)
+                losses[has_change] = TechnicalIndicators.ewm(np.maximum(-changes, 0), 1 / self.window,
+                                                             change_day_start, change_position)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                rv = np.where(losses > 0, 100 - 100 / (1 + gains / losses), 100.0)
+            rv[np.isnan(gains) | (position < self.window)] = np.nan
+            return rv
+
+    class RollingMin(__Indicator__):
+        """The minimum of the last `window` values."""
+        indicator = 'min'
+
+        def compute(self, values, day_start, position):
+            return TechnicalIndicators.rolling_extreme(values, self.window, day_start, position, np.minimum)
+
+    class RollingMax(__Indicator__):
+        """The maximum of the last `window` values."""
+        indicator = 'max'
+
+        def compute(self, values, day_start, position):
+            return TechnicalIndicators.rolling_extreme(values, self.window, day_start, position, np.maximum)
+
+    class VWAP(BaseFeature):
+        def __init__(self, window: int = None, notional: str = IEX_FIELD_NAMES.notional,
+                     volume: str = IEX_FIELD_NAMES.volume):
+            """
+            VWAP is the volume weighted average price, sum(notional) / sum(volume), either since the beginning of the
+            day (the session VWAP) or over the last `window` rows of the day. Rows without any volume yet are empty. The
+            session VWAP skips rows with an empty notional or volume, so they don't empty the rest of the day.
+
+            :param window: (Optional) The number of rows to average over. Default is the whole day so far.
+            :type window: int
+            :param notional: The notional (price * volume) field, e.g. `marketNotional` for the whole market.
+            :type notional: str
+            :param volume: The volume field, e.g. `marketVolume` for the whole market.
+            :type volume: str
+            """
+            self.window = window
+            self.notional = notional
+            self.volume = volume
+
+        @property
+        def name(self):
+            return 'vwap' if self.window is None else f'vwap({self.window})'
+
+        @property
+        def inputs(self):
+            return [self.notional, self.volume, IEX_FIELD_NAMES.date]
+
+        def extract(self, df):
+            day_start, position = TechnicalIndicators.day_segments(df)
+            notional = df[self.notional].to_numpy(dtype=float)
+            volume = df[self.volume].to_numpy(dtype=float)
+            if self.window is None:
+                # Rows with an empty notional or volume count for 0 in both sums
+                valid = np.isfinite(notional) & np.isfinite(volume)
+                notional_sum = self.__session_sum__(np.where(valid, notional, 0.0), day_start, position)
+                volume_sum = self.__session_sum__(np.where(valid, volume, 0.0), day_start, position)
+            else:
+                notional_sum = TechnicalIndicators.rolling_sum(notional, self.window, day_start, position)
+                volume_sum = TechnicalIndicators.rolling_sum(volume, self.window, day_start, position)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                return pd.Series(np.where(volume_sum > 0, notional_sum / volume_sum, np.nan), index=df.index)
+
+        @staticmethod
+        def __session_sum__(values: np.ndarray, day_start: np.ndarray, position: np.ndarray):
+            # The sum of every value since the beginning of the day, restarting at each day
+            if len(values) == 0:
+                return np.full(0, np.nan)
+            matrix = TechnicalIndicators.__day_matrix__(values, 1, day_start, position, 0.0)
+            day_ids = np.cumsum(np.r_[True, day_start[1:] != day_start[:-1]]) - 1
+            return np.cumsum(matrix, axis=1)[day_ids, position]
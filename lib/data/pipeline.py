@@ -0,0 +1,236 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import NamedTuple
+import numpy as np
+from lib.cache import DiskCache
+from lib.constants import DatasetConstants, FeatureConstants, MetaConstants
+from lib.data.dataset import Dataset
+from lib.data.feature_generator import FeatureGenerator
+from lib.data.features.base_feature import BaseFeature
+from lib.data.window_array import SlidingWindowArray
+from lib.scraper.raw_store import RawFormat
+
+
+class FeatureSpec:
+    def __init__(self, features: list[BaseFeature], target_feature: str, features_to_exclude: list[str] = None,
+                 columns: list[str] = None, auto_clean: bool = True, parse_dates: bool = True,
+                 dtype_policy: str = FeatureConstants.DtypePolicies.FLOAT64):
+        """
+        FeatureSpec describes how the raw data of every ticker is turned into the data of a Dataset: which features
+        are generated by the FeatureGenerator, and what is exported. It is sent to every worker process of a Pipeline,
+        so the features must be picklable (every BaseFeature defined at module level is).
+
+        :param features: The features to generate. They are registered with `FeatureGenerator.add_features`, so they
+        can be listed in any order, and only the ones needed by the export are computed.
+        :type features: list[BaseFeature]
+        :param target_feature: The feature to predict (see `FeatureGenerator.export`)
+        :type target_feature: str
+        :param features_to_exclude: (Optional) The features to exclude from the export (see `FeatureGenerator.export`)
+        :type features_to_exclude: list[str]
+        :param columns: (Optional) The raw columns to read (see `FeatureGenerator`). Default is all columns.
+        :type columns: list[str]
+        :param auto_clean: Whether the raw data should be auto-cleaned (see `FeatureGenerator`)
+        :type auto_clean: bool
+        :param parse_dates: Whether to parse the dates of the raw data (see `FeatureGenerator`)
+        :type parse_dates: bool
+        :param dtype_policy: The dtypes of the exported data (see `FeatureGenerator`)
+        :type dtype_policy: str
+        """
+        self.features = features
+        self.target_feature = target_feature
+        self.features_to_exclude = features_to_exclude or []
+        self.columns = columns
+        self.auto_clean = auto_clean
+        self.parse_dates = parse_dates
+        self.dtype_policy = dtype_policy
+
+    def export(self, filename: str, cache: DiskCache = None):
+        """
+        :return: Returns the exported data of one raw file
+        :rtype: pd.DataFrame
+        """
+        feature_generator = FeatureGenerator(filename, auto_clean=self.auto_clean, parse_dates=self.parse_dates,
+                                             columns=self.columns, cache=cache, dtype_policy=self.dtype_policy)
+        feature_generator.add_features(self.features)
+        return feature_generator.export(self.target_feature, list(self.features_to_exclude))
+
+
+class WorkerOptions(NamedTuple):
+    """
+    The configuration of a Pipeline that is sent to every worker process (see `Pipeline`).
+    """
+    spec: FeatureSpec
+    lookback_size: int
+    train_fraction: float
+    target_max_threshold: float
+    split_dates: tuple
+    cache_directory: str
+    scaling: str
+
+
+class Pipeline:
+    def __init__(self, spec: FeatureSpec, lookback_size: int = 60, train_fraction: float = 0.8,
+                 target_max_threshold: float = 0.03, max_workers: int = None, max_tasks_per_worker: int = 1,
+                 cache_directory: str = None, scaling: str = DatasetConstants.Scalings.MINMAX):
+        """
+        Pipeline runs the whole chain from raw data to a Dataset (FeatureGenerator -> export -> windowing) for many
+        tickers at once, one ticker per task in a pool of worker processes.
+
+        Memory is bounded per worker: a worker only ever holds the data of the ticker it is working on, it returns
+        (or saves) the compact windows rather than every window, and it is replaced by a fresh process after
+        `max_tasks_per_worker` tickers, so that memory doesn't accumulate over hundreds of tickers. The parent process
+        only submits as many tickers as there are workers ahead of time.
+
+        The train/val/test split is aligned by date across tickers: the split dates are computed once from the dates
+        of every raw file (using `train_fraction`), and every ticker is split at the same dates. So no ticker has
+        training data from dates that are in the test data of another ticker.
+
+        :param spec: How the raw data is turned into the data of the Dataset
+        :type spec: FeatureSpec
+        :param lookback_size: The lookback/window size (see `Dataset`)
+        :type lookback_size: int
+        :param train_fraction: The fraction of dates to be used as training data. Typical value is 0.8
+        :type train_fraction: float
+        :param target_max_threshold: The maximum acceptable target (see `Dataset`)
+        :type target_max_threshold: float
+        :param max_workers: (Optional) The number of worker processes. Default is the number of CPUs.
+        :type max_workers: int
+        :param max_tasks_per_worker: The number of tickers each worker process handles before it is replaced.
+        :type max_tasks_per_worker: int
+        :param cache_directory: (Optional) The directory of a feature cache shared by the workers
+        (see `FeatureGenerator`), e.g. FeatureConstants.CACHE_DIR.
+        :type cache_directory: str
+        :param scaling: How the datasets scale their input features: 'minmax' or 'zscore' (see `Dataset`)
+        :type scaling: str
+        """
+        self.spec = spec
+        self.lookback_size = lookback_size
+        self.train_fraction = train_fraction
+        self.target_max_threshold = target_max_threshold
+        self.max_workers = max_workers
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.cache_directory = cache_directory
+        self.scaling = scaling
+
+    def run(self, filenames: list[str], name: str = 'data', sharded: bool = False, split_dates: tuple = None,
+            **save_options):
+        """
+        This function builds the datasets of every raw file, and saves them to disk.
+
+        :param filenames: The raw files (or RawStore directories), one per ticker. Each ticker is named after its file,
+        e.g. `AAPL` for `exported_data/raw/store/AAPL`.
+        :type filenames: list[str]
+        :param name: The name of the combined dataset, or of the folder of the sharded datasets.
+        :type name: str
+        :param sharded: Whether to save one Dataset per ticker instead of one combined Dataset. The datasets of
+        different tickers are normalized with their own stats.
+        :type sharded: bool
+        :param split_dates: (Optional) The first date of the validation split and the first date of the test split.
+        Default is the split of the dates of every raw file by `train_fraction`.
+        :type split_dates: tuple
+        :param save_options: Any options of `Dataset.save_to_disk`, e.g. `compact=True` or `dtype='float32'`
+        :return: Returns the path of the combined dataset, or a dict of the path of the dataset of each ticker. The
+        paths of the sharded datasets are also listed in the `shards.json` file of the folder `name`.
+        :rtype: str | dict[str, str]
+        """
+        split_dates = split_dates or self.split_dates(filenames)
+        names = {filename: self.__ticker_name__(filename) for filename in filenames}
+        options = WorkerOptions(self.spec, self.lookback_size, self.train_fraction, self.target_max_threshold,
+                                split_dates, self.cache_directory, self.scaling)
+
+        if sharded:
+            results = self.__map__(Pipeline.__build_shard__, filenames,
+                                   lambda f: (f, options, f'{name}-{names[f]}', save_options))
+            # Tickers without any training window are skipped
+            paths = {names[f]: results[f] for f in filenames if results[f] is not None}
+
+            base_path = f'{DatasetConstants.OUTPUT_DIR}/{int(time.time())}-{name}'
+            Path(base_path).mkdir(parents=True, exist_ok=True)
+            with open(f'{base_path}/{DatasetConstants.SHARDS_FILENAME}', 'w') as outfile:
+                json.dump({'split_dates': [str(d) for d in split_dates], 'shards': paths}, outfile,
+                          ensure_ascii=False, indent=4)
+            return paths
+
+        results = self.__map__(Pipeline.__build_windows__, filenames, lambda f: (f, options))
+        results = [results[f] for f in filenames if results[f] is not None]
+        assert results, 'Error: no ticker has any window.'
+        assert all(r[2] == results[0][2] for r in results), 'Error: every ticker must export the same columns.'
+
+        # Order the windows of every ticker by date, so that the combined dataset can be split by date
+        window_dates = np.concatenate([r[1] for r in results])
+        order = np.argsort(window_dates, kind='stable')
+        arr = SlidingWindowArray.concatenate([r[0] for r in results])
+        arr = SlidingWindowArray(arr.rows, arr.starts[order], arr.lookback_size)
+
+        dataset = Dataset.from_window_array(arr, results[0][2], window_dates[order], self.train_fraction, split_dates,
+                                            scaling=self.scaling)
+        return dataset.save_to_disk(name, **save_options)
+
+    def split_dates(self, filenames: list[str]):
+        """
+        This function computes the dates at which to split every ticker: `train_fraction` of the trading dates of
+        all of the raw files are used for training, and the remaining dates are split between validation and test like
+        in `Dataset`. Only the `date` column of each file is read.
+
+        :return: Returns the first date of the validation split and the first date of the test split
+        :rtype: (np.datetime64, np.datetime64)
+        """
+        dates = np.unique(np.concatenate([
+            RawFormat.read(f, columns=[MetaConstants.IEXDataFields.date])[MetaConstants.IEXDataFields.date]
+            .to_numpy().astype('datetime64[D]')
+            for f in filenames
+        ]))
+        assert len(dates) > 0, 'Error: the raw files have no dates.'
+        split_ix_train = int(len(dates) * self.train_fraction)
+        split_ix_val = split_ix_train + int(len(dates) * (1 - self.train_fraction) * 2 / 3)
+        end = dates[-1] + np.timedelta64(1, 'D')
+        return tuple(dates[ix] if ix < len(dates) else end for ix in (split_ix_train, split_ix_val))
+
+    def __map__(self, function, filenames: list[str], arguments):
+        # Runs function(*arguments(filename)) for every file, with at most `max_workers` files submitted ahead of time
+        max_workers = self.max_workers or os.cpu_count()
+        results, pending = {}, {}
+        remaining = list(reversed(filenames))
+        with ProcessPoolExecutor(max_workers=max_workers, max_tasks_per_child=self.max_tasks_per_worker) as pool:
+            while remaining or pending:
+                while remaining and len(pending) < max_workers:
+                    filename = remaining.pop()
+                    pending[pool.submit(function, *arguments(filename))] = filename
+                future = next(as_completed(pending))
+                results[pending.pop(future)] = future.result()
+        return results
+
+    @staticmethod
+    def __ticker_name__(filename: str):
+        return Path(filename).stem
+
+    @staticmethod
+    def __export__(filename: str, options: WorkerOptions):
+        cache = DiskCache(options.cache_directory) if options.cache_directory else None
+        return options.spec.export(filename, cache=cache)
+
+    @staticmethod
+    def __build_windows__(filename: str, options: WorkerOptions):
+        # Runs in a worker process: returns the compact windows, window dates and columns of one ticker
+        df = Pipeline.__export__(filename, options)
+        arr, window_dates = Dataset.__convert_df_to_window_array__(df, options.lookback_size,
+                                                                   options.target_max_threshold)
+        if len(arr) == 0:
+            return None
+        return arr, window_dates, list(df.columns)
+
+    @staticmethod
+    def __build_shard__(filename: str, options: WorkerOptions, name: str, save_options: dict):
+        # Runs in a worker process: saves the Dataset of one ticker and returns its path
+        result = Pipeline.__build_windows__(filename, options)
+        if result is None:
+            return None
+        arr, window_dates, column_names = result
+        if np.searchsorted(window_dates, options.split_dates[0]) == 0:
+            return None
+        dataset = Dataset.from_window_array(arr, column_names, window_dates, options.train_fraction,
+                                            options.split_dates, scaling=options.scaling)
+        return dataset.save_to_disk(name, **save_options)
@@ -0,0 +1,54 @@
+import numpy as np
+
+
+class RunningStats:
+    def __init__(self, num_columns: int):
+        """
+        RunningStats accumulates the column-wise min, max, mean and variance of rows that arrive in chunks, in a single
+        pass and without keeping the rows: only the count and the running min, max, mean and sum of squared deviations
+        (M2) of each column are kept.
+
+        The mean and M2 of each chunk are computed with numpy, and merged into the running values with the parallel
+        form of Welford's algorithm (Chan et al.), which stays numerically stable when the mean is large compared to
+        the variance (e.g. prices).
+
+        :param num_columns: The number of columns of every chunk
+        :type num_columns: int
+        """
+        self.count = 0
+        self.min = np.full(num_columns, np.inf)
+        self.max = np.full(num_columns, -np.inf)
+        self.mean = np.zeros(num_columns)
+        self.m2 = np.zeros(num_columns)
+
+    def update(self, rows: np.ndarray):
+        """
+        This function adds a chunk of rows to the statistics.
+
+        :param rows: The rows, with shape (num_rows, num_columns)
+        :type rows: np.ndarray
+        """
+        if len(rows) == 0:
+            return
+        rows = np.asarray(rows, dtype=np.float64)
+        count = len(rows)
+        mean = rows.mean(axis=0)
+        m2 = np.square(rows - mean).sum(axis=0)
+
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * (count / total)
+        self.m2 += m2 + np.square(delta) * (self.count * count / total)
+        self.count = total
+        np.minimum(self.min, rows.min(axis=0), out=self.min)
+        np.maximum(self.max, rows.max(axis=0), out=self.max)
+
+    @property
+    def variance(self):
+        """The population variance of each column."""
+        return self.m2 / self.count if self.count > 0 else np.full_like(self.m2, np.nan)
+
+    @property
+    def std(self):
+        """The population standard deviation of each column."""
+        return np.sqrt(self.variance)
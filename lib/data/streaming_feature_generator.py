@@ -0,0 +1,147 @@
+import numpy as np
+import pandas as pd
+from lib.constants import MetaConstants
+from lib.data.cleanup import DataCleaner
+from lib.data.features.base_feature import BaseFeature
+from lib.data.features.common_features import CommonFeatures
+from lib.scraper.raw_store import RawFormat
+
+IEX_FIELD_NAMES = MetaConstants.IEXDataFields
+
+
+class StreamingFeatureGenerator:
+    def __init__(self, features: list[BaseFeature], columns: list[str], lookback_size: int = 60,
+                 auto_clean: bool = True, parse_dates: bool = True):
+        """
+        StreamingFeatureGenerator is the incremental version of the FeatureGenerator, for live inference: minute bars
+        are pushed one at a time with `push`, and each one is turned into its feature vector with `BaseFeature.update`
+        instead of recomputing every feature over a whole dataframe. The feature vectors of the last `lookback_size`
+        bars of the current day are kept in a ring buffer, so the latest window is always ready for
+        `Dataset.transform` (see `window`).
+
+        Only past data is ever used: the cleanup only forward fills bad values from the same day (see
+        `FeatureGenerator.__cleanup__`), so a bad bar at the very beginning of a day keeps empty values until it leaves
+        the window.
+
+        :param features: The features to generate, like `FeatureGenerator.build_features`. They can be listed in any
+        order, and they must implement `BaseFeature.update`. Targets (e.g. FutureValue) can't be generated, since they
+        need future data.
+        :type features: list[BaseFeature]
+        :param columns: The columns of each feature vector, in order. Use the input columns of the Dataset the model
+        was trained on, i.e. `dataset.column_names[:-1]`.
+        :type columns: list[str]
+        :param lookback_size: The lookback/window size
+        :type lookback_size: int
+        :param auto_clean: Whether bad bars should be cleaned, like `FeatureGenerator(auto_clean=True)`
+        :type auto_clean: bool
+        :param parse_dates: Whether to generate the date features, like `FeatureGenerator(parse_dates=True)`
+        :type parse_dates: bool
+        """
+        date_features = [CommonFeatures.DateFeatures()] if parse_dates else []
+
+        self.features = BaseFeature.dependency_order(date_features + list(features))
+        self.columns = list(columns)
+        self.lookback_size = lookback_size
+        self.auto_clean = auto_clean
+        self.stats = {'rows': 0, 'filled_rows': 0}
+
+        self.__states__ = [{} for _ in self.features]
+        # Features that generate several columns (e.g. OneHotEncoder) only return the columns that aren't 0
+        self.__provided_columns__ = [
+            [c for c in self.columns if BaseFeature.provider(self.features, c) is f] for f in self.features
+        ]
+
+        # Every row is written twice, lookback_size rows apart, so that the last lookback_size rows are always one
+        # contiguous slice of the buffer
+        self.__buffer__ = np.full((2 * lookback_size, len(self.columns)), np.nan)
+        self.__position__ = 0
+        self.__day_rows__ = 0
+        self.__day__ = None
+        self.__last_values__ = {}
+        self.__dates__ = {}
+
+    def push(self, bar: dict):
+        """
+        This function adds one new minute bar, e.g. one row of IEXCloud intraday data, and returns its feature vector.
+
+        :param bar: The raw fields of the bar, e.g. {'date': '2021-04-20', 'minute': '09:30', 'marketLow': ...}
+        :type bar: dict
+        :return: Returns the feature vector of the bar, with one value per column
+        :rtype: np.ndarray
+        """
+        row = dict(bar)
+        row[IEX_FIELD_NAMES.date] = self.__parse_date__(row[IEX_FIELD_NAMES.date])
+
+        # Windows and fills never span several days
+        if row[IEX_FIELD_NAMES.date] != self.__day__:
+            self.__day__ = row[IEX_FIELD_NAMES.date]
+            self.__day_rows__ = 0
+            self.__last_values__ = {}
+
+        if self.auto_clean:
+            self.__fill__(row)
+
+        for feature, state, provided_columns in zip(self.features, self.__states__, self.__provided_columns__):
+            for column in provided_columns:
+                row[column] = 0
+            value = feature.update(row, state)
+            if isinstance(value, dict):
+                row.update(value)
+            else:
+                row[feature.name] = value
+
+        vector = np.array([row[c] for c in self.columns], dtype=float)
+
+        self.__buffer__[self.__position__] = vector
+        self.__buffer__[self.__position__ + self.lookback_size] = vector
+        self.__position__ = (self.__position__ + 1) % self.lookback_size
+        self.__day_rows__ += 1
+        self.stats['rows'] += 1
+        return vector
+
+    @property
+    def window(self):
+        """
+        The feature vectors of the last `lookback_size` bars, oldest first, with shape (lookback_size, num_columns),
+        or None if fewer bars have been pushed for the current day. It is a view of the ring buffer, which is only
+        valid until the next bar is pushed. Use `window[None]` for `Dataset.transform`.
+        """
+        if self.__day_rows__ < self.lookback_size:
+            return None
+        return self.__buffer__[self.__position__:self.__position__ + self.lookback_size]
+
+    @property
+    def is_ready(self):
+        """Whether `window` is full and has no empty values."""
+        window = self.window
+        return window is not None and not np.isnan(window).any()
+
+    def __parse_date__(self, date):
+        # Every bar of a day has the same date, so each date is only parsed once
+        if date not in self.__dates__:
+            if len(self.__dates__) > 7:
+                self.__dates__.clear()
+            self.__dates__[date] = pd.Timestamp(date)
+        return self.__dates__[date]
+
+    def __fill__(self, row: dict):
+        """
+        This function is the causal version of `FeatureGenerator.__cleanup__`: the values of a bad bar (e.g. with 0
+        volume), and any missing value, are replaced by the last good value of the field on the same day.
+        """
+        # A missing (None) value isn't a bad row: it is filled like any other missing value below
+        is_bad_row = any(row.get(f) is not None and row[f] <= 0 for f in DataCleaner.BAD_ROW_FIELDS)
+        if is_bad_row:
+            for field in DataCleaner.PURGED_FIELDS:
+                if field in row:
+                    row[field] = np.nan
+            self.stats['filled_rows'] += 1
+
+        for field in RawFormat.NUMERIC_FIELDS:
+            if field not in row:
+                continue
+            value = row[field]
+            if value is None or value != value:
+                row[field] = self.__last_values__.get(field, np.nan)
+            else:
+                self.__last_values__[field] = value
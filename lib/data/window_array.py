@@ -0,0 +1,275 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+class WindowArray(object):
+    """
+    WindowArray is a lazy, read-only, 3-dimensional view of windows with the shape
+    (num_windows, lookback_size, num_features). It only keeps a compact index of the windows it contains, and reads
+    the windows from its source when they are accessed.
+
+    Slicing along the window axis (and the feature axis) returns another WindowArray, so no data is read until windows
+    are actually accessed, e.g. by integer indexing or by `materialize()`/`np.asarray()`, which explicitly read every
+    window of the view into one in-memory array.
+
+    Subclasses implement `__read__`, which reads the windows for a given index and columns, and `__view__`, which
+    creates a new view of the same source.
+    """
+
+    def __init__(self, index: np.ndarray, lookback_size: int, columns: np.ndarray):
+        self.index = np.asarray(index, dtype=np.int64)
+        self.lookback_size = lookback_size
+        self.columns = np.asarray(columns, dtype=np.int64)
+
+    @property
+    def shape(self):
+        return len(self.index), self.lookback_size, len(self.columns)
+
+    @property
+    def ndim(self):
+        return 3
+
+    @property
+    def dtype(self):
+        assert False, "Error: this property must be implemented in a WindowArray"
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    @property
+    def nbytes(self):
+        """The number of bytes this view would take up if it was materialized."""
+        return self.size * self.dtype.itemsize
+
+    def __len__(self):
+        return len(self.index)
+
+    def __repr__(self):
+        return f'{type(self).__name__}(shape={self.shape}, dtype={self.dtype})'
+
+    def __getitem__(self, key):
+        window_key, time_key, column_key = self.__expand_key__(key)
+
+        if isinstance(window_key, (int, np.integer)):
+            window = self.__read__(self.index[[window_key]], self.columns)[0]
+            return window[time_key, column_key]
+
+        view = self.__view__(self.index[window_key], self.columns)
+        if isinstance(column_key, (int, np.integer)):
+            return view.materialize()[:, time_key, column_key]
+
+        view.columns = view.columns[column_key]
+        if not self.__is_full_slice__(time_key):
+            return view.materialize()[:, time_key, :]
+        return view
+
+    def __array__(self, dtype=None, copy=None):
+        rv = self.materialize()
+        return rv if dtype is None else rv.astype(dtype, copy=False)
+
+    def materialize(self):
+        """
+        This function explicitly reads every window in this view into one new in-memory array with the shape
+        (num_windows, lookback_size, num_features).
+        """
+        return np.array(self.__read__(self.index, self.columns))
+
+    def read(self, window_key):
+        """
+        This function reads the windows selected by `window_key` (e.g. a slice or an array of window indices) as a
+        numpy array of shape (num_selected_windows, lookback_size, num_features). Unlike `materialize()`, the result
+        is a read-only view whenever the source allows it, so it should be copied before it is modified.
+        """
+        return self.__read__(self.index[window_key], self.columns)
+
+    def __read__(self, index: np.ndarray, columns: np.ndarray):
+        assert False, "Error: this function must be implemented in a WindowArray"
+
+    def __view__(self, index: np.ndarray, columns: np.ndarray):
+        assert False, "Error: this function must be implemented in a WindowArray"
+
+    @staticmethod
+    def __expand_key__(key):
+        # Normalizes a numpy-style key into a (window_key, time_key, column_key) tuple
+        if not isinstance(key, tuple):
+            key = (key,)
+        if any(k is Ellipsis for k in key):
+            ix = next(i for i, k in enumerate(key) if k is Ellipsis)
+            key = key[:ix] + (slice(None),) * (3 - len(key) + 1) + key[ix + 1:]
+        assert len(key) <= 3, f'Error: too many indices for WindowArray: {len(key)}'
+        return key + (slice(None),) * (3 - len(key))
+
+    @staticmethod
+    def __is_full_slice__(key):
+        return isinstance(key, slice) and key == slice(None)
+
+    @staticmethod
+    def __is_contiguous__(index: np.ndarray):
+        return len(index) > 0 and np.array_equal(index, np.arange(index[0], index[0] + len(index)))
+
+    @staticmethod
+    def __as_slice__(index: np.ndarray):
+        # Contiguous selections are converted to a slice, so that they can be read as a view
+        if WindowArray.__is_contiguous__(index):
+            return slice(int(index[0]), int(index[0]) + len(index))
+        return index
+
+
+class SlidingWindowArray(WindowArray):
+    def __init__(self, rows, starts: np.ndarray, lookback_size: int, columns: np.ndarray = None):
+        """
+        SlidingWindowArray is a WindowArray over one contiguous 2-dimensional array of rows. Instead of materializing
+        every window, it only stores the row at which each window starts: window `i` is
+        `rows[starts[i]:starts[i] + lookback_size]`.
+
+        Reading windows that are consecutive in `rows` returns a strided view over `rows`, and reading any other
+        selection only copies the requested windows.
+
+        :param rows: The 2-dimensional array of rows, with shape (num_rows, num_features)
+        :type rows: np.ndarray
+        :param starts: The row index at which each window starts
+        :type starts: np.ndarray
+        :param lookback_size: The lookback/window size
+        :type lookback_size: int
+        :param columns: (Optional) The indices of the features included in this view. Default is all features.
+        :type columns: np.ndarray
+        """
+        super().__init__(starts, lookback_size, np.arange(rows.shape[1]) if columns is None else columns)
+        self.rows = rows
+
+    @property
+    def starts(self):
+        return self.index
+
+    @staticmethod
+    def concatenate(arrays: list):
+        """
+        This function combines several SlidingWindowArrays with the same lookback size and features into one, by
+        concatenating their rows once. The windows keep their order: first every window of the first array, etc.
+
+        :param arrays: The SlidingWindowArrays to combine
+        :type arrays: list[SlidingWindowArray]
+        :rtype: SlidingWindowArray
+        """
+        assert len(arrays) > 0, 'Error: at least one SlidingWindowArray is required.'
+        assert len({a.lookback_size for a in arrays}) == 1, 'Error: every array must have the same lookback size.'
+        row_offsets = np.cumsum([0] + [a.rows.shape[0] for a in arrays[:-1]])
+        rows = np.concatenate([np.asarray(a.rows)[:, a.columns] for a in arrays])
+        starts = np.concatenate([a.starts + offset for a, offset in zip(arrays, row_offsets)])
+        return SlidingWindowArray(rows, starts, arrays[0].lookback_size)
+
+    @property
+    def dtype(self):
+        return self.rows.dtype
+
+    def rows_in_windows(self):
+        """
+        This function returns every row that is covered by at least one window in this view, exactly once and in
+        order, as a 2-dimensional array of shape (num_covered_rows, num_features). This is useful to compute
+        column-wise statistics without scanning every row lookback_size times.
+        """
+        return np.asarray(self.rows)[self.__covered_rows__()][:, self.columns]
+
+    def iter_rows_in_windows(self, chunk_size: int):
+        """
+        This function is the chunked version of `rows_in_windows`: it yields the rows covered by at least one window,
+        exactly once and in order, `chunk_size` source rows at a time, so that only one chunk is copied at a time.
+
+        :param chunk_size: The number of source rows read at a time
+        :type chunk_size: int
+        :return: Returns an iterator of 2-dimensional arrays of shape (num_covered_rows_in_chunk, num_features)
+        :rtype: Iterator[np.ndarray]
+        """
+        covered = self.__covered_rows__()
+        for start in range(0, len(covered), chunk_size):
+            chunk_covered = covered[start:start + chunk_size]
+            if chunk_covered.any():
+                yield np.asarray(self.rows[start:start + chunk_size])[chunk_covered][:, self.columns]
+
+    def __covered_rows__(self):
+        # Whether each row is covered by at least one window, from +1/-1 markers at the start and end of each window
+        covered = np.zeros(self.rows.shape[0] + 1, dtype=np.int64)
+        np.add.at(covered, self.starts, 1)
+        np.add.at(covered, self.starts + self.lookback_size, -1)
+        return np.cumsum(covered[:-1]) > 0
+
+    def __view__(self, index: np.ndarray, columns: np.ndarray):
+        return SlidingWindowArray(self.rows, index, self.lookback_size, columns)
+
+    def __read__(self, index: np.ndarray, columns: np.ndarray):
+        if len(index) == 0:
+            return np.empty((0, self.lookback_size, len(columns)), dtype=self.dtype)
+
+        if not isinstance(self.rows, np.ndarray):
+            # Rows backed by an open h5py dataset are read once per run of overlapping windows, so that sparse
+            # selections don't read every row in between
+            order = np.argsort(index, kind='stable')
+            sorted_index = index[order]
+            run_starts = np.flatnonzero(np.r_[True, np.diff(sorted_index) >= self.lookback_size])
+            runs = np.split(sorted_index, run_starts[1:])
+            rv = np.empty((len(index), self.lookback_size, len(columns)), dtype=self.dtype)
+            rv[order] = np.concatenate([self.__read_block__(run, columns) for run in runs])
+            return rv
+
+        return self.__read_block__(index, columns)
+
+    def __read_block__(self, index: np.ndarray, columns: np.ndarray):
+        """
+        This function reads the block of rows spanned by the windows beginning at `index`. If the windows are
+        consecutive, the result is a strided view over the block, otherwise only the requested windows are copied.
+        """
+        first_row = int(index.min())
+        block = np.asarray(self.rows[first_row:int(index.max()) + self.lookback_size])
+        block = block[:, self.__as_slice__(columns)]
+
+        # Shape (num_windows, lookback_size, num_features), without copying anything
+        windows = sliding_window_view(block, self.lookback_size, axis=0).transpose(0, 2, 1)
+
+        local_starts = index - first_row
+        if self.__is_contiguous__(local_starts):
+            return windows[local_starts[0]:local_starts[0] + len(local_starts)]
+        return windows[local_starts]
+
+
+class StoredWindowArray(WindowArray):
+    def __init__(self, source, index: np.ndarray = None, columns: np.ndarray = None):
+        """
+        StoredWindowArray is a WindowArray over windows that are already stored as a 3-dimensional array, e.g. an
+        open h5py dataset or a memory map. Windows are only read from the source when they are accessed.
+
+        :param source: The 3-dimensional array of windows, with shape (num_windows, lookback_size, num_features)
+        :type source: h5py.Dataset | np.memmap
+        :param index: (Optional) The indices of the windows included in this view. Default is all windows.
+        :type index: np.ndarray
+        :param columns: (Optional) The indices of the features included in this view. Default is all features.
+        :type columns: np.ndarray
+        """
+        super().__init__(
+            np.arange(source.shape[0]) if index is None else index,
+            source.shape[1],
+            np.arange(source.shape[2]) if columns is None else columns
+        )
+        self.source = source
+
+    @property
+    def dtype(self):
+        return self.source.dtype
+
+    def __view__(self, index: np.ndarray, columns: np.ndarray):
+        return StoredWindowArray(self.source, index, columns)
+
+    def __read__(self, index: np.ndarray, columns: np.ndarray):
+        if len(index) == 0:
+            return np.empty((0, self.lookback_size, len(columns)), dtype=self.dtype)
+
+        # h5py can only read increasing indices, so read each window once in order and then restore the order
+        unique_index, inverse = np.unique(index, return_inverse=True)
+        column_selection = self.__as_slice__(columns)
+        if isinstance(column_selection, slice):
+            windows = self.source[self.__as_slice__(unique_index), :, column_selection]
+        else:
+            windows = self.source[self.__as_slice__(unique_index)][:, :, columns]
+
+        windows = np.asarray(windows)
+        return windows if self.__is_contiguous__(index) else windows[inverse]
@@ -0,0 +1,321 @@
+import csv
+import json
+import sys
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+class Span:
+    """
+    A Span is one measured unit of work, e.g. one scrape request or one feature build. It is created by
+    `Instrumentation.span`, and the instrumented code can fill in what it processed while it is open:
+
+    ```
+    with instrumentation.span('scraper.request', ticker='DIS') as span:
+        df = ...
+        span.set(cached=False)
+        span.rows = len(df)
+        span.bytes = df.memory_usage().sum()
+    ```
+
+    Once the span is closed, it holds:
+        - `seconds`: the wall time
+        - `rows` and `bytes`: the amount of data processed, if the instrumented code set them
+        - `allocated_bytes`: the peak memory allocated during the span, only if allocations are traced
+        - `peak_rss_bytes`: the peak resident memory of the process so far, when the span ended
+        - `error`: the type of the exception that ended the span, if any
+    """
+
+    __slots__ = ('name', 'attributes', 'parent', 'start', 'seconds', 'rows', 'bytes', 'allocated_bytes',
+                 'peak_rss_bytes', 'error', '__instrumentation__', '__start_time__', '__start_memory__',
+                 '__peak_memory__')
+
+    def __init__(self, instrumentation, name: str, attributes: dict):
+        self.name = name
+        self.attributes = attributes
+        self.parent = None
+        self.start = None
+        self.seconds = None
+        self.rows = None
+        self.bytes = None
+        self.allocated_bytes = None
+        self.peak_rss_bytes = None
+        self.error = None
+        self.__instrumentation__ = instrumentation
+
+    def __enter__(self):
+        self.__instrumentation__.__start__(self)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is not None:
+            self.error = exc_type.__name__
+        self.__instrumentation__.__end__(self)
+        return False
+
+    def set(self, **attributes):
+        """
+        This function adds details to the span while it is open, e.g. `span.set(cached=True)`.
+        """
+        self.attributes.update(attributes)
+
+    def to_dict(self):
+        return {
+            'name': self.name, 'parent': self.parent, 'start': self.start, 'seconds': self.seconds,
+            'rows': self.rows, 'bytes': self.bytes, 'allocated_bytes': self.allocated_bytes,
+            'peak_rss_bytes': self.peak_rss_bytes, 'error': self.error, 'attributes': self.attributes
+        }
+
+
+class __DisabledSpan__:
+    # Shared by every span of a disabled Instrumentation: entering it and setting its fields costs nothing
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+    def __setattr__(self, key, value):
+        pass
+
+    def set(self, **attributes):
+        pass
+
+
+class Instrumentation:
+    # The fields of every span, in the order of the CSV export (followed by the attributes)
+    FIELDS = ['name', 'parent', 'start', 'seconds', 'rows', 'bytes', 'allocated_bytes', 'peak_rss_bytes', 'error']
+
+    __disabled_span__ = __DisabledSpan__()
+
+    def __init__(self, hooks: list = None, trace_allocations: bool = False, keep_spans: bool = True,
+                 enabled: bool = True):
+        """
+        Instrumentation records the wall time, the amount of data processed and the memory of each stage of the
+        pipeline. Pass the same Instrumentation to the Scraper, the FeatureGenerator and the Dataset to measure all of
+        them together:
+            - `scraper.request`: every (ticker, date) request, with whether it was read from the cache
+            - `feature_generator.read`, `feature_generator.cleanup`, `feature_generator.parse_dates`,
+              `feature_generator.extract` (every feature), `feature_generator.attach` and `feature_generator.export`
+            - `dataset.windowing`, `dataset.save` and `dataset.load` (HDF5 I/O)
+
+        Every finished Span is passed to each hook, e.g. to send it to a monitoring system, and kept (unless
+        `keep_spans=False`) for `report`, `to_json` and `to_csv`.
+
+        A disabled Instrumentation measures nothing: every span is the same shared no-op object, so the instrumented
+        code runs at full speed. This is the default of every instrumented class.
+
+        :param hooks: (Optional) The callbacks to call with every finished Span, e.g. `lambda span: print(span.name)`.
+        :type hooks: list[Callable[[Span], None]]
+        :param trace_allocations: Whether to measure the memory allocated by each span with tracemalloc. This slows
+        down the instrumented code a lot, and allocations of concurrent spans (e.g. parallel scrape requests) are
+        counted in each of them. If tracemalloc isn't tracing yet, it is started, and `close()` stops it again, so
+        tracing allocations is best used as a context manager:
+
+        ```
+        with Instrumentation(trace_allocations=True) as instrumentation:
+            ...
+        ```
+        :type trace_allocations: bool
+        :param keep_spans: Whether to keep every finished Span in `spans`.
+        :type keep_spans: bool
+        :param enabled: Whether anything is measured at all.
+        :type enabled: bool
+        """
+        self.hooks = list(hooks) if hooks else []
+        self.trace_allocations = trace_allocations
+        self.keep_spans = keep_spans
+        self.enabled = enabled
+        self.spans = []
+
+        self.__lock__ = threading.Lock()
+        self.__local__ = threading.local()
+        self.__started_tracing__ = enabled and trace_allocations and not tracemalloc.is_tracing()
+        if self.__started_tracing__:
+            tracemalloc.start()
+
+    def close(self):
+        """
+        This function stops tracing allocations, if this Instrumentation started tracemalloc. The spans kept so far can
+        still be reported, and later spans are measured without their allocations.
+        """
+        self.trace_allocations = False
+        if self.__started_tracing__:
+            self.__started_tracing__ = False
+            tracemalloc.stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+    def span(self, name: str, **attributes):
+        """
+        This function returns a new Span, to be used as a context manager around the measured code.
+
+        :param name: The name of the stage, e.g. 'scraper.request'. Spans with the same name are aggregated together
+        in the report.
+        :type name: str
+        :param attributes: Any details of this span, e.g. `ticker='DIS'`
+        :rtype: Span
+        """
+        if not self.enabled:
+            return self.__disabled_span__
+        return Span(self, name, attributes)
+
+    def add_hook(self, hook):
+        """
+        This function adds a callback to call with every finished Span.
+        """
+        self.hooks.append(hook)
+
+    def reset(self):
+        """
+        This function forgets every span kept so far.
+        """
+        with self.__lock__:
+            self.spans = []
+
+    def summary(self):
+        """
+        This function aggregates the kept spans by name.
+
+        :return: Returns one dict per span name, in order of first appearance, with the number of spans, the total,
+        mean and max wall time, the total rows and bytes, the throughput, the largest allocation, the peak resident
+        memory and the number of errors
+        :rtype: list[dict]
+        """
+        groups = {}
+        for span in list(self.spans):
+            groups.setdefault(span.name, []).append(span)
+
+        summary = []
+        for name, spans in groups.items():
+            seconds = [s.seconds for s in spans]
+            rows = [s.rows for s in spans if s.rows is not None]
+            data_bytes = [s.bytes for s in spans if s.bytes is not None]
+            allocated = [s.allocated_bytes for s in spans if s.allocated_bytes is not None]
+            peak_rss = [s.peak_rss_bytes for s in spans if s.peak_rss_bytes is not None]
+            total_seconds = sum(seconds)
+            summary.append({
+                'name': name,
+                'count': len(spans),
+                'total_seconds': total_seconds,
+                'mean_seconds': total_seconds / len(spans),
+                'max_seconds': max(seconds),
+                'rows': sum(rows) if rows else None,
+                'rows_per_second': sum(rows) / total_seconds if rows and total_seconds > 0 else None,
+                'bytes': sum(data_bytes) if data_bytes else None,
+                'max_allocated_bytes': max(allocated) if allocated else None,
+                'peak_rss_bytes': max(peak_rss) if peak_rss else None,
+                'errors': sum(s.error is not None for s in spans)
+            })
+        return summary
+
+    def report(self):
+        """
+        :return: Returns a table of the `summary` of the kept spans
+        :rtype: str
+        """
+        def mib(value):
+            return '-' if value is None else f'{value / 2 ** 20:.1f}'
+
+        lines = [f"{'stage':<32}{'count':>7}{'total s':>10}{'mean s':>10}{'max s':>10}{'rows':>11}{'rows/s':>12}"
+                 f"{'MiB':>9}{'alloc MiB':>11}{'RSS MiB':>10}{'errors':>8}"]
+        for s in self.summary():
+            rows = '-' if s['rows'] is None else str(s['rows'])
+            rows_per_second = '-' if s['rows_per_second'] is None else f"{s['rows_per_second']:.0f}"
+            lines.append(f"{s['name']:<32}{s['count']:>7}{s['total_seconds']:>10.3f}{s['mean_seconds']:>10.4f}"
+                         f"{s['max_seconds']:>10.4f}{rows:>11}{rows_per_second:>12}{mib(s['bytes']):>9}"
+                         f"{mib(s['max_allocated_bytes']):>11}{mib(s['peak_rss_bytes']):>10}{s['errors']:>8}")
+        return '\n'.join(lines)
+
+    def to_json(self, filename: str):
+        """
+        This function writes the kept spans and their summary to a JSON file.
+
+        :param filename: The JSON file to write
+        :type filename: str
+        """
+        Path(filename).parent.mkdir(parents=True, exist_ok=True)
+        with open(filename, 'w') as file:
+            json.dump({
+                'spans': [s.to_dict() for s in list(self.spans)],
+                'summary': self.summary()
+            }, file, indent=4, default=str)
+
+    def to_csv(self, filename: str):
+        """
+        This function writes the kept spans to a CSV file, with one row per span: the fields of the span (see
+        `FIELDS`), followed by one column per attribute.
+
+        :param filename: The CSV file to write
+        :type filename: str
+        """
+        spans = list(self.spans)
+        attributes = list(dict.fromkeys(key for s in spans for key in s.attributes))
+        Path(filename).parent.mkdir(parents=True, exist_ok=True)
+        with open(filename, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(self.FIELDS + attributes)
+            for s in spans:
+                row = s.to_dict()
+                writer.writerow([row[f] for f in self.FIELDS] + [s.attributes.get(a) for a in attributes])
+
+    def __start__(self, span: Span):
+        stack = self.__stack__()
+        if stack:
+            span.parent = stack[-1].name
+        span.start = time.time()
+        if self.trace_allocations:
+            current, peak = tracemalloc.get_traced_memory()
+            # The peak is reset for this span, so the enclosing span keeps track of its own peak so far
+            if stack:
+                stack[-1].__peak_memory__ = max(stack[-1].__peak_memory__, peak)
+            tracemalloc.reset_peak()
+            span.__start_memory__ = current
+            span.__peak_memory__ = current
+        stack.append(span)
+        span.__start_time__ = time.perf_counter()
+
+    def __end__(self, span: Span):
+        span.seconds = time.perf_counter() - span.__start_time__
+        stack = self.__stack__()
+        stack.pop()
+        if self.trace_allocations:
+            peak = max(tracemalloc.get_traced_memory()[1], span.__peak_memory__)
+            span.allocated_bytes = peak - span.__start_memory__
+            if stack:
+                stack[-1].__peak_memory__ = max(stack[-1].__peak_memory__, peak)
+        span.peak_rss_bytes = self.__peak_rss__()
+
+        if self.keep_spans:
+            with self.__lock__:
+                self.spans.append(span)
+        for hook in self.hooks:
+            hook(span)
+
+    def __stack__(self):
+        # The spans open in the current thread, innermost last
+        if not hasattr(self.__local__, 'stack'):
+            self.__local__.stack = []
+        return self.__local__.stack
+
+    @staticmethod
+    def __peak_rss__():
+        if resource is None:
+            return None
+        # ru_maxrss is in kilobytes on Linux, and in bytes on macOS
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak_rss if sys.platform == 'darwin' else peak_rss * 1024
@@ -0,0 +1,79 @@
+from datetime import date, timedelta
+from functools import lru_cache
+
+
+class MarketCalendar:
+    """
+    MarketCalendar knows which days the US stock market (NYSE/NASDAQ) is open: every weekday except the regular
+    market holidays. Unscheduled closures (e.g. national days of mourning) are not included.
+    """
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def holidays(year: int):
+        """
+        :return: Returns the set of market holidays (observed dates) for the given year
+        :rtype: set[date]
+        """
+        rv = {
+            MarketCalendar.__nth_weekday__(year, 1, 0, 3),  # Martin Luther King Jr. Day, 3rd Monday of January
+            MarketCalendar.__nth_weekday__(year, 2, 0, 3),  # Washington's Birthday, 3rd Monday of February
+            MarketCalendar.__easter__(year) - timedelta(days=2),  # Good Friday
+            MarketCalendar.__nth_weekday__(year, 5, 0, -1),  # Memorial Day, last Monday of May
+            MarketCalendar.__observed__(date(year, 7, 4)),  # Independence Day
+            MarketCalendar.__nth_weekday__(year, 9, 0, 1),  # Labor Day, 1st Monday of September
+            MarketCalendar.__nth_weekday__(year, 11, 3, 4),  # Thanksgiving, 4th Thursday of November
+            MarketCalendar.__observed__(date(year, 12, 25)),  # Christmas
+        }
+        # New Year's Day is not observed on the previous Friday when it falls on a Saturday
+        new_years_day = date(year, 1, 1)
+        if new_years_day.weekday() != 5:
+            rv.add(MarketCalendar.__observed__(new_years_day))
+        if year >= 2022:
+            rv.add(MarketCalendar.__observed__(date(year, 6, 19)))  # Juneteenth
+        return rv
+
+    @staticmethod
+    def is_trading_day(day: date):
+        return day.weekday() < 5 and day not in MarketCalendar.holidays(day.year)
+
+    @staticmethod
+    def trading_days(start: date, end: date):
+        """
+        :return: Returns every trading day from `start` to `end` (inclusive), in order
+        :rtype: list[date]
+        """
+        return [start + timedelta(days=i) for i in range((end - start).days + 1)
+                if MarketCalendar.is_trading_day(start + timedelta(days=i))]
+
+    @staticmethod
+    def __nth_weekday__(year: int, month: int, weekday: int, n: int):
+        # The n-th (or, if n is negative, the n-th last) given weekday of the month
+        if n > 0:
+            first = date(year, month, 1)
+            return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+        last = date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+        return last - timedelta(days=(last.weekday() - weekday) % 7 + 7 * (-n - 1))
+
+    @staticmethod
+    def __observed__(holiday: date):
+        # Holidays on a Saturday are observed on the Friday before, and on a Sunday on the Monday after
+        if holiday.weekday() == 5:
+            return holiday - timedelta(days=1)
+        if holiday.weekday() == 6:
+            return holiday + timedelta(days=1)
+        return holiday
+
+    @staticmethod
+    def __easter__(year: int):
+        # Anonymous Gregorian algorithm
+        a, b, c = year % 19, year // 100, year % 100
+        d, e = b // 4, b % 4
+        f = (b + 8) // 25
+        g = (b - f + 1) // 3
+        h = (19 * a + b - d - g + 15) % 30
+        i, k = c // 4, c % 4
+        l = (32 + 2 * e + 2 * i - h - k) % 7
+        m = (a + 11 * h + 22 * l) // 451
+        month = (h + l - 7 * m + 114) // 31
+        return date(year, month, (h + l - 7 * m + 114) % 31 + 1)
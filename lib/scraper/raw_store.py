@@ -0,0 +1,313 @@
+import json
+import os
+import sys
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from lib.constants import MetaConstants, ScraperConstants
+
+IEX_FIELD_NAMES = MetaConstants.IEXDataFields
+
+
+class RawFormat:
+    """
+    RawFormat is the typed, columnar (parquet) storage format of raw IEXCloud data, shared by the Scraper (which
+    writes it) and the FeatureGenerator (which reads it):
+        - `date` is stored as a native timestamp (datetime64)
+        - `minute` is stored as a native time of day (timedelta64 since midnight) instead of an 'HH:MM' string
+        - every numeric IEXCloud field is stored as float64, so that every chunk of data has the same schema
+    Legacy CSV files are still readable, and can be converted once with `convert_csv`.
+    """
+
+    FIELDS = [field for name, field in vars(IEX_FIELD_NAMES).items() if not name.startswith('__')]
+    NUMERIC_FIELDS = [
+        field for field in FIELDS if field not in (IEX_FIELD_NAMES.date, IEX_FIELD_NAMES.minute, IEX_FIELD_NAMES.label)
+    ]
+
+    @staticmethod
+    def normalize(df: pd.DataFrame):
+        """
+        This function converts raw IEXCloud data, as returned by pyEX or read from a CSV file, to the typed format.
+        A named index (pyEX uses the date) becomes a regular column, and an unnamed index is dropped.
+        """
+        df = df.reset_index(drop=df.index.name is None or df.index.name in df.columns)
+        df = df.drop(columns=[c for c in df.columns if str(c).startswith('Unnamed:')])
+
+        if IEX_FIELD_NAMES.date in df.columns:
+            df[IEX_FIELD_NAMES.date] = pd.to_datetime(df[IEX_FIELD_NAMES.date])
+        if IEX_FIELD_NAMES.minute in df.columns and not pd.api.types.is_timedelta64_dtype(df[IEX_FIELD_NAMES.minute]):
+            df[IEX_FIELD_NAMES.minute] = pd.to_timedelta(df[IEX_FIELD_NAMES.minute].astype(str) + ':00')
+        for field in RawFormat.NUMERIC_FIELDS:
+            if field in df.columns:
+                df[field] = pd.to_numeric(df[field], errors='coerce').astype(float)
+        return df
+
+    @staticmethod
+    def conform(df: pd.DataFrame):
+        """
+        This function normalizes raw IEXCloud data (see `normalize`) and reindexes it to every IEXCloud field, in the
+        order of `FIELDS`, so that every chunk of data has exactly the same schema (see `arrow_schema`). Missing fields
+        are added as empty values, and columns that aren't IEXCloud fields are dropped.
+        """
+        df = RawFormat.normalize(df)
+        conformed = pd.DataFrame(index=df.index)
+        for field in RawFormat.FIELDS:
+            if field in df.columns:
+                conformed[field] = df[field]
+            elif field == IEX_FIELD_NAMES.date:
+                conformed[field] = pd.Series(pd.NaT, index=df.index, dtype='datetime64[ns]')
+            elif field == IEX_FIELD_NAMES.minute:
+                conformed[field] = pd.Series(pd.NaT, index=df.index, dtype='timedelta64[ns]')
+            elif field == IEX_FIELD_NAMES.label:
+                conformed[field] = pd.Series(None, index=df.index, dtype=object)
+            else:
+                conformed[field] = np.nan
+        return conformed
+
+    @staticmethod
+    def arrow_schema():
+        """
+        :return: Returns the pyarrow schema of data conformed by `conform`
+        :rtype: pyarrow.Schema
+        """
+        import pyarrow as pa
+
+        types = {IEX_FIELD_NAMES.date: pa.timestamp('ns'), IEX_FIELD_NAMES.minute: pa.duration('ns'),
+                 IEX_FIELD_NAMES.label: pa.string()}
+        return pa.schema([(field, types.get(field, pa.float64())) for field in RawFormat.FIELDS])
+
+    @staticmethod
+    def is_columnar(filename: str):
+        return os.path.isdir(filename) or str(filename).endswith(ScraperConstants.RAW_FILE_EXTENSION)
+
+    @staticmethod
+    def write(df: pd.DataFrame, filename: str):
+        RawFormat.normalize(df).to_parquet(filename, index=False)
+
+    @staticmethod
+    def read(filename: str, columns: list[str] = None):
+        """
+        This function reads raw data from a parquet file, a directory of parquet files or a legacy CSV file.
+
+        :param filename: The file (or directory) to read
+        :type filename: str
+        :param columns: (Optional) The columns to read. Only these columns are read from parquet files.
+        Default is all columns.
+        :type columns: list[str]
+        :return: Returns the raw data, with typed `date` (and, for parquet files, `minute`) columns
+        :rtype: pd.DataFrame
+        """
+        if RawFormat.is_columnar(filename):
+            return pd.read_parquet(filename, columns=columns)
+
+        df = pd.read_csv(filename, usecols=columns)
+        if IEX_FIELD_NAMES.date in df.columns:
+            df[IEX_FIELD_NAMES.date] = pd.to_datetime(df[IEX_FIELD_NAMES.date])
+        return df
+
+    @staticmethod
+    def convert_csv(csv_filename: str, filename: str = None):
+        """
+        This function converts a raw CSV file, saved by a previous version of the Scraper, to the columnar format.
+
+        :param csv_filename: The CSV file to convert
+        :type csv_filename: str
+        :param filename: (Optional) The file to write. Default is the CSV filename with a parquet extension.
+        :type filename: str
+        :return: Returns the filename of the converted file
+        :rtype: str
+        """
+        filename = filename or str(Path(csv_filename).with_suffix(ScraperConstants.RAW_FILE_EXTENSION))
+        RawFormat.write(pd.read_csv(csv_filename), filename)
+        return filename
+
+
+class RawStore:
+    def __init__(self, directory: str = ScraperConstants.STORE_DIR,
+                 max_empty_attempts: int = ScraperConstants.MAX_EMPTY_DAY_ATTEMPTS):
+        """
+        RawStore is a persistent, append-only store of raw IEXCloud data, with one directory per ticker that holds one
+        parquet file per day. Next to each directory, a manifest records which dates have been fetched. Every appended
+        day is checkpointed: the day's file is written atomically and synced to disk, and only then is the manifest
+        atomically rewritten, so that after a crash the scrape can resume from the last complete day.
+
+        Days that came back empty are recorded separately in the manifest, and are not counted as fetched: an empty
+        response may be due to a temporary problem, so they are requested again by the next scrape, until they have
+        come back empty `max_empty_attempts` times (see `exhausted_dates`).
+
+        The directory of a ticker can be read as a whole, e.g. by `RawFormat.read` or the FeatureGenerator.
+
+        :param directory: The directory to store the data in.
+        :type directory: str
+        :param max_empty_attempts: The number of times a day can come back empty before it isn't requested again.
+        :type max_empty_attempts: int
+        """
+        assert max_empty_attempts >= 1, f'Error: max_empty_attempts must be at least 1, got {max_empty_attempts}.'
+        self.max_empty_attempts = max_empty_attempts
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def filename(self, ticker: str):
+        return str(self.directory / ticker)
+
+    def manifest(self, ticker: str):
+        """
+        :return: Returns the manifest of the ticker: a dict with the `dates` fetched so far, mapped to their number of
+        rows, and the `empty_dates` that came back empty, mapped to the number of times they did.
+        :rtype: dict
+        """
+        path = self.__manifest_path__(ticker)
+        if not path.exists():
+            return {'ticker': ticker, 'dates': {}, 'empty_dates': {}}
+        with open(path) as file:
+            manifest = json.load(file)
+        # Manifests written before empty days were recorded separately list them in `dates`, with 0 rows
+        empty_dates = manifest.setdefault('empty_dates', {})
+        for date in [date for date, num_rows in manifest['dates'].items() if num_rows == 0]:
+            del manifest['dates'][date]
+            empty_dates[date] = empty_dates.get(date, 0) + 1
+        return manifest
+
+    def fetched_dates(self, ticker: str):
+        """
+        :return: Returns the dates stored for the ticker. Dates that came back empty are not included.
+        :rtype: set[str]
+        """
+        return set(self.manifest(ticker)['dates'])
+
+    def exhausted_dates(self, ticker: str):
+        """
+        :return: Returns the dates of the ticker that came back empty `max_empty_attempts` times or more, and
+        shouldn't be requested again
+        :rtype: set[str]
+        """
+        empty_dates = self.manifest(ticker)['empty_dates']
+        return {date for date, attempts in empty_dates.items() if attempts >= self.max_empty_attempts}
+
+    def append(self, ticker: str, date: str, df: pd.DataFrame):
+        """
+        This function stores the data of one day for the ticker, and checkpoints it in the manifest.
+
+        :param ticker: The ticker symbol
+        :type ticker: str
+        :param date: The date (YYYY-MM-DD) of the data
+        :type date: str
+        :param df: The data of that day, as returned by IEXCloud. It may be empty, in which case no file is written and
+        the day is recorded as empty, so that it is requested again.
+        :type df: pd.DataFrame
+        """
+        manifest = self.manifest(ticker)
+
+        if df.shape[0] > 0:
+            directory = Path(self.filename(ticker))
+            directory.mkdir(parents=True, exist_ok=True)
+            path = directory / f'{date}{ScraperConstants.RAW_FILE_EXTENSION}'
+            # The temporary file doesn't have the parquet extension, so readers of the directory never see it
+            tmp_path = directory / f'.{date}.tmp'
+            RawFormat.write(df, tmp_path)
+            # The day must be on disk before the manifest says it is
+            with open(tmp_path, 'rb+') as file:
+                os.fsync(file.fileno())
+            os.replace(tmp_path, path)
+            manifest['dates'][date] = int(df.shape[0])
+            manifest['empty_dates'].pop(date, None)
+        else:
+            manifest['empty_dates'][date] = manifest['empty_dates'].get(date, 0) + 1
+
+        self.__write_manifest__(ticker, manifest)
+
+    def read(self, ticker: str, columns: list[str] = None):
+        """
+        :return: Returns all of the data stored for the ticker
+        :rtype: pd.DataFrame
+        """
+        return RawFormat.read(self.filename(ticker), columns=columns)
+
+    def __manifest_path__(self, ticker: str):
+        return self.directory / f'{ticker}{ScraperConstants.MANIFEST_SUFFIX}'
+
+    def __write_manifest__(self, ticker: str, manifest: dict):
+        path = self.__manifest_path__(ticker)
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'w') as outfile:
+            json.dump(manifest, outfile, ensure_ascii=False, indent=4)
+            outfile.flush()
+            os.fsync(outfile.fileno())
+        os.replace(tmp_path, path)
+
+
+class RawFileWriter:
+    def __init__(self, filename: str):
+        """
+        RawFileWriter streams the raw data of one ticker to a single parquet file, one chunk (e.g. one day) at a time
+        as a new row group, so that the data never has to be held (or re-copied) in memory as a whole. Every chunk is
+        conformed to every IEXCloud field (see `RawFormat.conform`), so chunks with missing or empty columns can be
+        written to the same file.
+
+        :param filename: The file to write to. It is overwritten.
+        :type filename: str
+        """
+        self.filename = filename
+        self.writer = None
+        self.num_rows = 0
+
+    def append(self, df: pd.DataFrame):
+        # pyarrow is only imported when raw data is streamed to a file
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if df.shape[0] == 0:
+            return
+        table = pa.Table.from_pandas(RawFormat.conform(df), schema=RawFormat.arrow_schema(), preserve_index=False)
+        if self.writer is None:
+            self.writer = pq.ParquetWriter(self.filename, table.schema)
+        self.writer.write_table(table)
+        self.num_rows += df.shape[0]
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        else:
+            # Make sure the file exists, even if no data was written
+            pd.DataFrame().to_parquet(self.filename)
+        return RawDataHandle(self.filename)
+
+
+class RawDataHandle:
+    def __init__(self, filename: str):
+        """
+        RawDataHandle is a lazy handle to raw data saved on disk: nothing is read until `read` or `iter_chunks` is
+        called. It can be passed around instead of the full DataFrame, e.g. `FeatureGenerator(handle.filename)`.
+
+        :param filename: The file that contains the data
+        :type filename: str
+        """
+        self.filename = filename
+
+    def __repr__(self):
+        return f'RawDataHandle({self.filename})'
+
+    def read(self, columns: list[str] = None):
+        """
+        :param columns: (Optional) The columns to read. Default is all columns.
+        :type columns: list[str]
+        :return: Returns the data as a DataFrame
+        :rtype: pd.DataFrame
+        """
+        return RawFormat.read(self.filename, columns=columns)
+
+    def iter_chunks(self, chunksize: int = 100000, columns: list[str] = None):
+        """
+        :return: Returns an iterator of DataFrames of at most `chunksize` rows each
+        :rtype: Iterator[pd.DataFrame]
+        """
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(self.filename).iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+
+
+if __name__ == '__main__':
+    # One-off conversion of legacy raw CSV files: `python -m lib.scraper.raw_store exported_data/raw/*/*.csv`
+    for csv_file in sys.argv[1:]:
+        print(f"Converted {csv_file} to {RawFormat.convert_csv(csv_file)}")
@@ -0,0 +1,123 @@
+import random
+import re
+import threading
+import time
+from lib.constants import ScraperConstants
+
+ERROR_TYPES = ScraperConstants.ErrorTypes
+
+
+class TokenBucket:
+    def __init__(self, rate: float = ScraperConstants.RateLimits.REQUESTS_PER_SECOND, capacity: float = None):
+        """
+        TokenBucket is a thread-safe rate limiter. Tokens are added continuously at `rate` tokens per second, up to
+        `capacity`, and every request must acquire its tokens before it is sent. Share one TokenBucket between
+        scrapers (and threads) to keep all of them together under the IEXCloud request/message quota.
+
+        :param rate: The number of tokens added per second, i.e. the sustained number of requests per second.
+        :type rate: float
+        :param capacity: (Optional) The maximum number of tokens, i.e. the largest allowed burst. Default is `rate`.
+        :type capacity: float
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1):
+        """
+        This function blocks until `tokens` tokens are available, and then consumes them.
+        """
+        assert tokens <= self.capacity, f'Error: cannot acquire {tokens} tokens from a bucket of {self.capacity}.'
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+                self.last_refill = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait_time = (tokens - self.tokens) / self.rate
+            time.sleep(wait_time)
+
+
+class RetryPolicy:
+
+    __status_pattern__ = re.compile(r'Response (\d{3})')
+
+    def __init__(self, max_attempts: int = 5, base_delay: float = 1.0, max_delay: float = 60.0,
+                 rate_limit_delay: float = 5.0, jitter: bool = True):
+        """
+        RetryPolicy decides whether a failed request should be retried, and how long to wait before retrying it.
+
+        Errors are classified as one of `ScraperConstants.ErrorTypes`: rate-limit and transient errors are retried
+        with exponential backoff (and full jitter, so concurrent scrapers don't retry in lockstep), not-found errors
+        are skipped and fatal errors are never retried.
+
+        :param max_attempts: The maximum number of attempts per request, including the first one.
+        :type max_attempts: int
+        :param base_delay: The backoff delay, in seconds, after the first failed attempt. It doubles on every attempt.
+        :type base_delay: float
+        :param max_delay: The maximum backoff delay, in seconds.
+        :type max_delay: float
+        :param rate_limit_delay: The backoff delay, in seconds, after the first rate-limited attempt.
+        :type rate_limit_delay: float
+        :param jitter: Whether to randomize each delay uniformly between 0 and the backoff delay.
+        :type jitter: bool
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rate_limit_delay = rate_limit_delay
+        self.jitter = jitter
+
+    def classify(self, error: Exception):
+        """
+        This function classifies an error raised by the client, based on its HTTP status code when there is one
+        (pyEX raises `PyEXception('Response 429 - ', ...)`, requests raises errors with a `response.status_code`).
+
+        :return: One of `ScraperConstants.ErrorTypes`
+        :rtype: str
+        """
+        status_code = self.__status_code__(error)
+        if status_code == 429:
+            return ERROR_TYPES.RATE_LIMIT
+        if status_code == 404:
+            return ERROR_TYPES.NOT_FOUND
+        if status_code is not None and 400 <= status_code < 500:
+            return ERROR_TYPES.FATAL
+        if status_code is None and isinstance(error, (ValueError, TypeError, KeyError)):
+            # Programming errors (e.g. invalid arguments) won't be fixed by retrying
+            return ERROR_TYPES.FATAL
+        return ERROR_TYPES.TRANSIENT
+
+    def should_retry(self, error_type: str, attempt: int):
+        """
+        :param error_type: The type of the error, from `classify`
+        :type error_type: str
+        :param attempt: The number of attempts made so far
+        :type attempt: int
+        """
+        return error_type in (ERROR_TYPES.RATE_LIMIT, ERROR_TYPES.TRANSIENT) and attempt < self.max_attempts
+
+    def backoff(self, error_type: str, attempt: int):
+        """
+        This function returns the number of seconds to wait before the next attempt.
+
+        :param error_type: The type of the error, from `classify`
+        :type error_type: str
+        :param attempt: The number of attempts made so far
+        :type attempt: int
+        """
+        base_delay = self.rate_limit_delay if error_type == ERROR_TYPES.RATE_LIMIT else self.base_delay
+        delay = min(self.max_delay, base_delay * 2 ** (attempt - 1))
+        return random.uniform(0, delay) if self.jitter else delay
+
+    def __status_code__(self, error: Exception):
+        response = getattr(error, 'response', None)
+        status_code = getattr(error, 'status_code', None) or getattr(response, 'status_code', None)
+        if status_code is None and error.args:
+            match = self.__status_pattern__.search(str(error.args[0]))
+            status_code = match and match.group(1)
+        return int(status_code) if status_code is not None else None
@@ -1,60 +1,153 @@
-import pyEX
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dateutil.parser import parse
 from datetime import timedelta
 import pandas as pd
+from lib.cache import DiskCache
 from lib.constants import ScraperConstants
+from lib.instrumentation import Instrumentation
+from lib.scraper.market_calendar import MarketCalendar
+from lib.scraper.raw_store import RawDataHandle, RawFileWriter, RawFormat, RawStore
+from lib.scraper.retry import RetryPolicy, TokenBucket
 from lib.scraper.ticker import Ticker
 from pathlib import Path
 import time
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    # pyEX is only imported when the client is built from the config
+    import pyEX
 
 CONFIG_CONSTANTS = ScraperConstants.Config
+ERROR_TYPES = ScraperConstants.ErrorTypes
 
 
 class Scraper:
-    def __init__(self, config_file: str = 'config/iexcloud-config.json', should_print: bool = True):
+    def __init__(self, config_file: str = 'config/iexcloud-config.json', should_print: bool = True,
+                 client: 'pyEX.Client' = None, retry_policy: RetryPolicy = None, rate_limiter: TokenBucket = None,
+                 interactive: bool = False, cache: DiskCache = None, instrumentation: Instrumentation = None):
         """
         This function initializes the Scraper class, which is a scraping object designed to scrape data from IEXCloud.
 
         :param config_file: A configuration file with IEX credentials.
         Must contain keys: {'api_token':str, 'api_secret':str, 'sandbox':str}.
-        See `config/iexcloud-config.json` as an example.
+        See `config/iexcloud-config.json` as an example. Can be None if a `client` is provided.
         :type config_file: str
         :param should_print: Whether to print the status of scraping or not.
         :type should_print: bool
+        :param client: (Optional) The client to fetch the data with, instead of a pyEX.Client built from the config.
+        Any object with a pyEX-compatible `chartDF(symbol, date=..., sort=...)` method works, e.g. a fake client
+        for testing.
+        :type client: pyEX.Client
+        :param retry_policy: (Optional) The policy used to retry failed requests. Default is `RetryPolicy()`.
+        :type retry_policy: RetryPolicy
+        :param rate_limiter: (Optional) The rate limiter every request goes through. Pass the same TokenBucket to
+        several scrapers to keep all of them under one quota. Default is a TokenBucket at the IEXCloud rate limit.
+        :type rate_limiter: TokenBucket
+        :param interactive: Whether to ask on the command line whether to continue, when a request fails for good.
+        If False (the default), the scraper never blocks on user input.
+        :type interactive: bool
+        :param cache: (Optional) A persistent cache of responses, keyed by (ticker, date, stage). Historical days are
+        read from the cache instead of IEXCloud when they have been scraped before. Responses for today (or later)
+        and empty responses are never cached. E.g. `DiskCache(ScraperConstants.CACHE_DIR)`.
+        :type cache: DiskCache
+        :param instrumentation: (Optional) The instrumentation to measure every request with, as a `scraper.request`
+        span (see lib.instrumentation.Instrumentation). Default is no instrumentation.
+        :type instrumentation: Instrumentation
         """
         self.timestamp = int(time.time())
 
-        with open(config_file) as file:
-            config = json.load(file)
+        config = {}
+        if config_file is not None:
+            with open(config_file) as file:
+                config = json.load(file)
+        else:
+            assert client is not None, 'Error: either a config_file or a client must be provided.'
 
-        self.access_token = config[CONFIG_CONSTANTS.API_TOKEN]
-        self.access_secret = config[CONFIG_CONSTANTS.API_SECRET]
-        self.sandbox_mode = config[CONFIG_CONSTANTS.SANDBOX_MODE]
+        self.access_token = config.get(CONFIG_CONSTANTS.API_TOKEN)
+        self.access_secret = config.get(CONFIG_CONSTANTS.API_SECRET)
+        self.sandbox_mode = config.get(CONFIG_CONSTANTS.SANDBOX_MODE, False)
         self.stage = ScraperConstants.Stage.SANDBOX if self.sandbox_mode else ScraperConstants.Stage.STABLE
         self.should_print = should_print
+        self.last_bulk_stats = None
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self.rate_limiter = rate_limiter if rate_limiter is not None else TokenBucket()
+        self.interactive = interactive
+        self.cache = cache
+        self.instrumentation = instrumentation if instrumentation is not None else Instrumentation(enabled=False)
 
-        self.client = pyEX.Client(
-            api_token=self.access_secret,
-            version=self.stage
-        )
+        if client is None:
+            # pyEX (and its dependencies) takes longer to import than the rest of the package, and is only needed to
+            # talk to IEXCloud
+            import pyEX
+            client = pyEX.Client(api_token=self.access_secret, version=self.stage)
+        self.client = client
 
     def __get_intraday_price_helper__(self, ticker, date):
         """
+        Failed requests are retried according to `self.retry_policy`. Requests for data that doesn't exist are
+        skipped with an empty DataFrame, and any other request that fails for good stops the scraping (unless the
+        user chooses to continue, in interactive mode).
+
         :return: Returns a tuple (should_continue, df), with whether the scraping should be continued (boolean) as the
         first element, and a DataFrame as the second element.
         """
+        with self.instrumentation.span('scraper.request', ticker=ticker, date=date.strftime('%Y-%m-%d')) as span:
+            should_continue, df = self.__request__(ticker, date, span)
+            span.rows = df.shape[0]
+            if self.instrumentation.enabled:
+                span.bytes = int(df.memory_usage(index=True, deep=False).sum())
+            return should_continue, df
+
+    def __request__(self, ticker, date, span):
+        cache_key = (ticker, date.strftime('%Y-%m-%d'), self.stage)
+        if self.cache is not None:
+            df = self.cache.get(cache_key)
+            if df is not None:
+                span.set(cached=True, attempts=0)
+                return True, df
+
+        attempt = 0
+        while True:
+            span.set(cached=False, attempts=attempt + 1)
+            self.rate_limiter.acquire()
+            try:
+                df = self.client.chartDF(ticker, date=date, sort=ScraperConstants.SortMethods.ASC)
+            except Exception as e:
+                attempt += 1
+                error_type = self.retry_policy.classify(e)
+
+                if error_type == ERROR_TYPES.NOT_FOUND:
+                    if self.should_print:
+                        print(f"No data for {ticker} on {date}, skipping: {e}")
+                    return True, pd.DataFrame()
+
+                if self.retry_policy.should_retry(error_type, attempt):
+                    delay = self.retry_policy.backoff(error_type, attempt)
+                    if self.should_print:
+                        print(f"Error ({error_type}) scraping {ticker} on {date}, retrying in {delay:.1f}s: {e}")
+                    time.sleep(delay)
+                elif self.__should_proceed__(e):
+                    attempt = 0
+                else:
+                    return False, pd.DataFrame()
+            else:
+                if self.__is_cacheable__(date, df):
+                    self.__cache_response__(cache_key, df, span)
+                return True, df
+
+    def __cache_response__(self, cache_key: tuple, df: pd.DataFrame, span):
+        # A failed cache write (e.g. a full disk) doesn't fail the request: the response is still returned
         try:
-            df = self.client.chartDF(ticker, date=date, sort=ScraperConstants.SortMethods.ASC)
+            self.cache.put(cache_key, df)
         except Exception as e:
-            if self.__should_proceed__(e):
-                return self.__get_intraday_price_helper__(ticker, date)
-            else:
-                return False, pd.DataFrame()
-        return True, df
+            span.set(cache_error=type(e).__name__)
+            if self.should_print:
+                print(f"Error caching {cache_key[0]} on {cache_key[1]}, continuing without caching: {e}")
 
     def get_intraday_stock_data(self, ticker: Ticker, start: str, end: str, time_delta: timedelta = timedelta(days=1),
-                                save_data: bool = True):
+                                save_data: bool = True, lazy: bool = False):
         """
         This function uses the IEXCloud API to fetch stock data in 1-minute intervals, with the time_delta being the
         interval, in stock time, of each request.
@@ -69,19 +162,24 @@ class Scraper:
         Default is 1 day, timedelta(days=1).
         :type time_delta: timedelta
         :param save_data: Boolean value of whether or not to save the data to disk upon completion. Data will be saved
-        in $project_root/data/scraping/timestamp/TICKER.csv
+        in the columnar raw format (see RawFormat) in $project_root/exported_data/raw/timestamp/TICKER.parquet
         :type save_data: bool
+        :param lazy: Whether to stream each day straight to the saved file instead of keeping the data in memory, and
+        return a lazy RawDataHandle to that file instead of the DataFrame. Requires `save_data=True`.
+        :type lazy: bool
         :return: Returns a Tuple of:
-            Tuple Element 1 (pd.DataFrame): Pandas DataFrame with one row for every record/minute returned by IEXCloud
+            Tuple Element 1 (pd.DataFrame | RawDataHandle): Pandas DataFrame with one row for every record/minute
+            returned by IEXCloud, or a RawDataHandle to the saved data if lazy=True
             Tuple Element 2 (str): filename where data is stored. If save_data=False, this will be None.
-        :rtype: (pd.DataFrame, str)
+        :rtype: (pd.DataFrame | RawDataHandle, str)
         """
-        thicc_df = pd.DataFrame()
-        start_date = parse(start)
-        end_date = parse(end)
+        assert save_data or not lazy, 'Error: lazy=True requires save_data=True.'
+        # Each day is either streamed to disk or collected in a list and concatenated once at the end, so the cost
+        # stays linear in the number of days
+        writer = RawFileWriter(self.__output_filename__(ticker)) if lazy else None
+        day_dfs = []
 
-        curr_date = start_date
-        while curr_date <= end_date:
+        for curr_date in self.__request_dates__(start, end, time_delta):
             if self.should_print:
                 print(f"Scraping {curr_date}")
 
@@ -89,29 +187,230 @@ class Scraper:
             if not should_continue:
                 break
 
-            curr_date += time_delta
-            thicc_df = pd.concat([thicc_df, res]) if thicc_df.size > 0 else res
+            if writer is not None:
+                writer.append(res)
+            elif res.size > 0:
+                day_dfs.append(res)
 
         filename = None
-        if save_data:
-            filename = self.__save_data__(thicc_df, ticker)
+        if writer is not None:
+            thicc_df = writer.close()
+            filename = writer.filename
+            if self.should_print:
+                print(f"Successfully saved result to {filename}")
+        else:
+            thicc_df = pd.concat(day_dfs) if day_dfs else pd.DataFrame()
+            if save_data:
+                filename = self.__save_data__(thicc_df, ticker)
+
+        if self.should_print and self.cache is not None:
+            print(self.cache.report())
 
         return thicc_df, filename
 
+    def get_intraday_stock_data_bulk(self, tickers: list[Ticker], start: str, end: str,
+                                     time_delta: timedelta = timedelta(days=1), save_data: bool = True,
+                                     max_concurrency: int = 8):
+        """
+        This function is the multi-ticker equivalent of `get_intraday_stock_data`. Instead of fetching one ticker, one
+        day at a time, every (ticker, date) request is run on a bounded pool of `max_concurrency` threads. As soon as
+        all of the requests of a ticker are done, its data is assembled in date order (and saved, if `save_data=True`).
+
+        Just like `get_intraday_stock_data`, the data of a ticker stops at its first failed request. Once a request of a
+        ticker has failed for good (e.g. an unknown symbol or bad credentials), its later dates are no longer requested,
+        so they don't use up the quota.
+        The aggregate throughput of the run is stored in `self.last_bulk_stats` (and printed if `should_print=True`).
+
+        :param tickers: The stock tickers to fetch. A ticker listed several times is only fetched once.
+        :type tickers: list[Ticker]
+        :param start: The starting date (YYYY-MM-DD) to fetch data from (e.g. '2020-01-01')
+        :type start: str
+        :param end: The ending date (YYYY-MM-DD) to fetch data from (e.g. '2020-12-31')
+        :type end: str
+        :param time_delta: The amount of time of stock data to fetch in each request to IEXCloud.
+        Default is 1 day, timedelta(days=1).
+        :type time_delta: timedelta
+        :param save_data: Boolean value of whether or not to save the data of each ticker to disk upon completion.
+        :type save_data: bool
+        :param max_concurrency: The maximum number of requests in flight at the same time.
+        :type max_concurrency: int
+        :return: Returns a dict from ticker symbol to a Tuple of:
+            Tuple Element 1 (pd.DataFrame): Pandas DataFrame with one row for every record/minute returned by IEXCloud
+            Tuple Element 2 (str): filename where data is stored. If save_data=False, this will be None.
+        :rtype: dict[str, (pd.DataFrame, str)]
+        """
+        # Every ticker is scraped once, even if it is listed several times
+        tickers = list({ticker.ticker: ticker for ticker in tickers}.values())
+        dates = list(self.__request_dates__(start, end, time_delta))
+        responses = {ticker.ticker: [None] * len(dates) for ticker in tickers}
+        remaining = {ticker.ticker: len(dates) for ticker in tickers}
+        results = {}
+        num_rows = 0
+        start_time = time.perf_counter()
+        # The index of the first date of each ticker whose request failed for good: later dates are skipped
+        first_failure = {}
+        failure_lock = threading.Lock()
+        skipped = (False, pd.DataFrame())
+
+        def fetch(ticker: Ticker, i: int):
+            if i > first_failure.get(ticker.ticker, len(dates)):
+                return skipped
+            response = self.__get_intraday_price_helper__(ticker.ticker, dates[i])
+            if not response[0]:
+                with failure_lock:
+                    first_failure[ticker.ticker] = min(i, first_failure.get(ticker.ticker, len(dates)))
+            return response
+
+        def assemble(ticker: Ticker):
+            day_dfs = []
+            for should_continue, res in responses.pop(ticker.ticker):
+                if not should_continue:
+                    break
+                day_dfs.append(res)
+            thicc_df = pd.concat(day_dfs) if day_dfs else pd.DataFrame()
+            results[ticker.ticker] = (thicc_df, self.__save_data__(thicc_df, ticker) if save_data else None)
+            return thicc_df.shape[0]
+
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            futures = {
+                executor.submit(fetch, ticker, i): (ticker, i)
+                for ticker in tickers for i in range(len(dates))
+            }
+            ticker_futures = {ticker.ticker: [] for ticker in tickers}
+            for future, (ticker, _) in futures.items():
+                ticker_futures[ticker.ticker].append(future)
+            num_skipped = 0
+            for ticker in tickers:
+                if remaining[ticker.ticker] == 0:
+                    num_rows += assemble(ticker)
+
+            for future in as_completed(futures):
+                ticker, i = futures[future]
+                response = skipped if future.cancelled() else future.result()
+                responses[ticker.ticker][i] = response
+                remaining[ticker.ticker] -= 1
+                if response is skipped:
+                    num_skipped += 1
+                elif not response[0]:
+                    # The later dates of the ticker that haven't started yet are never sent
+                    for later_future in ticker_futures[ticker.ticker][i + 1:]:
+                        later_future.cancel()
+                if self.should_print:
+                    print(f"{'Skipped' if response is skipped else 'Scraped'} {ticker.ticker} {dates[i]}")
+                if remaining[ticker.ticker] == 0:
+                    num_rows += assemble(ticker)
+
+        elapsed = time.perf_counter() - start_time
+        num_requests = len(futures) - num_skipped
+        self.last_bulk_stats = {
+            'tickers': len(tickers),
+            'requests': num_requests,
+            'rows': num_rows,
+            'seconds': elapsed,
+            'requests_per_second': num_requests / elapsed if elapsed > 0 else float('inf'),
+            'rows_per_second': num_rows / elapsed if elapsed > 0 else float('inf')
+        }
+        if self.should_print:
+            print(f"Scraped {num_requests} requests ({num_rows} rows) for {len(tickers)} tickers in {elapsed:.2f}s: "
+                  f"{self.last_bulk_stats['requests_per_second']:.1f} requests/s, "
+                  f"{self.last_bulk_stats['rows_per_second']:.1f} rows/s")
+            if self.cache is not None:
+                print(self.cache.report())
+
+        return results
+
+    def get_intraday_stock_data_incremental(self, ticker: Ticker, start: str, end: str, store: RawStore = None):
+        """
+        This function is the incremental, resumable equivalent of `get_intraday_stock_data`. The data of each ticker is
+        kept in a persistent RawStore, with a manifest of the dates already fetched. Only the trading days between
+        `start` and `end` that are missing from the store are requested (weekends and market holidays are skipped),
+        and every day is appended and checkpointed as soon as it arrives, so an interrupted scrape resumes where it
+        stopped on the next call.
+
+        Only complete days are stored: days from today onwards are never requested. Days that come back empty are not
+        counted as fetched, so they are requested again on the next calls, until they have come back empty
+        `store.max_empty_attempts` times (see `RawStore.exhausted_dates`).
+
+        :param ticker: The stock ticker to fetch.
+        :type ticker: Ticker
+        :param start: The starting date (YYYY-MM-DD) to fetch data from (e.g. '2020-01-01')
+        :type start: str
+        :param end: The ending date (YYYY-MM-DD) to fetch data from (e.g. '2020-12-31')
+        :type end: str
+        :param store: (Optional) The store to keep the data in. Default is `RawStore()`.
+        :type store: RawStore
+        :return: Returns a Tuple of:
+            Tuple Element 1 (pd.DataFrame): Pandas DataFrame with the rows fetched by this call only
+            Tuple Element 2 (str): the store's directory for the ticker, which contains every day fetched so far
+        :rtype: (pd.DataFrame, str)
+        """
+        store = store if store is not None else RawStore()
+        fetched_dates = store.fetched_dates(ticker.ticker)
+        exhausted_dates = store.exhausted_dates(ticker.ticker)
+        skipped_dates = fetched_dates | exhausted_dates
+        today = pd.Timestamp.now(tz=ScraperConstants.MARKET_TIMEZONE).date()
+        missing_days = [
+            day for day in MarketCalendar.trading_days(parse(start).date(), parse(end).date())
+            if day < today and day.strftime('%Y-%m-%d') not in skipped_dates
+        ]
+
+        if self.should_print:
+            print(f"{len(fetched_dates)} days of {ticker.ticker} already stored, {len(exhausted_dates)} empty days "
+                  f"given up on, {len(missing_days)} days to scrape")
+
+        day_dfs = []
+        for day in missing_days:
+            if self.should_print:
+                print(f"Scraping {day}")
+
+            should_continue, res = self.__get_intraday_price_helper__(ticker.ticker, parse(str(day)))
+            if not should_continue:
+                break
+
+            store.append(ticker.ticker, day.strftime('%Y-%m-%d'), res)
+            day_dfs.append(res)
+
+        return (pd.concat(day_dfs) if day_dfs else pd.DataFrame()), store.filename(ticker.ticker)
+
+    @staticmethod
+    def __request_dates__(start: str, end: str, time_delta: timedelta):
+        """
+        This function returns the dates to request, from `start` to `end` (inclusive) in steps of `time_delta`.
+        """
+        curr_date = parse(start)
+        end_date = parse(end)
+        while curr_date <= end_date:
+            yield curr_date
+            curr_date += time_delta
+
+    def __is_cacheable__(self, date, df: pd.DataFrame):
+        """
+        Only complete historical days are cached: data for today (or later) may still change, and empty responses
+        may be due to a temporary problem.
+        """
+        today = pd.Timestamp.now(tz=ScraperConstants.MARKET_TIMEZONE).date()
+        return self.cache is not None and df is not None and df.shape[0] > 0 and date.date() < today
+
     def __should_proceed__(self, error):
         if self.should_print:
             print(f"Error during data scraping: {error}\n\n")
 
+        if not self.interactive:
+            return False
+
         x = input('Continue? (Y/N)')
         return x.upper() == 'Y'
 
-    def __save_data__(self, df, ticker):
+    def __output_filename__(self, ticker):
         directory = f"{ScraperConstants.OUTPUT_DIR}/{self.timestamp}/"
         Path(directory).mkdir(parents=True, exist_ok=True)
-        filename = f"{ticker.ticker}.csv"
+        return directory + f"{ticker.ticker}{ScraperConstants.RAW_FILE_EXTENSION}"
+
+    def __save_data__(self, df, ticker):
+        filename = self.__output_filename__(ticker)
 
-        df.to_csv(directory + filename)
+        RawFormat.write(df, filename)
         if self.should_print:
-            print(f"Successfully saved result to {directory + filename}")
+            print(f"Successfully saved result to {filename}")
 
-        return directory + filename
+        return filename
@@ -0,0 +1,77 @@
+import pandas as pd
+from lib.cache import DiskCache
+
+
+def entry(rows: int = 100):
+    return pd.DataFrame({'value': range(rows)})
+
+
+def entry_size(tmp_path):
+    cache = DiskCache(str(tmp_path / 'probe'))
+    cache.put(('probe',), entry())
+    return cache.total_bytes
+
+
+def test_put_evicts_the_least_recently_used_entries(tmp_path):
+    size = entry_size(tmp_path)
+    cache = DiskCache(str(tmp_path / 'cache'), max_bytes=3 * size)
+    for key in ('a', 'b', 'c'):
+        cache.put((key,), entry())
+    assert cache.get(('a',)) is not None
+
+    cache.put(('d',), entry())
+    assert ('b',) not in cache
+    assert all((key,) in cache for key in ('a', 'c', 'd'))
+    assert cache.stats['evictions'] == 1
+    assert cache.total_bytes == 3 * size
+
+
+def test_overwriting_an_entry_keeps_the_size_up_to_date(tmp_path):
+    cache = DiskCache(str(tmp_path / 'cache'))
+    cache.put(('a',), entry(10))
+    cache.put(('a',), entry(1000))
+    assert cache.total_bytes == (tmp_path / 'cache').joinpath(*cache.__path__(('a',)).parts[-2:]).stat().st_size
+
+
+def test_the_index_is_rebuilt_from_the_directory(tmp_path):
+    size = entry_size(tmp_path)
+    cache = DiskCache(str(tmp_path / 'cache'))
+    for key in ('a', 'b'):
+        cache.put((key,), entry())
+
+    reopened = DiskCache(str(tmp_path / 'cache'), max_bytes=2 * size)
+    assert reopened.total_bytes == 2 * size
+    reopened.put(('c',), entry())
+    assert ('a',) not in reopened and ('b',) in reopened and ('c',) in reopened
+
+
+def test_a_corrupt_entry_is_a_miss_and_is_removed(tmp_path):
+    cache = DiskCache(str(tmp_path / 'cache'))
+    cache.put(('a',), entry())
+    path = cache.__path__(('a',))
+    path.write_bytes(b'not a parquet file')
+
+    assert cache.get(('a',)) is None
+    assert not path.exists()
+    assert cache.total_bytes == 0
+    cache.put(('a',), entry())
+    assert len(cache.get(('a',))) == 100
+
+
+def test_reading_an_evicted_entry_does_not_recreate_it(tmp_path, monkeypatch):
+    cache = DiskCache(str(tmp_path / 'cache'))
+    cache.put(('a',), entry())
+    path = cache.__path__(('a',))
+    read_parquet = pd.read_parquet
+
+    def read_then_evict(*args, **kwargs):
+        # Another thread evicts the entry right after it was read
+        df = read_parquet(*args, **kwargs)
+        with cache.lock:
+            cache.max_bytes = 0
+            cache.__evict__()
+        return df
+
+    monkeypatch.setattr(pd, 'read_parquet', read_then_evict)
+    assert cache.get(('a',)) is not None
+    assert not path.exists()
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+from lib.data.cleanup import DataCleaner
+
+
+def make_df(values_by_day: list[list], volumes_by_day: list[list] = None):
+    dates = [f'2021-01-{4 + i:02d}' for i, values in enumerate(values_by_day) for _ in values]
+    volumes = np.concatenate(volumes_by_day) if volumes_by_day else np.ones(len(dates))
+    return pd.DataFrame({'date': pd.to_datetime(dates), 'marketAverage': np.concatenate(values_by_day).astype(float),
+                         'volume': volumes.astype(float)})
+
+
+def test_values_are_only_filled_from_the_same_day():
+    df = make_df([[1.0, np.nan], [np.nan, 2.0, np.nan], [np.nan, np.nan]])
+    DataCleaner().clean(df)
+    np.testing.assert_array_equal(df['marketAverage'], [1.0, 1.0, 2.0, 2.0, 2.0, np.nan, np.nan])
+
+
+def test_the_market_fields_of_bad_rows_are_purged_and_filled():
+    df = make_df([[1.0, 5.0, 3.0]], [[10, 0, 10]])
+    DataCleaner().clean(df)
+    np.testing.assert_array_equal(df['marketAverage'], [1.0, 1.0, 3.0])
+    np.testing.assert_array_equal(df['volume'], [10, 0, 10])
+
+
+def test_cleaning_in_chunks_matches_cleaning_at_once():
+    rng = np.random.default_rng(0)
+    values = [rng.normal(10, 1, 20) for _ in range(3)]
+    volumes = [rng.integers(0, 3, 20) for _ in range(3)]
+    for day in range(3):
+        # Days start with a good row, since a chunk can't be backward filled from the next one
+        volumes[day][0] = 1
+        values[day][rng.choice(np.arange(1, 20), 3, replace=False)] = np.nan
+    df = make_df(values, volumes)
+
+    expected = df.copy()
+    DataCleaner().clean(expected)
+
+    cleaner = DataCleaner()
+    chunks = [df.iloc[start:start + 7].copy() for start in range(0, len(df), 7)]
+    for chunk in chunks:
+        cleaner.clean(chunk)
+    pd.testing.assert_frame_equal(pd.concat(chunks), expected)
+
+
+def test_the_last_good_value_is_only_carried_over_to_the_same_day():
+    df = make_df([[5.0, np.nan], [np.nan, np.nan], [3.0, np.nan]])
+    cleaner = DataCleaner()
+    chunks = [df.iloc[:3].copy(), df.iloc[3:5].copy(), df.iloc[5:].copy()]
+    for chunk in chunks:
+        cleaner.clean(chunk)
+    np.testing.assert_array_equal(pd.concat(chunks)['marketAverage'], [5.0, 5.0, np.nan, np.nan, 3.0, 3.0])
+
+
+def test_stats_count_bad_rows_and_filled_values():
+    cleaner = DataCleaner()
+    stats = cleaner.clean(make_df([[1.0, 2.0, np.nan], [np.nan, np.nan]], [[0, 1, 1], [1, 1]]))
+    assert stats == {'rows': 5, 'bad_rows': 1, 'filled': {'marketAverage': 2}, 'unfilled': {'marketAverage': 2}}
+
+    cleaner.clean(make_df([[np.nan, 4.0]]))
+    assert cleaner.stats == {'rows': 7, 'bad_rows': 1, 'filled': {'marketAverage': 3},
+                             'unfilled': {'marketAverage': 2}}
+    assert cleaner.report() == ('DataCleaner: 1 bad rows out of 7, values filled per column: marketAverage: 3, '
+                                'values left empty: 2')
@@ -0,0 +1,18 @@
+import numpy as np
+import pandas as pd
+import pytest
+from lib.data.features.common_features import CommonFeatures
+
+
+def test_minute_of_day_parses_strings_and_times_of_day():
+    minutes = ['09:30', '00:00', '23:59', '9:31']
+    expected = [570, 0, 1439, 571]
+    np.testing.assert_array_equal(CommonFeatures.minute_of_day(pd.DataFrame({'minute': minutes})), expected)
+    times = pd.to_timedelta(['09:30:00', '00:00:00', '23:59:00', '09:31:00'])
+    np.testing.assert_array_equal(CommonFeatures.minute_of_day(pd.DataFrame({'minute': times})), expected)
+
+
+@pytest.mark.parametrize('minute', [None, np.nan, '', '24:00', '09:60', '09:3x', '09-30', '09:300'])
+def test_minute_of_day_rejects_missing_and_malformed_values(minute):
+    with pytest.raises(AssertionError, match='invalid minute'):
+        CommonFeatures.minute_of_day(pd.DataFrame({'minute': ['09:30', minute]}))
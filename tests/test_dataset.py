@@ -0,0 +1,199 @@
+import json
+import threading
+import time
+import numpy as np
+import pandas as pd
+import pytest
+from lib.constants import DatasetConstants
+from lib.data.dataset import Dataset
+from lib.data.window_array import SlidingWindowArray
+
+
+def make_dataset(days: int = 10, lookback_size: int = 30):
+    rng = np.random.default_rng(0)
+    minutes = pd.to_timedelta(np.tile(np.arange(390), days) + 570, 'min')
+    index = pd.bdate_range('2021-01-04', periods=days).repeat(390) + minutes
+    df = pd.DataFrame({'price': rng.normal(size=len(index)), 'target': rng.normal(0, 0.001, len(index))}, index=index)
+    return Dataset(df, lookback_size=lookback_size)
+
+
+def test_iter_batches_stops_building_batches_when_closed_early(monkeypatch):
+    dataset = make_dataset()
+    reads = []
+    read = SlidingWindowArray.read
+    monkeypatch.setattr(SlidingWindowArray, 'read', lambda self, key: reads.append(key) or read(self, key))
+
+    batches = dataset.iter_batches(batch_size=8, prefetch=2)
+    next(batches)
+    batches.close()
+
+    num_batches = -(-len(dataset.train) // 8)
+    # The batch taken, the ones waiting in the queue and the one being built when the caller stopped
+    assert len(reads) <= 2 + 2
+    assert len(reads) < num_batches
+
+
+def test_iter_batches_does_not_hang_when_failing_with_a_full_queue(monkeypatch):
+    dataset = make_dataset()
+    read = SlidingWindowArray.read
+
+    def failing_read(self, key):
+        if key.start >= 16:
+            raise ValueError('read failed')
+        return read(self, key)
+
+    monkeypatch.setattr(SlidingWindowArray, 'read', failing_read)
+    # The second batch fills the queue, so the producer fails on the third one while nothing is reading
+    batches = dataset.iter_batches(batch_size=8, prefetch=1)
+    next(batches)
+    time.sleep(0.3)
+
+    closer = threading.Thread(target=batches.close, daemon=True)
+    closer.start()
+    closer.join(timeout=5)
+    assert not closer.is_alive()
+
+
+def test_iter_batches_raises_errors_of_the_producer(monkeypatch):
+    dataset = make_dataset()
+
+    def failing_read(self, key):
+        raise ValueError('read failed')
+
+    monkeypatch.setattr(SlidingWindowArray, 'read', failing_read)
+    try:
+        next(dataset.iter_batches(batch_size=8, prefetch=1))
+        assert False, 'the error of the producer should be raised'
+    except ValueError as e:
+        assert str(e) == 'read failed'
+
+
+def test_stats_count_every_row_of_overlapping_windows_once():
+    dataset = make_dataset(days=3)
+    train_X = dataset.train_X
+    covered = np.unique(train_X.starts[:, None] + np.arange(train_X.lookback_size))
+    rows = np.asarray(train_X.rows)[covered][:, train_X.columns]
+
+    np.testing.assert_allclose(dataset.f_mean, rows.mean(axis=0), rtol=1e-6)
+    np.testing.assert_allclose(dataset.f_std, rows.std(axis=0), rtol=1e-6)
+    np.testing.assert_array_equal(dataset.f_min, rows.min(axis=0))
+    np.testing.assert_array_equal(dataset.f_max, rows.max(axis=0))
+
+
+def test_zscore_transform_is_reversible():
+    dataset = make_dataset(days=3)
+    dataset.scaling = 'zscore'
+    windows = np.asarray(dataset.train_X[:50])
+
+    transformed = dataset.transform(windows)
+    rows = np.asarray(dataset.train_X.rows)[:, dataset.train_X.columns]
+    np.testing.assert_allclose((rows - dataset.f_mean) / dataset.f_std, dataset.transform(rows[None])[0], rtol=1e-5)
+    np.testing.assert_allclose(dataset.reverse_transform(transformed), windows, rtol=1e-5, atol=1e-6)
+
+
+def test_constant_columns_are_scaled_to_zero():
+    rng = np.random.default_rng(0)
+    index = pd.bdate_range('2021-01-04', periods=2).repeat(390) + pd.to_timedelta(np.tile(np.arange(390), 2), 'min')
+    df = pd.DataFrame({'price': rng.normal(size=len(index)), 'constant': 5.0,
+                       'target': rng.normal(0, 0.001, len(index))}, index=index)
+
+    for scaling in ('minmax', 'zscore'):
+        dataset = Dataset(df, lookback_size=30, scaling=scaling)
+        transformed = dataset.transform(np.asarray(dataset.test_X))
+        assert np.isfinite(transformed).all()
+        assert np.all(transformed[:, :, 1] == 0)
+
+
+def test_datasets_saved_without_the_new_stats_load_with_minmax_scaling(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    dataset = make_dataset(days=2)
+    path = dataset.save_to_disk('legacy')
+
+    # Remove what datasets saved before the scaling could be chosen didn't have
+    meta_file = f'{path}/{DatasetConstants.META_FILENAME}'
+    with open(meta_file) as file:
+        config = json.load(file)
+    for key in ('f_mean_name', 'f_std_name', 'scaling', 'dates_name'):
+        del config[key]
+    with open(meta_file, 'w') as file:
+        json.dump(config, file)
+
+    loaded = Dataset(folder_path=path)
+    assert loaded.scaling == 'minmax'
+    assert loaded.f_mean is None and loaded.f_std is None and loaded.window_dates is None
+    windows = np.asarray(loaded.test_X[:10])
+    np.testing.assert_allclose(loaded.transform(windows), dataset.transform(windows))
+
+
+
+def windows_of_dates(dataset: Dataset, first_date, last_date):
+    # The test windows are never part of a fold, even if they share a date with the last validation windows
+    window_dates = dataset.window_dates[:dataset.split_ix_val]
+    index = np.flatnonzero((window_dates >= first_date) & (window_dates <= last_date))
+    return np.asarray(dataset.arr[index[0]:index[-1] + 1])
+
+
+def test_expanding_folds_walk_forward_by_date():
+    dataset = make_dataset()
+    dates = np.unique(dataset.window_dates[:dataset.split_ix_val])
+    folds = list(dataset.folds(num_folds=3, val_days=2))
+
+    assert [f.val_dates for f in folds] == [(dates[4], dates[5]), (dates[6], dates[7]), (dates[8], dates[9])]
+    assert [f.train_dates for f in folds] == [(dates[0], dates[3]), (dates[0], dates[5]), (dates[0], dates[7])]
+    for fold in folds:
+        np.testing.assert_array_equal(np.asarray(fold.train), windows_of_dates(dataset, *fold.train_dates))
+        np.testing.assert_array_equal(np.asarray(fold.val), windows_of_dates(dataset, *fold.val_dates))
+
+
+def test_sliding_folds_keep_the_last_train_days():
+    dataset = make_dataset()
+    dates = np.unique(dataset.window_dates[:dataset.split_ix_val])
+    folds = list(dataset.folds(num_folds=2, val_days=1, train_days=3, step_days=2))
+
+    assert [f.val_dates for f in folds] == [(dates[7], dates[7]), (dates[9], dates[9])]
+    assert [f.train_dates for f in folds] == [(dates[4], dates[6]), (dates[6], dates[8])]
+    np.testing.assert_array_equal(np.asarray(folds[1].train), windows_of_dates(dataset, dates[6], dates[8]))
+
+
+def test_gap_days_are_purged_between_train_and_val():
+    dataset = make_dataset()
+    dates = np.unique(dataset.window_dates[:dataset.split_ix_val])
+    fold, = dataset.folds(num_folds=1, val_days=2, gap_days=3)
+
+    assert fold.val_dates == (dates[8], dates[9])
+    assert fold.train_dates == (dates[0], dates[4])
+    np.testing.assert_array_equal(np.asarray(fold.train), windows_of_dates(dataset, dates[0], dates[4]))
+
+
+def test_folds_require_enough_dates():
+    dataset = make_dataset()
+    # 10 dates can hold 3 folds of 3 validation dates (9 dates), but not with a gap of 1 date
+    assert len(list(dataset.folds(num_folds=3, val_days=3))) == 3
+    with pytest.raises(AssertionError, match='too few'):
+        list(dataset.folds(num_folds=3, val_days=3, gap_days=1))
+
+
+def test_folds_require_windows_sorted_by_date():
+    dataset = make_dataset()
+    dataset.window_dates = dataset.window_dates[::-1].copy()
+    with pytest.raises(AssertionError, match='sorted by date'):
+        list(dataset.folds(num_folds=1, val_days=1))
+
+
+@pytest.mark.parametrize('prefetch', [0, 2])
+@pytest.mark.parametrize('shuffle', [False, True])
+def test_iter_batches_yields_every_transformed_window_once(shuffle, prefetch):
+    dataset = make_dataset(days=3)
+    num_windows = len(dataset.train)
+    batch_size = 64
+    assert num_windows % batch_size != 0
+
+    batches = [(x.copy(), y.copy()) for x, y in dataset.iter_batches(batch_size=batch_size, shuffle=shuffle, seed=7,
+                                                                     prefetch=prefetch)]
+    assert [len(x) for x, _ in batches] == [batch_size] * (num_windows // batch_size) + [num_windows % batch_size]
+
+    order = np.random.default_rng(7).permutation(num_windows) if shuffle else np.arange(num_windows)
+    expected_x = dataset.transform(np.asarray(dataset.train_X))[order]
+    expected_y = np.asarray(dataset.train_y)[order]
+    np.testing.assert_allclose(np.concatenate([x for x, _ in batches]), expected_x, rtol=1e-6)
+    np.testing.assert_array_equal(np.concatenate([y for _, y in batches]), expected_y)
@@ -0,0 +1,101 @@
+import pandas as pd
+import pytest
+from lib.data.feature_generator import FeatureGenerator
+from lib.data.features.base_feature import BaseFeature
+from lib.data.features.common_features import CommonFeatures
+from lib.data.features.technical_indicators import TechnicalIndicators
+from lib.scraper.raw_store import RawFormat
+
+
+class Double(BaseFeature):
+    def __init__(self, feature: str):
+        self.feature = feature
+
+    @property
+    def name(self):
+        return f'{self.feature}_double'
+
+    @property
+    def inputs(self):
+        return [self.feature]
+
+    def extract(self, df):
+        return df[self.feature] * 2
+
+
+class Broken(BaseFeature):
+    def __init__(self):
+        self.calls = 0
+
+    @property
+    def inputs(self):
+        return ['average']
+
+    def extract(self, df):
+        self.calls += 1
+        return df['misspelled_column']
+
+
+def make_feature_generator(tmp_path, parse_dates: bool = False, **kwargs):
+    filename = str(tmp_path / 'AAPL.parquet')
+    RawFormat.write(pd.DataFrame({'date': ['2021-01-04'] * 3, 'minute': ['09:30', '09:31', '09:32'],
+                                  'average': [1.0, 2.0, 3.0]}), filename)
+    return FeatureGenerator(filename, auto_clean=False, parse_dates=parse_dates, **kwargs)
+
+
+def test_dependencies_are_attached_before_the_features_that_read_them(tmp_path):
+    feature_generator = make_feature_generator(tmp_path)
+    feature_generator.build_features([Double('average_double'), Double('average')])
+    assert feature_generator.df['average_double_double'].tolist() == [4.0, 8.0, 12.0]
+
+
+def test_errors_of_extract_are_not_retried(tmp_path):
+    feature_generator = make_feature_generator(tmp_path)
+    broken = Broken()
+    with pytest.raises(KeyError):
+        feature_generator.build_features([Double('average'), broken])
+    assert broken.calls == 1
+
+
+def test_columns_are_resolved_to_the_feature_that_is_known_to_generate_them(tmp_path):
+    feature_generator = make_feature_generator(tmp_path, parse_dates=True)
+    sinify = CommonFeatures.Sinify('minute_of_day', 1440)
+    sma = TechnicalIndicators.SMA(sinify.name, 2)
+    # The OneHotEncoder of `minute_of_day` also matches `minute_of_day_sin(1440)` and its SMA by prefix
+    feature_generator.add_features([CommonFeatures.OneHotEncoder('minute_of_day'), sinify, sma])
+    feature_generator.compute([sma.name])
+    assert sma.name in feature_generator.df.columns
+    assert not any(c.startswith('minute_of_day_') and c not in (sinify.name, sma.name)
+                   for c in feature_generator.df.columns)
+    assert len(feature_generator.registered_features) == 1
+
+
+def test_parsed_dates_export_every_date_feature_but_weekday_and_timestamp(tmp_path):
+    feature_generator = make_feature_generator(tmp_path, parse_dates=True)
+    date_features = CommonFeatures.DateFeatures()
+    assert set(date_features.column_names) <= set(feature_generator.df.columns)
+    assert feature_generator.data_fields[-5:] == ['year', 'day_of_year', 'hour_of_day', 'minute_of_hour',
+                                                  'minute_of_day']
+    assert feature_generator.df['minute_of_day'].tolist() == [0, 1, 2]
+
+
+class Parity(BaseFeature):
+    @property
+    def inputs(self):
+        return ['average']
+
+    def extract(self, df):
+        return df['average'].map(lambda v: 'even' if v % 2 == 0 else 'odd')
+
+
+def test_compact_export_refuses_string_features(tmp_path):
+    feature_generator = make_feature_generator(tmp_path, dtype_policy='compact')
+    feature_generator.build_features([Parity(), Double('average')])
+    assert isinstance(feature_generator.df['parity'].dtype, pd.CategoricalDtype)
+
+    with pytest.raises(AssertionError, match='string feature parity'):
+        feature_generator.export('average_double')
+
+    feature_generator.build_features([CommonFeatures.OneHotEncoder('parity')])
+    exported = feature_generator.export('average_double', ['parity'])
+    assert exported['parity_odd'].tolist() == [1, 0, 1]
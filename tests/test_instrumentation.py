@@ -0,0 +1,109 @@
+import csv
+import json
+import threading
+import tracemalloc
+import pytest
+from lib.instrumentation import Instrumentation
+
+
+def test_nested_spans_record_their_parent():
+    instrumentation = Instrumentation()
+    with instrumentation.span('outer', ticker='DIS') as outer:
+        with instrumentation.span('inner') as inner:
+            inner.rows = 10
+        outer.set(cached=False)
+
+    assert [s.name for s in instrumentation.spans] == ['inner', 'outer']
+    assert inner.parent == 'outer' and outer.parent is None
+    assert outer.attributes == {'ticker': 'DIS', 'cached': False}
+    assert outer.seconds >= inner.seconds >= 0
+
+
+def test_spans_of_other_threads_have_their_own_parents():
+    instrumentation = Instrumentation()
+
+    def work():
+        with instrumentation.span('worker'):
+            pass
+
+    with instrumentation.span('main'):
+        thread = threading.Thread(target=work)
+        thread.start()
+        thread.join()
+    assert {s.name: s.parent for s in instrumentation.spans} == {'worker': None, 'main': None}
+
+
+def test_errors_end_the_span_and_are_raised():
+    instrumentation = Instrumentation()
+    with pytest.raises(ValueError):
+        with instrumentation.span('failing'):
+            raise ValueError('failed')
+    assert instrumentation.spans[0].error == 'ValueError'
+    assert instrumentation.summary()[0]['errors'] == 1
+
+
+def test_disabled_spans_measure_nothing():
+    calls = []
+    instrumentation = Instrumentation(hooks=[calls.append], enabled=False)
+    with instrumentation.span('stage', ticker='DIS') as span:
+        span.rows = 10
+        span.set(cached=True)
+    assert span is instrumentation.span('other')
+    assert instrumentation.spans == [] and calls == []
+
+
+def test_hooks_are_called_with_every_finished_span():
+    calls = []
+    instrumentation = Instrumentation(hooks=[calls.append], keep_spans=False)
+    instrumentation.add_hook(lambda span: calls.append(span.name))
+    with instrumentation.span('stage') as span:
+        assert calls == []
+    assert calls == [span, 'stage']
+    assert instrumentation.spans == []
+
+
+def test_spans_are_exported_to_json_and_csv(tmp_path):
+    instrumentation = Instrumentation()
+    for rows in (10, 20):
+        with instrumentation.span('stage', ticker='DIS') as span:
+            span.rows = rows
+    with instrumentation.span('other', cached=True):
+        pass
+
+    instrumentation.to_json(str(tmp_path / 'out' / 'spans.json'))
+    with open(tmp_path / 'out' / 'spans.json') as file:
+        exported = json.load(file)
+    assert [s['name'] for s in exported['spans']] == ['stage', 'stage', 'other']
+    assert exported['summary'][0]['count'] == 2 and exported['summary'][0]['rows'] == 30
+
+    instrumentation.to_csv(str(tmp_path / 'spans.csv'))
+    with open(tmp_path / 'spans.csv') as file:
+        rows = list(csv.DictReader(file))
+    assert list(rows[0]) == Instrumentation.FIELDS + ['ticker', 'cached']
+    assert [(r['name'], r['rows'], r['ticker'], r['cached']) for r in rows] == [
+        ('stage', '10', 'DIS', ''), ('stage', '20', 'DIS', ''), ('other', '', '', 'True')
+    ]
+
+
+def test_close_stops_the_tracing_it_started():
+    assert not tracemalloc.is_tracing()
+    with Instrumentation(trace_allocations=True) as instrumentation:
+        assert tracemalloc.is_tracing()
+        with instrumentation.span('allocating') as span:
+            data = bytearray(2 ** 20)
+        assert span.allocated_bytes >= len(data)
+    assert not tracemalloc.is_tracing()
+
+    # Spans after close aren't traced
+    with instrumentation.span('untraced') as span:
+        pass
+    assert span.allocated_bytes is None
+
+
+def test_close_leaves_tracing_started_by_someone_else():
+    tracemalloc.start()
+    try:
+        Instrumentation(trace_allocations=True).close()
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
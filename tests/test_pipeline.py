@@ -0,0 +1,65 @@
+import json
+from pathlib import Path
+import numpy as np
+import pytest
+from benchmarks.run import PipelineBenchmark
+from benchmarks.synthetic import SyntheticMinuteBars
+from lib.constants import DatasetConstants
+from lib.data.dataset import Dataset
+from lib.data.pipeline import FeatureSpec, Pipeline
+from lib.scraper.raw_store import RawFormat
+
+
+@pytest.fixture
+def pipeline_files(tmp_path, monkeypatch):
+    # Datasets are saved relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    bars = SyntheticMinuteBars()
+    filenames = []
+    # The tickers don't have the same dates, so the split dates must be aligned across them
+    for ticker, start, days in [('AAPL', '2021-01-04', 10), ('GM', '2021-01-06', 8)]:
+        filename = str(tmp_path / f'{ticker}.parquet')
+        RawFormat.write(bars.frame(ticker, start, days), filename)
+        filenames.append(filename)
+    spec = FeatureSpec(PipelineBenchmark.FEATURES + PipelineBenchmark.TARGETS, PipelineBenchmark.TARGET_FEATURE,
+                       PipelineBenchmark.FEATURES_TO_EXCLUDE)
+    return Pipeline(spec, lookback_size=30, train_fraction=0.6, max_workers=2), filenames
+
+
+def assert_split_by_date(dataset: Dataset, split_dates: tuple):
+    assert dataset.split_dates == split_dates
+    dates = dataset.window_dates
+    assert np.all(dates[1:] >= dates[:-1])
+    assert np.all(dates[:dataset.split_ix_train] < split_dates[0])
+    assert np.all((dates[dataset.split_ix_train:dataset.split_ix_val] >= split_dates[0])
+                  & (dates[dataset.split_ix_train:dataset.split_ix_val] < split_dates[1]))
+    assert np.all(dates[dataset.split_ix_val:] >= split_dates[1])
+    assert len(dataset.train) > 0 and len(dataset.val) > 0 and len(dataset.test) > 0
+
+
+def test_combined_dataset_is_split_by_the_dates_of_every_ticker(pipeline_files):
+    pipeline, filenames = pipeline_files
+    split_dates = pipeline.split_dates(filenames)
+    assert split_dates == (np.datetime64('2021-01-12'), np.datetime64('2021-01-14'))
+
+    dataset = Dataset(folder_path=pipeline.run(filenames, 'combined'))
+    assert_split_by_date(dataset, split_dates)
+    assert set(np.unique(dataset.window_dates).astype(str)) >= {'2021-01-04', '2021-01-15'}
+
+
+def test_sharded_datasets_are_split_at_the_same_dates(pipeline_files):
+    pipeline, filenames = pipeline_files
+    split_dates = pipeline.split_dates(filenames)
+    paths = pipeline.run(filenames, 'sharded', sharded=True)
+    assert set(paths) == {'AAPL', 'GM'}
+
+    datasets = {ticker: Dataset(folder_path=path) for ticker, path in paths.items()}
+    for dataset in datasets.values():
+        assert_split_by_date(dataset, split_dates)
+    assert datasets['GM'].window_dates[0] == np.datetime64('2021-01-06')
+
+    shards_file = next(Path(DatasetConstants.OUTPUT_DIR).glob(f'*-sharded/{DatasetConstants.SHARDS_FILENAME}'))
+    with open(shards_file) as file:
+        shards = json.load(file)
+    assert shards['split_dates'] == [str(d) for d in split_dates]
+    assert shards['shards'] == paths
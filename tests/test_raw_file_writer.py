@@ -0,0 +1,19 @@
+import numpy as np
+import pandas as pd
+from lib.scraper.raw_store import RawFileWriter, RawFormat
+
+
+def test_days_with_different_columns_are_written_to_the_same_file(tmp_path):
+    writer = RawFileWriter(str(tmp_path / 'AAPL.parquet'))
+    writer.append(pd.DataFrame({'date': ['2021-01-04'], 'minute': ['09:30'], 'label': [None], 'volume': [10.0]}))
+    writer.append(pd.DataFrame({'date': ['2021-01-05'], 'minute': ['09:30'], 'label': ['09:30 AM'],
+                                'average': [1.5]}))
+    writer.append(pd.DataFrame({'date': ['2021-01-06'], 'minute': ['09:30'], 'volume': ['12']}))
+    df = writer.close().read()
+
+    assert list(df.columns) == RawFormat.FIELDS
+    assert len(df) == 3
+    np.testing.assert_array_equal(df['volume'], [10.0, np.nan, 12.0])
+    np.testing.assert_array_equal(df['average'], [np.nan, 1.5, np.nan])
+    assert df['label'].tolist() == [None, '09:30 AM', None]
+    assert df['date'].tolist() == list(pd.to_datetime(['2021-01-04', '2021-01-05', '2021-01-06']))
@@ -0,0 +1,61 @@
+import json
+import pandas as pd
+from lib.scraper.raw_store import RawStore
+from lib.scraper.ticker import Ticker
+from tests.test_scraper import FakeClient, make_scraper
+
+
+def day(date: str):
+    return pd.DataFrame({'date': [date] * 2, 'minute': ['09:30', '09:31'], 'average': [1.0, 2.0]})
+
+
+def test_empty_days_are_not_counted_as_fetched(tmp_path):
+    store = RawStore(str(tmp_path))
+    store.append('AAPL', '2021-01-04', day('2021-01-04'))
+    store.append('AAPL', '2021-01-05', pd.DataFrame())
+    assert store.fetched_dates('AAPL') == {'2021-01-04'}
+    assert store.manifest('AAPL')['empty_dates'] == {'2021-01-05': 1}
+
+    store.append('AAPL', '2021-01-05', day('2021-01-05'))
+    assert store.fetched_dates('AAPL') == {'2021-01-04', '2021-01-05'}
+    assert store.manifest('AAPL')['empty_dates'] == {}
+    assert len(store.read('AAPL')) == 4
+
+
+def test_empty_days_of_old_manifests_are_fetched_again(tmp_path):
+    store = RawStore(str(tmp_path))
+    store.append('AAPL', '2021-01-04', day('2021-01-04'))
+    manifest_path = tmp_path / 'AAPL.manifest.json'
+    manifest = json.loads(manifest_path.read_text())
+    manifest['dates']['2021-01-05'] = 0
+    del manifest['empty_dates']
+    manifest_path.write_text(json.dumps(manifest))
+    assert store.fetched_dates('AAPL') == {'2021-01-04'}
+
+
+def test_incremental_scrape_requests_empty_days_again(tmp_path):
+    store = RawStore(str(tmp_path))
+    client = FakeClient(empty_dates={'2021-01-05'})
+    scraper = make_scraper(client)
+    scraper.get_intraday_stock_data_incremental(Ticker('AAPL', 'Apple'), '2021-01-04', '2021-01-06', store=store)
+    assert len(client.calls) == 3
+
+    client.empty_dates = set()
+    df, _ = scraper.get_intraday_stock_data_incremental(Ticker('AAPL', 'Apple'), '2021-01-04', '2021-01-06',
+                                                        store=store)
+    assert client.calls[3:] == [('AAPL', '2021-01-05')]
+    assert len(df) == 2
+    assert store.fetched_dates('AAPL') == {'2021-01-04', '2021-01-05', '2021-01-06'}
+
+
+def test_days_that_keep_coming_back_empty_are_given_up_on(tmp_path):
+    store = RawStore(str(tmp_path), max_empty_attempts=2)
+    client = FakeClient(empty_dates={'2021-01-05'})
+    scraper = make_scraper(client)
+    for _ in range(3):
+        scraper.get_intraday_stock_data_incremental(Ticker('AAPL', 'Apple'), '2021-01-04', '2021-01-06', store=store)
+
+    assert [date for _, date in client.calls].count('2021-01-05') == 2
+    assert store.manifest('AAPL')['empty_dates'] == {'2021-01-05': 2}
+    assert store.exhausted_dates('AAPL') == {'2021-01-05'}
+    assert store.fetched_dates('AAPL') == {'2021-01-04', '2021-01-06'}
@@ -0,0 +1,24 @@
+import numpy as np
+from lib.data.running_stats import RunningStats
+
+
+def test_stats_merged_across_chunks_match_numpy():
+    rng = np.random.default_rng(0)
+    # A large mean compared to the variance, like prices
+    rows = np.c_[rng.normal(1e6, 1e-2, 1000), rng.normal(0, 1, 1000), rng.integers(0, 5, 1000)]
+    stats = RunningStats(3)
+    for chunk in np.array_split(rows, [1, 10, 11, 500, 997]):
+        stats.update(chunk)
+
+    assert stats.count == len(rows)
+    np.testing.assert_array_equal(stats.min, rows.min(axis=0))
+    np.testing.assert_array_equal(stats.max, rows.max(axis=0))
+    np.testing.assert_allclose(stats.mean, rows.mean(axis=0), rtol=1e-12)
+    np.testing.assert_allclose(stats.std, rows.std(axis=0), rtol=1e-6)
+
+
+def test_stats_without_rows_are_empty():
+    stats = RunningStats(2)
+    stats.update(np.empty((0, 2)))
+    assert stats.count == 0
+    assert np.isnan(stats.variance).all()
@@ -0,0 +1,65 @@
+import threading
+import pandas as pd
+from lib.cache import DiskCache
+from lib.scraper.retry import RetryPolicy, TokenBucket
+from lib.scraper.scraper import Scraper
+from lib.scraper.ticker import Ticker
+
+
+class FakeClient:
+    def __init__(self, errors: dict = None, empty_dates: set = None):
+        # The error raised for every request of a symbol, and the dates without any data
+        self.errors = errors or {}
+        self.empty_dates = empty_dates or set()
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def chartDF(self, symbol, date=None, sort=None):
+        with self.lock:
+            self.calls.append((symbol, date.strftime('%Y-%m-%d')))
+        if symbol in self.errors:
+            raise self.errors[symbol]
+        if date.strftime('%Y-%m-%d') in self.empty_dates:
+            return pd.DataFrame()
+        return pd.DataFrame({'date': [date.strftime('%Y-%m-%d')] * 2, 'minute': ['09:30', '09:31'],
+                             'average': [1.0, 2.0]})
+
+
+def make_scraper(client: FakeClient, **kwargs):
+    return Scraper(config_file=None, should_print=False, client=client, rate_limiter=TokenBucket(rate=1e6),
+                   retry_policy=RetryPolicy(base_delay=0, rate_limit_delay=0, jitter=False), **kwargs)
+
+
+class FailingCache(DiskCache):
+    def put(self, key, df):
+        raise OSError('No space left on device')
+
+
+def test_a_failed_cache_write_does_not_fail_the_request(tmp_path):
+    client = FakeClient()
+    scraper = make_scraper(client, cache=FailingCache(str(tmp_path / 'cache')))
+    df, _ = scraper.get_intraday_stock_data(Ticker('AAPL', 'Apple'), '2021-01-04', '2021-01-05', save_data=False)
+    assert len(client.calls) == 2
+    assert len(df) == 4
+
+
+def test_bulk_scrape_stops_requesting_a_ticker_after_a_fatal_error():
+    client = FakeClient(errors={'NOPE': ValueError('Unknown symbol')})
+    scraper = make_scraper(client)
+    results = scraper.get_intraday_stock_data_bulk([Ticker('NOPE', 'Unknown'), Ticker('AAPL', 'Apple')],
+                                                   '2021-01-04', '2021-01-29', save_data=False, max_concurrency=1)
+    assert len([call for call in client.calls if call[0] == 'NOPE']) == 1
+    assert len([call for call in client.calls if call[0] == 'AAPL']) == 26
+    assert results['NOPE'][0].empty
+    assert len(results['AAPL'][0]) == 2 * 26
+    assert scraper.last_bulk_stats['requests'] == 27
+
+
+def test_bulk_scrape_fetches_repeated_tickers_once():
+    client = FakeClient()
+    scraper = make_scraper(client)
+    results = scraper.get_intraday_stock_data_bulk([Ticker('AAPL', 'Apple'), Ticker('AAPL', 'Apple')],
+                                                   '2021-01-04', '2021-01-05', save_data=False)
+    assert list(results) == ['AAPL']
+    assert len(client.calls) == 2
+    assert len(results['AAPL'][0]) == 4
@@ -0,0 +1,60 @@
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+from benchmarks.synthetic import SyntheticMinuteBars
+from lib.data.feature_generator import FeatureGenerator
+from lib.data.features.common_features import CommonFeatures
+from lib.data.features.common_targets import CommonTargets
+from lib.data.streaming_feature_generator import StreamingFeatureGenerator
+from lib.scraper.raw_store import RawFormat
+
+COLUMNS = ['marketAverage', 'volume']
+
+
+def bar(minute: str, market_average, volume):
+    return {'date': '2021-01-04', 'minute': minute, 'marketAverage': market_average, 'volume': volume,
+            'marketVolume': 100, 'numberOfTrades': 5, 'marketNumberOfTrades': 50}
+
+
+def test_a_missing_bad_row_field_is_filled_instead_of_crashing():
+    generator = StreamingFeatureGenerator([], COLUMNS, lookback_size=2, parse_dates=False)
+    generator.push(bar('09:30', 10.0, 200))
+    vector = generator.push(bar('09:31', 11.0, None))
+    np.testing.assert_array_equal(vector, [11.0, 200])
+    assert generator.stats['filled_rows'] == 0
+    assert generator.is_ready
+
+
+def test_a_bad_row_is_filled_with_the_last_good_values():
+    generator = StreamingFeatureGenerator([], COLUMNS, lookback_size=2, parse_dates=False)
+    generator.push(bar('09:30', 10.0, 200))
+    vector = generator.push(bar('09:31', 11.0, 0))
+    np.testing.assert_array_equal(vector, [10.0, 0])
+    assert generator.stats['filled_rows'] == 1
+
+
+def test_streamed_vectors_match_the_exported_rows(tmp_path):
+    day = SyntheticMinuteBars(seed=1).day('AAPL', '2021-01-05').reset_index()
+    # A run of bad bars and a missing value, which are both forward filled
+    day.loc[100:102, 'volume'] = 0
+    day.loc[200, 'marketAverage'] = np.nan
+    filename = str(tmp_path / 'AAPL.parquet')
+    RawFormat.write(day, filename)
+
+    def features():
+        return [CommonFeatures.Cosify('minute_of_day', 1440), CommonFeatures.OneHotEncoder('hour_of_day')]
+
+    feature_generator = FeatureGenerator(filename)
+    feature_generator.add_features(features())
+    feature_generator.add_features([CommonTargets.FutureValue('marketAverage', timedelta(minutes=1))])
+    exported = feature_generator.export('future_value', ['weekday', 'hour_of_day'])
+    columns = list(exported.columns[:-1])
+
+    generator = StreamingFeatureGenerator(features(), columns, lookback_size=5)
+    vectors = np.array([generator.push(bar) for bar in day.to_dict('records')])
+    assert generator.stats['filled_rows'] >= 3
+
+    # The export drops the rows without a target, so the streamed rows are matched by timestamp
+    timestamps = pd.Index(pd.to_datetime(day.date) + pd.to_timedelta(day.minute + ':00'))
+    np.testing.assert_array_equal(vectors[timestamps.get_indexer(exported.index)], exported[columns].to_numpy(float))
+    np.testing.assert_array_equal(generator.window, vectors[-5:])
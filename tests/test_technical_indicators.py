@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+from lib.data.features.technical_indicators import TechnicalIndicators
+
+
+def make_df(values_by_day: list[list[float]], **columns_by_day):
+    dates = np.concatenate([[f'2021-01-{4 + day:02d}'] * len(values) for day, values in enumerate(values_by_day)])
+    df = pd.DataFrame({'date': pd.to_datetime(dates), 'value': np.concatenate(values_by_day).astype(float)})
+    for name, column_by_day in columns_by_day.items():
+        df[name] = np.concatenate(column_by_day).astype(float)
+    return df
+
+
+def pandas_rolling(df: pd.DataFrame, window: int, method: str):
+    return df.groupby('date')['value'].transform(lambda v: getattr(v.rolling(window), method)()).to_numpy()
+
+
+def test_rolling_indicators_match_pandas_when_days_start_with_an_empty_value():
+    df = make_df([[np.nan, 1, 2, 3, 4], [5, np.nan, 7, 8, 9, 10], [np.nan, np.nan, 3, 1, 4]])
+    np.testing.assert_allclose(TechnicalIndicators.SMA('value', 2).extract(df), pandas_rolling(df, 2, 'mean'))
+    np.testing.assert_allclose(TechnicalIndicators.RollingStd('value', 2).extract(df), pandas_rolling(df, 2, 'std'))
+    np.testing.assert_allclose(TechnicalIndicators.SMA('value', 2).extract(df)[:5], [np.nan, np.nan, 1.5, 2.5, 3.5])
+
+
+def test_zscore_is_not_empty_after_an_empty_first_value():
+    df = make_df([[np.nan, 1, 2, 4, 8]])
+    mean, std = pandas_rolling(df, 3, 'mean'), pandas_rolling(df, 3, 'std')
+    np.testing.assert_allclose(TechnicalIndicators.ZScore('value', 3).extract(df), (df['value'] - mean) / std)
+
+
+def test_chained_sma_of_log_return():
+    df = make_df([[10, 11, 12, 11, 13], [20, 21, 19, 22, 23]])
+    df['value'] = TechnicalIndicators.LogReturn('value', 1).extract(df)
+    sma = TechnicalIndicators.SMA('value', 2).extract(df).to_numpy()
+    np.testing.assert_allclose(sma, pandas_rolling(df, 2, 'mean'), atol=1e-12)
+    assert np.isfinite(sma[[2, 3, 4, 7, 8, 9]]).all()
+
+
+def test_session_vwap_skips_empty_rows_and_restarts_every_day():
+    df = make_df([[0, 0, 0], [0, 0, 0]],
+                 notional=[[100, np.nan, 300], [50, 60, 70]],
+                 volume=[[10, 5, 10], [5, 6, np.nan]])
+    vwap = TechnicalIndicators.VWAP().extract(df).to_numpy()
+    np.testing.assert_allclose(vwap, [10, 10, 20, 10, 10, 10])